@@ -7,16 +7,59 @@ document.addEventListener('DOMContentLoaded', function() {
     let rawPoints = [];
     let tooltip = null;
 
-    fileInput.addEventListener('change', function(e) {
+    fileInput.addEventListener('change', async function(e) {
         const file = e.target.files[0];
         if (!file) return;
-        const reader = new FileReader();
-        reader.onload = function(e) {
-            parseCSV(e.target.result);
-        };
-        reader.readAsText(file);
+        let bytes = new Uint8Array(await file.arrayBuffer());
+        // gzip（.gz）なら展開する
+        if (bytes[0] === 0x1f && bytes[1] === 0x8b) {
+            const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+            bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+        }
+        if (String.fromCharCode(...bytes.subarray(0, 4)) === 'KOPT') {
+            parseBinary(bytes);
+        } else {
+            parseCSV(new TextDecoder('utf-8').decode(bytes));
+        }
     });
 
+    // バイナリ形式（KOPT）: ヘッダー 20 バイトの後に座標・クラスタ・接続（CSR）・テキスト表が並ぶ
+    function parseBinary(bytes) {
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        const version = view.getUint32(4, true);
+        if (version !== 1) {
+            alert(`未対応のバイナリ形式です（version ${version}）`);
+            return;
+        }
+        const n = view.getUint32(8, true);
+        const nnz = view.getUint32(12, true);
+        let offset = bytes.byteOffset + 20;
+        const take = (Type, length) => {
+            const arr = new Type(bytes.buffer.slice(offset, offset + length * Type.BYTES_PER_ELEMENT));
+            offset += length * Type.BYTES_PER_ELEMENT;
+            return arr;
+        };
+        const coords = take(Float32Array, n * 2);
+        const clusters = take(Int32Array, n);
+        const indptr = take(Uint32Array, n + 1);
+        const indices = take(Uint32Array, nnz);
+        const textOffsets = take(Uint32Array, n + 1);
+        const textBytes = new Uint8Array(bytes.buffer, offset);
+        const decoder = new TextDecoder('utf-8');
+        rawPoints = [];
+        for (let i = 0; i < n; i++) {
+            rawPoints.push({
+                x: coords[2 * i],
+                y: coords[2 * i + 1],
+                text: decoder.decode(textBytes.subarray(textOffsets[i], textOffsets[i + 1])),
+                cluster: clusters[i],
+                connected_to: Array.from(indices.subarray(indptr[i], indptr[i + 1])),
+            });
+        }
+        alert(`Loaded ${rawPoints.length} data points`);
+        visualizeNetwork();
+    }
+
     function parseCSVRow(line) {
         const out = [];
         let cur = '';
@@ -0,0 +1,151 @@
+"""
+fetch_*_to_texts.py の実行をまたいで保持するクロール状態（SQLite）。
+
+- URL ごとの ETag / Last-Modified と本文のハッシュ
+  → 次回は条件付き GET（If-None-Match / If-Modified-Since）で取得し、304 や本文が同じなら
+    解析も書き出しもしない
+- これまでに出力したすべての行のハッシュ
+  → まだ出力していない行だけを追記する（実行内の重複もここで除く）
+
+状態ファイルは出力ファイルごとに持つ（デフォルトは <出力ファイル>.crawl.sqlite）。
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _line_key(line: str) -> bytes:
+    return hashlib.sha1(line.strip().encode("utf-8")).digest()
+
+
+def default_state_path(output_path: str) -> str:
+    return output_path + ".crawl.sqlite"
+
+
+class CrawlState:
+    """URL ごとの検証子・本文ハッシュと、出力済みの行ハッシュの集合"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,"
+                " content_hash TEXT, fetched_at REAL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS lines (hash BLOB PRIMARY KEY)")
+
+    def is_new(self) -> bool:
+        """まだ何も記録していない（初回実行）か"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT EXISTS(SELECT 1 FROM urls) OR EXISTS(SELECT 1 FROM lines)"
+            ).fetchone()
+        return not row[0]
+
+    def reset(self) -> None:
+        """すべて忘れる（--replace で出力を作り直すとき）"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM urls")
+            self._db.execute("DELETE FROM lines")
+
+    # ── URL ──────────────────────────────────────────
+
+    def conditional_headers(self, url: str) -> dict:
+        """前回の検証子から条件付き GET のヘッダーを作る（記録がなければ空）"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def is_unchanged(self, url: str, digest: str) -> bool:
+        """本文のハッシュが前回と同じか（検証子を返さないサーバー向け）"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        return bool(row) and row[0] == digest
+
+    def record_url(
+        self,
+        url: str,
+        etag: str | None,
+        last_modified: str | None,
+        digest: str,
+    ) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, digest, time.time()),
+            )
+
+    # ── 行 ───────────────────────────────────────────
+
+    def unseen_lines(self, lines: Iterable[str]) -> List[str]:
+        """まだ出力していない行（実行内の重複も除く、順序は保つ）。記録はしない"""
+        result = []
+        batch: set[bytes] = set()
+        with self._lock:
+            for line in lines:
+                key = _line_key(line)
+                if key in batch:
+                    continue
+                batch.add(key)
+                if self._db.execute("SELECT 1 FROM lines WHERE hash = ?", (key,)).fetchone():
+                    continue
+                result.append(line)
+        return result
+
+    def mark_lines(self, lines: Iterable[str]) -> None:
+        """行を出力済みとして記録する（ファイルへ書き出した後に呼ぶ）"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO lines VALUES (?)", ((_line_key(t),) for t in lines)
+            )
+
+    def seed_from_file(self, path: str) -> int:
+        """既存の出力ファイルの行を出力済みとして取り込む（状態ファイルがない初回用）"""
+        if not os.path.isfile(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        self.mark_lines(lines)
+        return len(lines)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def open_state(state_path: str, output_path: str, replace: bool) -> CrawlState | None:
+    """
+    --state の値から状態を開く（空文字なら None = 状態を使わない）。
+    replace なら作り直し、初回は既存の出力ファイルの行を取り込む。
+    """
+    if not state_path:
+        return None
+    state = CrawlState(state_path)
+    if replace:
+        state.reset()
+    elif state.is_new():
+        seeded = state.seed_from_file(output_path)
+        if seeded:
+            print(f"既存の {output_path} から {seeded} 行を出力済みとして取り込みました。")
+    return state
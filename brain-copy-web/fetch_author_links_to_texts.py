@@ -6,21 +6,64 @@
 - 各URLにアクセスして本文（タイトル・段落・見出し）を取得
 - 1行1テキストで texts.txt に追記（タイトル行＋本文の段落など）
 
+取得はホストごとに並行して行う。同じホストへは同時に 1 接続だけ、リクエストの開始間隔は
+FETCH_DELAY 秒（robots.txt に Crawl-delay があればその長い方）以上あけ、robots.txt で
+禁止された URL は取得しない。--url を複数指定すると、別ホストの著者ページは同時に進む。
+
+記事の ETag / Last-Modified・本文ハッシュと出力済みの行は --state（crawl_state.py）に保存し、
+次回は条件付き GET で変更のあった記事だけを解析し、まだ出力していない行だけを追記する。
+
+本文の抽出は selectolax → lxml → BeautifulSoup の順に使えるもの（--parser で指定可）で、
+本文コンテナを 1 回だけたどる。解析はプロセスプールで行い、取得と並行して進む。
+
+--ingest を指定すると、新しい・変更のあった記事を取得した順に knowledge-organizer へ
+まとめて投入する（ingest_sink.py）。取り込みと埋め込みはクロールと並行して進む。
+
 使い方:
   python3 fetch_author_links_to_texts.py --url "https://liginc.co.jp/author/arisan"
   python3 fetch_author_links_to_texts.py --url "https://liginc.co.jp/author/arisan" --output texts.txt --replace
+  python3 fetch_author_links_to_texts.py --url "https://a.example/author/x" --url "https://b.example/u/y"
+  python3 fetch_author_links_to_texts.py --url "https://liginc.co.jp/author/arisan" --ingest http://localhost:8000
 """
 
 import argparse
+import os
 import re
+import sys
+import threading
 import time
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
 
 import requests
 from bs4 import BeautifulSoup
 
-# 1リクエストあたりの間隔（秒）。サーバーに優しく
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+from crawl_state import content_hash, default_state_path, open_state
+from ingest_sink import INGEST_BATCH_SIZE, IngestSink
+
+# 同じホストへのリクエストの開始間隔（秒）。サーバーに優しく
 FETCH_DELAY = 1.0
+# 1 リクエストのタイムアウト（秒）と、失敗時の再試行回数
+FETCH_TIMEOUT = 15
+FETCH_RETRIES = 2
+# 同時に取得するホスト数の上限（1 ホストあたりは常に 1 接続）
+FETCH_WORKERS = 8
+# 429 / 503 の Retry-After はこの秒数までしか待たない
+MAX_RETRY_AFTER = 60.0
+USER_AGENT = "Mozilla/5.0 (compatible; fetch_author_links/1.0)"
+# robots.txt の User-agent 照合に使う名前
+ROBOTS_AGENT = "fetch_author_links"
 
 # 本文として扱うタグ
 CONTENT_TAGS = ["p", "h1", "h2", "h3", "h4", "li"]
@@ -36,17 +79,257 @@ CONTENT_SELECTORS = [
 ]
 
 
-def get_soup(url: str, session: requests.Session) -> BeautifulSoup | None:
+def parse_crawl_delay(lines: list[str], agent: str) -> float | None:
+    """
+    robots.txt から agent に適用される Crawl-delay を小数も含めて読む
+    （RobotFileParser.crawl_delay は整数しか受け付けない）。
+    グループの選び方は RobotFileParser と同じで、agent に合うグループ、なければ * のグループ。
+    """
+    name = agent.split("/")[0].lower()
+    groups: list[tuple[list[str], float | None]] = []
+    agents: list[str] = []
+    delay: float | None = None
+    in_rules = False
+    for raw in lines:
+        key, sep, value = raw.split("#", 1)[0].partition(":")
+        if not sep:
+            continue
+        key, value = key.strip().lower(), value.strip()
+        if key == "user-agent":
+            if in_rules:
+                groups.append((agents, delay))
+                agents, delay, in_rules = [], None, False
+            agents.append(value.lower())
+        elif agents:
+            in_rules = True
+            if key == "crawl-delay":
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                if not 0 <= delay < float("inf"):
+                    delay = None
+    if agents:
+        groups.append((agents, delay))
+    for group_agents, group_delay in groups:
+        if "*" not in group_agents and any(a in name for a in group_agents):
+            return group_delay
+    for group_agents, group_delay in groups:
+        if "*" in group_agents:
+            return group_delay
+    return None
+
+
+class _Host:
+    """1 ホスト分の状態（接続を使い回すセッション・robots.txt・次に開始してよい時刻）"""
+
+    def __init__(self, origin: str) -> None:
+        self.origin = origin
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.lock = threading.Lock()  # 同時に 1 接続だけ
+        self.robots: RobotFileParser | None = None
+        self.delay = FETCH_DELAY
+        self.next_at = 0.0
+
+
+class PoliteFetcher:
+    """
+    ホストごとの礼儀（1 接続・開始間隔・robots.txt）を守りながら、複数ホストを並行して取得する。
+    失敗（接続エラー・タイムアウト・429・5xx）は FETCH_RETRIES 回まで間隔をあけて再試行する。
+    """
+
+    def __init__(
+        self,
+        delay: float = FETCH_DELAY,
+        timeout: float = FETCH_TIMEOUT,
+        retries: int = FETCH_RETRIES,
+        workers: int = FETCH_WORKERS,
+    ) -> None:
+        self.delay = delay
+        self.timeout = timeout
+        self.retries = retries
+        self.workers = workers
+        self.stats: Counter[str] = Counter()
+        self.per_host: Counter[str] = Counter()
+        self._hosts: dict[str, _Host] = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def _host(self, url: str) -> _Host:
+        origin = self.origin(url)
+        with self._lock:
+            host = self._hosts.get(origin)
+            if host is None:
+                host = self._hosts[origin] = _Host(origin)
+                host.delay = self.delay
+            return host
+
+    def _wait_turn(self, host: _Host) -> None:
+        """host.lock を持った状態で、前回の開始から host.delay 秒たつまで待つ"""
+        wait = host.next_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        host.next_at = time.monotonic() + host.delay
+
+    def _load_robots(self, host: _Host) -> None:
+        """robots.txt を読む（host.lock を持った状態で呼ぶ）。取得できなければ制限なし"""
+        robots = RobotFileParser(host.origin + "/robots.txt")
+        crawl_delay = None
+        try:
+            self._wait_turn(host)
+            r = host.session.get(robots.url, timeout=self.timeout)
+            if r.status_code in (401, 403):
+                robots.disallow_all = True
+            elif r.ok:
+                lines = r.text.splitlines()
+                robots.parse(lines)
+                crawl_delay = parse_crawl_delay(lines, ROBOTS_AGENT)
+            else:
+                robots.allow_all = True
+        except requests.RequestException:
+            robots.allow_all = True
+        if crawl_delay and crawl_delay > host.delay:
+            # robots.txt 自体の取得から数えて Crawl-delay をあける
+            host.next_at += crawl_delay - host.delay
+            host.delay = crawl_delay
+        host.robots = robots
+
+    def get(self, url: str, headers: dict | None = None) -> requests.Response | None:
+        """
+        url を取得する。robots.txt で禁止・再試行しても失敗なら None。
+        headers に条件付き GET のヘッダーを渡した場合、未変更なら 304 のレスポンスを返す。
+        """
+        host = self._host(url)
+        with host.lock:
+            if host.robots is None:
+                self._load_robots(host)
+            if not host.robots.can_fetch(ROBOTS_AGENT, url):
+                print(f"  [robots] {url}")
+                self._count("robots", host)
+                return None
+            for attempt in range(self.retries + 1):
+                self._wait_turn(host)
+                try:
+                    r = host.session.get(url, timeout=self.timeout, headers=headers)
+                except requests.RequestException as e:
+                    error = str(e)
+                else:
+                    if r.status_code != 429 and r.status_code < 500:
+                        break
+                    error = f"HTTP {r.status_code}"
+                    retry_after = r.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        host.next_at = max(
+                            host.next_at,
+                            time.monotonic() + min(float(retry_after), MAX_RETRY_AFTER),
+                        )
+                if attempt < self.retries:
+                    self._count("retries", host)
+                    # 再試行は開始間隔の 2 倍、4 倍…と広げる
+                    host.next_at = max(host.next_at, time.monotonic() + host.delay * 2**attempt)
+            else:
+                print(f"  [skip] {url}: {error}")
+                self._count("failed", host)
+                return None
+        if r.status_code == 304:
+            self._count("not_modified", host)
+            return r
+        if not r.ok:
+            print(f"  [skip] {url}: HTTP {r.status_code}")
+            self._count("failed", host)
+            return None
+        self._count("fetched", host, size=len(r.content))
+        return r
+
+    def _count(self, key: str, host: _Host, size: int = 0) -> None:
+        with self._lock:
+            self.stats[key] += 1
+            self.stats["bytes"] += size
+            if key in ("fetched", "failed"):
+                self.per_host[f"{host.origin} {key}"] += 1
+
+    def map(self, func, items: list, url_of=lambda item: item) -> list:
+        """
+        items の各要素に func を適用して結果を items の順で返す。
+        要素はホスト（url_of(item) のオリジン）ごとにまとめ、ホスト内は順に、
+        ホスト同士は最大 workers 並行で処理する。func の中で self.get を使う。
+        """
+        results = [None] * len(items)
+        groups: dict[str, list[int]] = {}
+        for i, item in enumerate(items):
+            groups.setdefault(self.origin(url_of(item)), []).append(i)
+        done = Counter()
+
+        def run(indices: list[int]) -> None:
+            for i in indices:
+                results[i] = func(items[i])
+                with self._lock:
+                    done["n"] += 1
+                    print(f"  [{done['n']}/{len(items)}] {url_of(items[i])[:60]}")
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            for future in as_completed([pool.submit(run, g) for g in groups.values()]):
+                future.result()
+        return results
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self._started
+        lines = [
+            f"取得 {self.stats['fetched']} 件 / 未変更(304) {self.stats['not_modified']} 件 / "
+            f"失敗 {self.stats['failed']} 件 / "
+            f"robots.txt で除外 {self.stats['robots']} 件 / 再試行 {self.stats['retries']} 回 / "
+            f"{self.stats['bytes'] / 1024:.0f} KiB / {elapsed:.1f} 秒"
+        ]
+        for origin, host in sorted(self._hosts.items()):
+            lines.append(
+                f"  {origin}: 取得 {self.per_host[f'{origin} fetched']} 件, "
+                f"失敗 {self.per_host[f'{origin} failed']} 件, 間隔 {host.delay:.2f} 秒"
+            )
+        return "\n".join(lines)
+
+
+def _bs4_features() -> str:
+    return "lxml" if lxml_html is not None else "html.parser"
+
+
+def response_charset(r: requests.Response) -> str | None:
+    """Content-Type ヘッダーで明示された文字コード（なければ None）"""
+    match = re.search(r"charset=([\w\-]+)", r.headers.get("Content-Type", ""), re.I)
+    return match.group(1) if match else None
+
+
+def decode_html(content: bytes, charset: str | None = None) -> str:
+    """明示された文字コード → UTF-8 → 推定（charset_normalizer）の順で HTML を文字列にする"""
+    for encoding in filter(None, (charset, "utf-8")):
+        try:
+            return content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    from charset_normalizer import from_bytes  # requests の依存
+
+    best = from_bytes(content).best()
+    return str(best) if best is not None else content.decode("utf-8", "replace")
+
+
+def parse_response(r: requests.Response) -> BeautifulSoup | None:
     try:
-        r = session.get(url, timeout=15, headers={"User-Agent": "Mozilla/5.0 (compatible; fetch_author_links/1.0)"})
-        r.raise_for_status()
-        r.encoding = r.apparent_encoding or "utf-8"
-        return BeautifulSoup(r.text, "html.parser")
+        return BeautifulSoup(decode_html(r.content, response_charset(r)), _bs4_features())
     except Exception as e:
-        print(f"  [skip] {url}: {e}")
+        print(f"  [skip] {r.url}: {e}")
         return None
 
 
+def get_soup(url: str, fetcher: PoliteFetcher) -> BeautifulSoup | None:
+    r = fetcher.get(url)
+    return parse_response(r) if r is not None else None
+
+
 def _normalize_url(u: str) -> str:
     parsed = urlparse(u)
     path = parsed.path.rstrip("/") or "/"
@@ -81,16 +364,37 @@ def extract_article_links(soup: BeautifulSoup, base_url: str, domain: str) -> li
     return links
 
 
-def extract_page_content(soup: BeautifulSoup) -> list[str]:
-    """1ページから本文テキストのリストを取得（タイトル＋段落・見出し）"""
+def _content_lines(title: str | None, texts) -> list[str]:
+    """タイトルと本文要素のテキスト列から出力行を作る（全バックエンド共通）"""
     lines = []
-    # タイトル
+    if title:
+        t = title.strip()
+        if t and len(t) > 2:
+            lines.append(t[:500])
+    for t in texts:
+        t = (t or "").strip()
+        if not t or len(t) < 10:
+            continue
+        # 1行が長い場合は適度に分割（クラスタ用に扱いやすく）
+        if len(t) > 300:
+            for chunk in re.split(r"[。\n]+", t):
+                chunk = chunk.strip()
+                if len(chunk) >= 10:
+                    lines.append(chunk[:500])
+        else:
+            lines.append(t[:500])
+    return lines
+
+
+def extract_page_content(soup: BeautifulSoup) -> list[str]:
+    """1ページから本文テキストのリストを取得（タイトル＋段落・見出し）。BeautifulSoup 版"""
+    title = None
     for tag in ["h1", "title"]:
         el = soup.find(tag)
         if el:
             t = (el.get_text() or "").strip()
             if t and len(t) > 2:
-                lines.append(t[:500])
+                title = t
                 break
     # 本文コンテナを探す
     body = None
@@ -101,80 +405,281 @@ def extract_page_content(soup: BeautifulSoup) -> list[str]:
     if not body:
         body = soup.find("body")
     if not body:
-        return lines
-    for tag in CONTENT_TAGS:
-        for el in body.find_all(tag):
-            t = (el.get_text() or "").strip()
-            if not t or len(t) < 10:
-                continue
-            # 1行が長い場合は適度に分割（クラスタ用に扱いやすく）
-            if len(t) > 300:
-                for chunk in re.split(r"[。\n]+", t):
-                    chunk = chunk.strip()
-                    if len(chunk) >= 10:
-                        lines.append(chunk[:500])
-            else:
-                lines.append(t[:500])
-    return lines
+        return _content_lines(title, [])
+    # 本文コンテナを 1 回だけたどり、対象タグを文書順に取り出す
+    return _content_lines(title, (el.get_text() for el in body.find_all(CONTENT_TAGS)))
+
+
+def _css_to_xpath(selector: str) -> str:
+    """CONTENT_SELECTORS 程度の CSS（"tag" / ".class" / "tag.class" の子孫結合）を XPath に"""
+    steps = []
+    for step in selector.split():
+        tag, _, cls = step.partition(".")
+        cond = f"[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]" if cls else ""
+        steps.append((tag or "*") + cond)
+    return ".//" + "//".join(steps)
+
+
+def _extract_lxml(html: str) -> list[str]:
+    try:
+        doc = lxml_html.document_fromstring(html)
+    except ValueError:  # XML 宣言つきの文字列は bytes で渡す
+        doc = lxml_html.document_fromstring(html.encode("utf-8"))
+    title = None
+    for tag in ["h1", "title"]:
+        el = doc.find(f".//{tag}")
+        if el is not None:
+            t = el.text_content().strip()
+            if t and len(t) > 2:
+                title = t
+                break
+    body = None
+    for sel in CONTENT_SELECTORS:
+        found = doc.xpath(_css_to_xpath(sel))
+        if found:
+            body = found[0]
+            break
+    if body is None:
+        body = doc.find(".//body")
+    if body is None:
+        return _content_lines(title, [])
+    return _content_lines(title, (el.text_content() for el in body.iter(*CONTENT_TAGS)))
+
+
+def _extract_selectolax(html: str) -> list[str]:
+    tree = SelectolaxParser(html)
+    title = None
+    for tag in ["h1", "title"]:
+        el = tree.css_first(tag)
+        if el is not None:
+            t = el.text(deep=True).strip()
+            if t and len(t) > 2:
+                title = t
+                break
+    body = None
+    for sel in CONTENT_SELECTORS:
+        body = tree.css_first(sel)
+        if body is not None:
+            break
+    if body is None:
+        body = tree.body
+    if body is None:
+        return _content_lines(title, [])
+    tags = set(CONTENT_TAGS)
+    return _content_lines(
+        title,
+        (el.text(deep=True) for el in body.traverse(include_text=False) if el.tag in tags),
+    )
+
+
+def _extract_bs4(html: str) -> list[str]:
+    return extract_page_content(BeautifulSoup(html, _bs4_features()))
+
+
+# 本文抽出のバックエンド（auto では上から順に使えるものを選ぶ）
+PARSERS = {
+    "selectolax": _extract_selectolax,
+    "lxml": _extract_lxml,
+    "bs4": _extract_bs4,
+}
+
+
+def available_parsers() -> list[str]:
+    available = {"selectolax": SelectolaxParser is not None, "lxml": lxml_html is not None}
+    return [name for name in PARSERS if available.get(name, True)]
+
+
+def resolve_parser(name: str) -> str:
+    """--parser の値を実際に使うバックエンド名にする（未導入なら使えるものに落とす）"""
+    available = available_parsers()
+    if name == "auto":
+        return available[0]
+    if name not in available:
+        print(f"Warning: {name} が未導入のため {available[0]} で本文を抽出します。")
+        return available[0]
+    return name
+
+
+def extract_document(content: bytes, charset: str | None, parser: str) -> list[str]:
+    """HTML のバイト列から本文の行を取り出す（プロセスプールで実行する）"""
+    return PARSERS[parser](decode_html(content, charset))
+
+
+def _save_state(
+    state,
+    links: list[tuple[str, str]],
+    results: list[dict],
+    lines: list[str],
+    skip_urls: set[str] = frozenset(),
+) -> None:
+    """
+    書き出しが済んでから、取得できた記事の検証子と出力した行を記録する。
+    skip_urls（--ingest で投入に失敗した記事）と本文の解析に失敗した記事は記録せず、
+    次回また取得する。
+    """
+    if state is None:
+        return
+    state.mark_lines(lines)
+    for (_, url), result in zip(links, results):
+        if url in skip_urls:
+            continue
+        if result["status"] not in ("failed", "parse_failed") and "digest" in result:
+            state.record_url(url, result["etag"], result["last_modified"], result["digest"])
+    state.close()
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="著者ページの記事一覧を取得し、各リンク先の本文も取得して texts.txt に追記します。"
     )
-    parser.add_argument("--url", "-u", required=True, help="著者ページのURL（例: https://liginc.co.jp/author/arisan）")
+    parser.add_argument(
+        "--url", "-u", required=True, action="append",
+        help="著者ページのURL（例: https://liginc.co.jp/author/arisan）。複数指定するとホストごとに並行して取得。",
+    )
     parser.add_argument("--output", "-o", default="texts.txt", help="出力ファイル（デフォルト: texts.txt）")
     parser.add_argument("--replace", action="store_true", help="既存ファイルを上書きする。指定しない場合は追記。")
-    parser.add_argument("--max-articles", type=int, default=100, help="取得する記事数の上限（デフォルト: 100）")
+    parser.add_argument("--max-articles", type=int, default=100, help="著者ページ1つあたりの記事数の上限（デフォルト: 100）")
+    parser.add_argument("--delay", type=float, default=FETCH_DELAY, help=f"同じホストへのリクエスト間隔（秒、デフォルト: {FETCH_DELAY}）。robots.txt の Crawl-delay が長ければそちらを使用。")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS, help=f"同時に取得するホスト数の上限（デフォルト: {FETCH_WORKERS}）")
+    parser.add_argument("--retries", type=int, default=FETCH_RETRIES, help=f"失敗時の再試行回数（デフォルト: {FETCH_RETRIES}）")
+    parser.add_argument("--timeout", type=float, default=FETCH_TIMEOUT, help=f"1リクエストのタイムアウト秒（デフォルト: {FETCH_TIMEOUT}）")
+    parser.add_argument("--parser", choices=["auto", *PARSERS], default="auto", help="本文抽出のバックエンド。auto（デフォルト）は selectolax → lxml → bs4 の順に導入済みのものを使用。")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1, help="本文を解析するプロセス数（デフォルト: CPU 数）。0 で取得スレッド内で解析。")
+    parser.add_argument("--state", default=None, help="クロール状態（ETag・本文ハッシュ・出力済みの行）の保存先（デフォルト: <出力ファイル>.crawl.sqlite）。空文字で状態を使わない。")
+    parser.add_argument("--ingest", default=None, metavar="TARGET", help="取り出した記事を knowledge-organizer に直接投入する。API の URL（例: http://localhost:8000）か inprocess（このプロセス内で投入）。")
+    parser.add_argument("--collection", default=None, help="--ingest で投入するコレクション名")
+    parser.add_argument("--enrich", action="store_true", help="--ingest で LLM によるタグ付け・要約も行う（デフォルトは行わない）")
+    parser.add_argument("--ingest-batch", type=int, default=INGEST_BATCH_SIZE, help=f"--ingest で 1 回に送る記事数（デフォルト: {INGEST_BATCH_SIZE}）")
     args = parser.parse_args()
 
-    base_url = args.url.strip()
-    domain = urlparse(base_url).netloc
-    session = requests.Session()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    outpath = os.path.join(script_dir, args.output)
+    state_path = default_state_path(outpath) if args.state is None else args.state
+    state = open_state(state_path, outpath, replace=args.replace)
+    parser_name = resolve_parser(args.parser)
+    print(f"本文抽出: {parser_name}（解析プロセス {args.parse_workers}）")
 
-    print(f"著者ページを取得: {base_url}")
-    soup = get_soup(base_url, session)
-    if not soup:
-        print("著者ページの取得に失敗しました。")
-        return
-    links = extract_article_links(soup, base_url, domain)
-    # 重複タイトルで同じURLのものは1本に
+    fetcher = PoliteFetcher(
+        delay=args.delay, timeout=args.timeout, retries=args.retries, workers=args.workers
+    )
+    base_urls = list(dict.fromkeys(u.strip() for u in args.url if u.strip()))
+
+    print(f"著者ページを取得: {', '.join(base_urls)}")
+    soups = fetcher.map(lambda u: get_soup(u, fetcher), base_urls)
     by_url = {}
-    for title, url in links:
-        if url not in by_url or len(title) > len(by_url[url][0]):
-            by_url[url] = (title, url)
-    links = list(by_url.values())[: args.max_articles]
+    for base_url, soup in zip(base_urls, soups):
+        if not soup:
+            print(f"著者ページの取得に失敗しました: {base_url}")
+            continue
+        # 重複タイトルで同じURLのものは1本に
+        page_links = {}
+        for title, url in extract_article_links(soup, base_url, urlparse(base_url).netloc):
+            if url not in page_links or len(title) > len(page_links[url][0]):
+                page_links[url] = (title, url)
+        for url, link in list(page_links.items())[: args.max_articles]:
+            by_url.setdefault(url, link)
+    if not any(soups):
+        return
+    links = list(by_url.values())
     print(f"記事リンクを {len(links)} 件取得しました。")
 
-    all_lines = []
-    for i, (title, url) in enumerate(links, 1):
-        print(f"  [{i}/{len(links)}] {url[:60]}...")
-        time.sleep(FETCH_DELAY)
-        page_soup = get_soup(url, session)
-        if not page_soup:
-            all_lines.append(title)  # タイトルのみ
+    def fetch_article(link: tuple[str, str]) -> dict:
+        """記事を取得して本文を取り出す。status は ok / unchanged / failed / parse_failed"""
+        url = link[1]
+        r = fetcher.get(url, headers=state.conditional_headers(url) if state else None)
+        if r is None:
+            return {"status": "failed"}
+        if r.status_code == 304:
+            return {"status": "unchanged"}
+        digest = content_hash(r.content)
+        result = {
+            "status": "ok",
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "digest": digest,
+        }
+        if state and state.is_unchanged(url, digest):
+            # 検証子を返さないサーバーでも、本文が同じなら解析しない
+            return {**result, "status": "unchanged"}
+        job = (r.content, response_charset(r), parser_name)
+        if parse_pool is None:
+            try:
+                content = extract_document(*job)
+            except Exception as e:
+                print(f"  [skip] 本文の解析に失敗: {url}: {e}")
+                return {**result, "status": "parse_failed", "content": []}
+        else:
+            # 解析は別プロセスに任せ、このスレッドはすぐ次の取得へ進む
+            content = parse_pool.submit(extract_document, *job)
+        if sink is not None:
+            # 送信キューが満杯なら空くまで待つ（取り込みが追いつくまで取得を進めない）
+            sink.put(link[0], url, content)
+        return {**result, "content": content}
+
+    sink = None
+    if args.ingest:
+        sink = IngestSink(
+            args.ingest,
+            collection=args.collection,
+            enrich=args.enrich,
+            batch_size=args.ingest_batch,
+        )
+    parse_pool = ProcessPoolExecutor(args.parse_workers) if args.parse_workers > 0 else None
+    try:
+        results = fetcher.map(fetch_article, links, url_of=lambda link: link[1])
+        for (_, url), result in zip(links, results):
+            if isinstance(result.get("content"), Future):
+                try:
+                    result["content"] = result["content"].result()
+                except Exception as e:
+                    print(f"  [skip] 本文の解析に失敗: {url}: {e}")
+                    result["status"] = "parse_failed"
+                    result["content"] = []
+    finally:
+        if sink is not None:
+            sink.close()
+        if parse_pool is not None:
+            parse_pool.shutdown(cancel_futures=True)
+    print(fetcher.summary())
+    if sink is not None:
+        print(sink.summary())
+
+    candidates = []
+    unchanged = 0
+    for (title, url), result in zip(links, results):
+        if result["status"] == "unchanged":
+            unchanged += 1
             continue
-        content = extract_page_content(page_soup)
+        content = result.get("content")
         if content:
-            all_lines.append(content[0] if content[0] else title)  # 1行目はタイトル
-            for line in content[1:]:
-                if line and line not in all_lines:
-                    all_lines.append(line)
+            candidates.append(content[0] if content[0] else title)  # 1行目はタイトル
+            candidates.extend(line for line in content[1:] if line)
         else:
-            all_lines.append(title)
+            candidates.append(title)  # タイトルのみ
+    if unchanged:
+        print(f"変更のない記事 {unchanged} 件はスキップしました。")
 
-    import os
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    outpath = os.path.join(script_dir, args.output)
-    mode = "w" if args.replace else "a"
-    need_newline = not args.replace and os.path.isfile(outpath) and os.path.getsize(outpath) > 0
-    with open(outpath, mode, encoding="utf-8") as f:
-        if need_newline:
+    # 実行をまたいで（状態がなければこの実行内で）まだ出力していない行だけ
+    all_lines = state.unseen_lines(candidates) if state else list(dict.fromkeys(candidates))
+    if all_lines:
+        mode = "w" if args.replace else "a"
+        need_newline = (
+            not args.replace and os.path.isfile(outpath) and os.path.getsize(outpath) > 0
+        )
+        with open(outpath, mode, encoding="utf-8") as f:
+            if need_newline:
+                f.write("\n")
+            f.write("\n".join(all_lines))
             f.write("\n")
-        f.write("\n".join(all_lines))
-        f.write("\n")
+        print(f"{len(all_lines)} 行を {outpath} に{'上書き' if args.replace else '追記'}しました。")
+    else:
+        print("新しい行はありません。")
 
-    print(f"{len(all_lines)} 行を {outpath} に{'上書き' if args.replace else '追記'}しました。")
+    failed_urls = sink.failed_sources if sink is not None else set()
+    _save_state(state, links, results, all_lines, skip_urls=failed_urls)
+    if sink is not None and sink.stats["failed"]:
+        failed = sink.stats["failed"]
+        sys.exit(f"取り込みに失敗した記事が {failed} 件あります（次回の実行で送り直します）。")
 
 
 if __name__ == "__main__":
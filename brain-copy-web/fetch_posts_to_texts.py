@@ -12,13 +12,21 @@ Mistral Agents の Websearch ツールを使用:
 環境変数:
   MISTRAL_API_KEY  … 必須（.env または knowledge-organizer/.env から読む）
   PERSON_BASE_URL  … --url 未指定時に使用
+
+出力済みの行のハッシュを --state（crawl_state.py）に保存し、まだ出力していない行だけを追記する。
+--ingest を指定すると、追記した行を 1 行 1 ドキュメントとして knowledge-organizer へ投入する
+（ingest_sink.py）。
 """
 
 import argparse
 import os
 import re
+import sys
 from typing import List
 
+from crawl_state import default_state_path, open_state
+from ingest_sink import INGEST_BATCH_SIZE, IngestSink
+
 try:
     from dotenv import load_dotenv
     _script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -132,6 +140,29 @@ def main():
         default="mistral-large-latest",
         help="Mistral チャットモデル（デフォルト: mistral-large-latest）",
     )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help="出力済みの行の記録先（デフォルト: <出力ファイル>.crawl.sqlite）。空文字で記録しない。",
+    )
+    parser.add_argument(
+        "--ingest",
+        default=None,
+        metavar="TARGET",
+        help="追記した行を knowledge-organizer に直接投入する。API の URL（例: http://localhost:8000）か inprocess。",
+    )
+    parser.add_argument("--collection", default=None, help="--ingest で投入するコレクション名")
+    parser.add_argument(
+        "--enrich",
+        action="store_true",
+        help="--ingest で LLM によるタグ付け・要約も行う（デフォルトは行わない）",
+    )
+    parser.add_argument(
+        "--ingest-batch",
+        type=int,
+        default=INGEST_BATCH_SIZE,
+        help=f"--ingest で 1 回に送る行数（デフォルト: {INGEST_BATCH_SIZE}）",
+    )
     args = parser.parse_args()
 
     if not args.url or not args.url.strip():
@@ -149,14 +180,49 @@ def main():
         return
 
     outpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.output)
-    mode = "w" if args.replace else "a"
-    with open(outpath, mode, encoding="utf-8") as f:
-        if not args.replace and os.path.getsize(outpath) > 0:
-            f.write("\n")
-        f.write("\n".join(lines))
-        f.write("\n")
+    state_path = default_state_path(outpath) if args.state is None else args.state
+    state = open_state(state_path, outpath, replace=args.replace)
+    # 以前の実行で出力した行（状態がなければこの結果内の重複）を除く
+    fetched = len(lines)
+    lines = state.unseen_lines(lines) if state else list(dict.fromkeys(lines))
+    if not lines:
+        print(f"取得した {fetched} 件はすべて出力済みです。")
+        return
 
-    print(f"{len(lines)} 件を {outpath} に{'上書き' if args.replace else '追記'}しました。")
+    failed: set[str] = set()
+    if args.ingest:
+        # 状態に記録する前に送り、失敗した行は次回また取得して送り直す
+        sink = IngestSink(
+            args.ingest,
+            collection=args.collection,
+            enrich=args.enrich,
+            batch_size=args.ingest_batch,
+        )
+        for line in lines:
+            sink.put(line, url, [line])
+        sink.close()
+        print(sink.summary())
+        failed = {line for line in lines if sink.has_failed([line])}
+
+    # 状態があれば失敗した行は出力にも状態にも入れない（次回の出力と重ならないように）
+    written = [line for line in lines if line not in failed] if state else lines
+    if written:
+        mode = "w" if args.replace else "a"
+        with open(outpath, mode, encoding="utf-8") as f:
+            if not args.replace and os.path.getsize(outpath) > 0:
+                f.write("\n")
+            f.write("\n".join(written))
+            f.write("\n")
+        print(f"{len(written)} 件を {outpath} に{'上書き' if args.replace else '追記'}しました。")
+    if state:
+        state.mark_lines(written)
+        state.close()
+
+    if failed:
+        message = f"取り込みに失敗した行が {len(failed)} 件あります"
+        if state:
+            message += "（次回の実行で送り直します）"
+        sys.exit(message + "。")
 
 
 if __name__ == "__main__":
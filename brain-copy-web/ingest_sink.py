@@ -0,0 +1,268 @@
+"""
+fetch_*_to_texts.py で取り出した記事を、knowledge-organizer の取り込みへ直接流す（--ingest）。
+
+- put() は有界キューに積むだけで、送信は別スレッドが行う。キューが満杯なら put() が待つので、
+  取り込み（埋め込み）が追いつかないときはクロールの方が遅くなる（バックプレッシャー）
+- 送信スレッドは batch_size 件たまるか、最初の 1 件から flush_interval 秒たつとまとめて送る。
+  取り込みと埋め込みはクロールと並行して進む
+- 本文の SHA-256 が同じ記事はこの実行内で 1 回だけ送る。既存ドキュメントとの重複は
+  取り込み側が content_hash で埋め込みの前に除く
+- 送信に失敗した記事の出典は failed_sources に、本文は has_failed() で分かる（呼び出し側は
+  クロール状態に記録せず、次回送り直す）
+
+送り先:
+  http://localhost:8000 など  … POST {URL}/ingest/batch（失敗時は再試行）
+  inprocess                  … knowledge-organizer をこのプロセス内で呼ぶ（API サーバー不要）。
+                                 knowledge-organizer/.env を読み、DB・Qdrant の相対パスは
+                                 knowledge-organizer ディレクトリ基準で解決する
+"""
+
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+INGEST_BATCH_SIZE = 16
+# IngestBatchRequest.documents の上限（これより多ければ分けて送る）
+INGEST_BATCH_MAX = 256
+INGEST_QUEUE_SIZE = 64
+INGEST_FLUSH_INTERVAL = 2.0
+INGEST_TIMEOUT = 300
+INGEST_RETRIES = 3
+# IngestRequest.text の最小文字数
+MIN_TEXT_LENGTH = 10
+
+ORGANIZER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge-organizer")
+
+_STOP = object()
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _join_lines(lines) -> tuple[list[str], str]:
+    """空行を除いた行と、それをつないだ本文"""
+    lines = [line for line in lines or [] if line]
+    return lines, "\n".join(lines)
+
+
+class HttpTransport:
+    """POST {base_url}/ingest/batch で送る"""
+
+    def __init__(
+        self, base_url: str, timeout: float = INGEST_TIMEOUT, retries: int = INGEST_RETRIES
+    ) -> None:
+        self.url = base_url.rstrip("/") + "/ingest/batch"
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+
+    def send(self, documents: list[dict]) -> list[dict]:
+        results: list[dict] = []
+        for start in range(0, len(documents), INGEST_BATCH_MAX):
+            results.extend(self._post(documents[start:start + INGEST_BATCH_MAX]))
+        return results
+
+    def _post(self, documents: list[dict]) -> list[dict]:
+        for attempt in range(self.retries + 1):
+            try:
+                r = self.session.post(self.url, json={"documents": documents}, timeout=self.timeout)
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+            else:
+                if r.status_code < 500 or attempt == self.retries:
+                    r.raise_for_status()
+                    return r.json()["results"]
+            time.sleep(2 ** attempt)
+        raise RuntimeError("unreachable")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _organizer_environment() -> None:
+    """
+    knowledge-organizer の設定をこのプロセスの作業ディレクトリによらず解決できるよう、
+    knowledge-organizer/.env の値を環境変数に入れ（設定済みの値が優先）、
+    SQLite・Qdrant の相対パスを knowledge-organizer 基準の絶対パスにする。
+    """
+    from dotenv import dotenv_values
+
+    for key, value in dotenv_values(os.path.join(ORGANIZER_DIR, ".env")).items():
+        if value is not None:
+            os.environ.setdefault(key.upper(), value)
+
+    sys.path.insert(0, ORGANIZER_DIR)
+    from core.config import Settings
+
+    url = os.environ.get("DATABASE_URL", Settings.model_fields["database_url"].default)
+    prefix = "sqlite:///"
+    path = url[len(prefix):]
+    if url.startswith(prefix) and path and path != ":memory:" and not os.path.isabs(path):
+        os.environ["DATABASE_URL"] = prefix + os.path.normpath(os.path.join(ORGANIZER_DIR, path))
+    qdrant_path = os.environ.get("QDRANT_PATH")
+    if qdrant_path and not os.path.isabs(qdrant_path):
+        os.environ["QDRANT_PATH"] = os.path.normpath(os.path.join(ORGANIZER_DIR, qdrant_path))
+
+
+class InProcessTransport:
+    """knowledge-organizer の取り込みサービスを直接呼ぶ"""
+
+    def __init__(self) -> None:
+        _organizer_environment()
+        from apps.api.schemas.ingest import IngestRequest
+        from apps.api.services.ingest import ingest_documents
+        from storage.sql.repo import get_session, init_db
+        from storage.vector.client import ensure_collection_exists
+
+        init_db()
+        ensure_collection_exists()
+        self._request = IngestRequest
+        self._ingest = ingest_documents
+        self._session = get_session
+
+    def send(self, documents: list[dict]) -> list[dict]:
+        with self._session() as session:
+            results = self._ingest(session, [self._request(**d) for d in documents])
+        return [r.model_dump() for r in results]
+
+    def close(self) -> None:
+        pass
+
+
+def make_transport(target: str):
+    if target == "inprocess":
+        return InProcessTransport()
+    if target.startswith(("http://", "https://")):
+        return HttpTransport(target)
+    raise ValueError(f"--ingest は http(s):// の URL か inprocess を指定してください: {target}")
+
+
+class IngestSink:
+    """記事を有界キュー経由でまとめて取り込みへ送る"""
+
+    def __init__(
+        self,
+        target: str,
+        collection: str | None = None,
+        enrich: bool = False,
+        batch_size: int = INGEST_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+    ) -> None:
+        self.transport = make_transport(target)
+        self.collection = collection
+        self.enrich = enrich
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._seen: set[bytes] = set()
+        self.failed_sources: set[str] = set()
+        self._failed_keys: set[bytes] = set()
+        self.stats = {"sent": 0, "ingested": 0, "duplicates": 0, "skipped": 0, "failed": 0}
+        self._latencies: list[float] = []
+        self._thread = threading.Thread(target=self._run, name="ingest-sink", daemon=True)
+        self._thread.start()
+
+    def put(self, title: str, source: str | None, content) -> None:
+        """
+        記事を送信キューに積む（満杯なら空くまで待つ）。
+        content は行のリスト、またはそれを返す Future（解析プロセスの結果）。
+        """
+        self._queue.put((time.monotonic(), title, source, content))
+
+    def _document(self, item) -> tuple[float, dict] | None:
+        queued_at, title, source, content = item
+        if isinstance(content, Future):
+            try:
+                content = content.result()
+            except Exception:
+                content = None
+        lines, text = _join_lines(content)
+        if len(text) < MIN_TEXT_LENGTH:
+            self.stats["skipped"] += 1
+            return None
+        key = _text_key(text)
+        if key in self._seen:
+            self.stats["skipped"] += 1
+            return None
+        self._seen.add(key)
+        return queued_at, {
+            "text": text,
+            "title": lines[0][:200] or title,
+            "source": source,
+            "collection": self.collection,
+            "auto_tag": self.enrich,
+            "auto_summarize": self.enrich,
+        }
+
+    def _flush(self, batch: list[tuple[float, dict]]) -> None:
+        if not batch:
+            return
+        self.stats["sent"] += len(batch)
+        try:
+            results = self.transport.send([doc for _, doc in batch])
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            self.failed_sources.update(doc["source"] for _, doc in batch if doc["source"])
+            self._failed_keys.update(_text_key(doc["text"]) for _, doc in batch)
+            print(f"  [ingest] {len(batch)} 件の送信に失敗: {e}")
+            return
+        duplicates = sum(bool(r.get("duplicate")) for r in results)
+        self.stats["duplicates"] += duplicates
+        self.stats["ingested"] += len(results) - duplicates
+        now = time.monotonic()
+        self._latencies.extend(now - queued_at for queued_at, _ in batch)
+
+    def _run(self) -> None:
+        batch: list[tuple[float, dict]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(batch)
+                batch = []
+                continue
+            if item is _STOP:
+                break
+            doc = self._document(item)
+            if doc is None:
+                continue
+            if not batch:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        self._flush(batch)
+
+    def close(self) -> None:
+        """キューに残った記事を送り終えるまで待つ"""
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.transport.close()
+
+    def has_failed(self, content) -> bool:
+        """put() に渡した content（行のリスト）の記事が送信に失敗したか。close() の後に使う"""
+        return _text_key(_join_lines(content)[1]) in self._failed_keys
+
+    def summary(self) -> str:
+        s = self.stats
+        text = (
+            f"取り込み: 送信 {s['sent']} 件（新規 {s['ingested']}、重複 {s['duplicates']}、"
+            f"失敗 {s['failed']}）、送信前に除外 {s['skipped']} 件"
+        )
+        if self._latencies:
+            avg = sum(self._latencies) / len(self._latencies)
+            worst = max(self._latencies)
+            text += f"、取得から取り込み完了まで 平均 {avg:.1f} 秒・最大 {worst:.1f} 秒"
+        return text
@@ -1,13 +1,25 @@
 """FastAPI アプリケーションのエントリポイント"""
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from apps.api.routers import cluster, collections, ingest_text, related, search, summarize
+from apps.api.routers import (
+    cluster,
+    collections,
+    documents,
+    graph,
+    ingest_text,
+    related,
+    search,
+    summarize,
+)
+from apps.api.services import clustering, graph_analytics
 from core.config import get_settings
 from core.logging import setup_logging
-from storage.sql.repo import init_db
+from storage.graph_cache import get_graph_cache
+from storage.sql.repo import get_session, init_db
 from storage.vector.client import ensure_collection_exists
 
 settings = get_settings()
@@ -18,7 +30,18 @@ async def lifespan(app: FastAPI):
     setup_logging()
     init_db()
     ensure_collection_exists()
+    if settings.graph_cache_enabled:
+        with get_session() as session:
+            get_graph_cache().build(session)
+    jobs = []
+    if settings.graph_analytics_interval > 0:
+        jobs.append(graph_analytics.run_periodically(settings.graph_analytics_interval))
+    if settings.cluster_refine_interval > 0:
+        jobs.append(clustering.run_periodically(settings.cluster_refine_interval))
+    tasks = [asyncio.create_task(job) for job in jobs]
     yield
+    for task in tasks:
+        task.cancel()
 
 
 app = FastAPI(
@@ -41,6 +64,8 @@ app.include_router(related.router)
 app.include_router(summarize.router)
 app.include_router(collections.router)
 app.include_router(cluster.router)
+app.include_router(documents.router)
+app.include_router(graph.router)
 
 
 @app.get("/health")
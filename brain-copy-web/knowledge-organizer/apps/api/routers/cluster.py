@@ -1,66 +1,250 @@
-"""POST /cluster/points-csv – texts から cluster_points.csv を生成"""
-import csv
-from io import StringIO
-
+"""/cluster – クラスタ点群（CSV / バイナリ）の生成と、保存済みクラスタモデル（逐次学習）の管理"""
 import numpy as np
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import PlainTextResponse
-from sklearn.decomposition import PCA
-from sklearn.metrics.pairwise import euclidean_distances
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session
 
-from apps.api.schemas.cluster import ClusterPointsRequest
-from pipelines.enrich.embedder import embed_texts
-from pipelines.relate.cluster import cluster_vectors
+from apps.api.schemas.cluster import (
+    ClusterAssignmentSchema,
+    ClusterMapSchema,
+    ClusterModelSchema,
+    ClusterPointsRequest,
+    ClusterRefineRequest,
+    ClusterStoredRequest,
+    ClusterTileResponse,
+)
+from apps.api.services.cluster_cache import get_cluster_cache, get_embedding_cache
+from apps.api.services.cluster_tiles import get_tile_store
+from apps.api.services.points_export import (
+    export_response,
+    iter_points_binary,
+    iter_points_csv,
+)
+from core.config import get_settings
+from pipelines.relate.cluster_models import GLOBAL_SCOPE, refine_cluster_model
+from pipelines.relate.layout import ClusterLayout
+from pipelines.relate.tiles import DEPTH, MAX_ZOOM
+from storage.sql import repo
+from storage.sql.repo import db_session
+from storage.vector.indexes import build_scope_filter, fetch_chunk_vectors, fetch_doc_vectors
 
 router = APIRouter(prefix="/cluster", tags=["cluster"])
 
+settings = get_settings()
+
 
-def _project_to_2d(vectors: list[list[float]]) -> np.ndarray:
-    arr = np.asarray(vectors, dtype=np.float32)
-    pca = PCA(n_components=2, random_state=42)
-    return pca.fit_transform(arr)
+def _points_response(
+    layout: ClusterLayout,
+    texts: list[str],
+    fmt: str,
+    accept_encoding: str | None,
+) -> StreamingResponse:
+    """
+    レイアウトとテキストを GraphDataLoader 形式の CSV またはバイナリでストリーミングする。
+    同じレイアウトはタイル配信用にも登録し（索引は最初のタイル要求まで作らない）、
+    X-Cluster-Map ヘッダーで map_id を返す。
+    """
+    map_id = get_tile_store().register(layout, texts)
+    if fmt == "binary":
+        chunks = iter_points_binary(layout.coords, layout.labels, layout.neighbors, texts)
+        response = export_response(
+            chunks, "application/octet-stream", "cluster_points.bin", accept_encoding
+        )
+    else:
+        chunks = iter_points_csv(layout.coords, layout.labels, layout.neighbors, texts)
+        response = export_response(
+            chunks, "text/csv; charset=utf-8", "cluster_points.csv", accept_encoding
+        )
+    response.headers["X-Cluster-Map"] = map_id
+    return response
 
 
-def _build_connections(vectors: list[list[float]], top_edges: int) -> list[list[int]]:
-    arr = np.asarray(vectors, dtype=np.float64)
-    n = arr.shape[0]
-    connected_to: list[list[int]] = [[] for _ in range(n)]
-    if top_edges <= 0 or n <= 1:
-        return connected_to
+def _stored_points(session: Session, req: ClusterStoredRequest) -> tuple[list[str], np.ndarray]:
+    """collection / tags / level に合う保存済みベクターと表示テキストを取り出す"""
+    filter_ = build_scope_filter(_resolve_scope(session, req.collection), req.tags)
+    if req.level == "chunk":
+        _, doc_ids, texts, vectors = fetch_chunk_vectors(filter_=filter_)
+        known = repo.get_documents(session, doc_ids)
+        keep = [i for i, d in enumerate(doc_ids) if d in known]
+        texts = [texts[i] for i in keep]
+    else:
+        doc_ids, vectors = fetch_doc_vectors(filter_=filter_)
+        known = repo.get_documents(session, doc_ids)
+        keep = [i for i, d in enumerate(doc_ids) if d in known]
+        texts = [known[doc_ids[i]].title for i in keep]
+    if len(texts) < 2:
+        raise HTTPException(status_code=422, detail="対象のドキュメントが2件以上必要です。")
+    return texts, vectors[keep]
+
+
+def _map_schema(map_id: str) -> ClusterMapSchema:
+    index = get_tile_store().get_map(map_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Map not found")
+    return ClusterMapSchema(
+        map_id=map_id,
+        points=len(index),
+        clusters=index.n_clusters,
+        bounds=index.bounds(),
+        max_zoom=MAX_ZOOM,
+        tile_url=f"/cluster/tiles/{{z}}/{{x}}/{{y}}?map={map_id}",
+    )
+
 
-    dists = euclidean_distances(arr)
-    k_actual = min(top_edges, n - 1)
-    for i in range(n):
-        idx_dist = [(j, float(dists[i, j])) for j in range(n) if j != i]
-        idx_dist.sort(key=lambda t: t[1])
-        connected_to[i] = [j for j, _ in idx_dist[:k_actual]]
-    return connected_to
+def _resolve_scope(session: Session, collection: str | None) -> str | None:
+    """コレクション名または ID をコレクション ID にする（未指定は None = 全体）"""
+    if not collection:
+        return None
+    col = repo.resolve_collection(session, collection)
+    if col is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return col.id
 
 
-@router.post("/points-csv", response_class=PlainTextResponse)
-def cluster_points_csv(req: ClusterPointsRequest):
+@router.post("/points-csv", response_class=StreamingResponse)
+def cluster_points_csv(
+    req: ClusterPointsRequest,
+    accept_encoding: str | None = Header(default=None),
+):
     texts = [t.strip() for t in req.texts if t and t.strip()]
     if len(texts) < 2:
         raise HTTPException(status_code=422, detail="texts は2件以上必要です。")
 
     try:
-        vectors = embed_texts(texts)
+        vectors = get_embedding_cache().embed(texts)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"埋め込み生成に失敗: {exc}") from exc
 
-    labels = cluster_vectors(vectors, n_clusters=req.clusters)
-    coords_2d = _project_to_2d(vectors)
-    connected_to = _build_connections(vectors, req.top_edges)
-
-    output = StringIO()
-    writer = csv.writer(output, lineterminator="\n")
-    writer.writerow(["x", "y", "text", "cluster", "connected_to"])
-    for idx, ((x, y), label, text) in enumerate(zip(coords_2d, labels, texts)):
-        conn = ";".join(str(j) for j in connected_to[idx])
-        writer.writerow([f"{x:.6f}", f"{y:.6f}", text, int(label), conn])
-
-    return PlainTextResponse(
-        output.getvalue(),
-        media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": "attachment; filename=cluster_points.csv"},
+    layout = get_cluster_cache().layout(
+        vectors, req.clusters, req.top_edges, req.neighbor_search, refit=req.refit
+    )
+    return _points_response(layout, texts, req.format, accept_encoding)
+
+
+@router.post("/stored-csv", response_class=StreamingResponse)
+def cluster_stored_csv(
+    req: ClusterStoredRequest,
+    accept_encoding: str | None = Header(default=None),
+    session: Session = Depends(db_session),
+):
+    """投入済みドキュメントを Qdrant の保存済みベクターでクラスタ化する（埋め込み API なし）"""
+    texts, vectors = _stored_points(session, req)
+    layout = get_cluster_cache().layout(
+        vectors, req.clusters, req.top_edges, req.neighbor_search, refit=req.refit
+    )
+    return _points_response(layout, texts, req.format, accept_encoding)
+
+
+@router.post("/maps", response_model=ClusterMapSchema)
+def create_map(req: ClusterStoredRequest, session: Session = Depends(db_session)):
+    """投入済みドキュメントのレイアウトをタイル配信用に登録する（点群そのものは返さない）"""
+    texts, vectors = _stored_points(session, req)
+    layout = get_cluster_cache().layout(
+        vectors, req.clusters, req.top_edges, req.neighbor_search, refit=req.refit
+    )
+    return _map_schema(get_tile_store().register(layout, texts))
+
+
+@router.get("/maps/{map_id}", response_model=ClusterMapSchema)
+def get_map(map_id: str):
+    return _map_schema(map_id)
+
+
+@router.get("/tiles/{z}/{x}/{y}", response_model=ClusterTileResponse)
+def cluster_tile(
+    z: int = Path(ge=0, le=DEPTH),
+    x: int = Path(ge=0),
+    y: int = Path(ge=0),
+    map_id: str = Query(..., alias="map", description="/cluster/maps などが返す map_id"),
+    max_points: int = Query(
+        default=settings.cluster_tile_max_points,
+        ge=1,
+        le=10000,
+        description="タイル内の点がこれ以下なら個別の点、超えたら集約して返す",
+    ),
+    max_edges: int = Query(default=512, ge=0, le=20000, description="スコア上位この本数まで"),
+    min_score: float = Query(default=-1.0, description="返すエッジの最小類似度"),
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    四分木タイル。ズーム z では 2^z × 2^z 枚に分かれ、タイル (x, y) は
+    bounds の範囲の点を持つ（y はデータの y 座標が増える向き）。
+    map_id が同じなら内容は変わらないので、長期キャッシュしてよい。
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    store = get_tile_store()
+    key = (map_id, z, x, y, max_points, max_edges, min_score)
+    etag = '"' + "-".join(str(part) for part in key) + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    body = store.get_tile(key)
+    if body is None:
+        index = store.get_map(map_id)
+        if index is None:
+            raise HTTPException(status_code=404, detail="Map not found")
+        tile = index.tile(
+            z, x, y, max_points=max_points, max_edges=max_edges, min_score=min_score
+        )
+        body = ClusterTileResponse(
+            map_id=map_id, z=z, x=x, y=y, bounds=index.tile_bounds(z, x, y), **tile
+        ).model_dump_json().encode("utf-8")
+        store.put_tile(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post("/models/refine", response_model=ClusterModelSchema)
+def refine_model(req: ClusterRefineRequest, session: Session = Depends(db_session)):
+    """保存済みベクターで逐次クラスタリングの重心を更新し、割り当てを作り直す"""
+    collection_id = _resolve_scope(session, req.collection)
+    result = refine_cluster_model(
+        session, collection_id=collection_id, n_clusters=req.n_clusters, epochs=req.epochs
+    )
+    record = repo.get_cluster_model(session, result["scope"])
+    if record is None:
+        raise HTTPException(
+            status_code=422,
+            detail=f"クラスタ数 {result['n_clusters']} 以上のドキュメントが必要です。",
+        )
+    return ClusterModelSchema(
+        scope=record.scope,
+        n_clusters=record.n_clusters,
+        n_seen=record.n_seen,
+        updated_at=record.updated_at,
+        sizes=result["sizes"],
+    )
+
+
+@router.get("/models", response_model=list[ClusterModelSchema])
+def list_models(session: Session = Depends(db_session)):
+    return [
+        ClusterModelSchema(
+            scope=m.scope,
+            n_clusters=m.n_clusters,
+            n_seen=m.n_seen,
+            updated_at=m.updated_at,
+            sizes=repo.count_cluster_sizes(session, m.scope),
+        )
+        for m in repo.list_cluster_models(session)
+    ]
+
+
+@router.get("/assignments", response_model=list[ClusterAssignmentSchema])
+def list_assignments(
+    collection: str | None = Query(default=None, description="コレクション名または ID"),
+    cluster: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=1000, ge=1, le=100000),
+    offset: int = Query(default=0, ge=0),
+    session: Session = Depends(db_session),
+):
+    """保存済みのクラスタ割り当て（投入時に最近傍の重心へ割り当て済み）"""
+    scope = _resolve_scope(session, collection) or GLOBAL_SCOPE
+    rows = repo.list_cluster_assignments(
+        session, scope, limit=limit, offset=offset, cluster=cluster
     )
+    return [
+        ClusterAssignmentSchema(doc_id=a.document_id, title=title, cluster=a.cluster, score=a.score)
+        for a, title in rows
+    ]
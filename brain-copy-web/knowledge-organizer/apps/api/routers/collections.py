@@ -9,6 +9,7 @@ from apps.api.schemas.result import (
 )
 from storage.sql import repo
 from storage.sql.repo import db_session
+from storage.vector.indexes import set_doc_payload
 
 router = APIRouter(prefix="/collections", tags=["collections"])
 
@@ -49,4 +50,9 @@ def add_document_to_collection(
     if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
     repo.add_to_collection(session, col_id, req.document_id)
+    # スコープ検索用に point の payload へ所属コレクションを反映
+    set_doc_payload(
+        req.document_id,
+        {"collection_ids": repo.get_collection_ids_for_doc(session, req.document_id)},
+    )
     return {"message": "Document added to collection"}
@@ -0,0 +1,44 @@
+"""DELETE /documents/{doc_id} – ドキュメント削除（関連グラフ・ベクターも整理）"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from apps.api.schemas.result import DeleteDocumentResponse, RepairRelationsResponse
+from core.logging import get_logger
+from pipelines.relate.graph_builder import detach_document, repair_dirty_relations
+from storage.sql import repo
+from storage.sql.repo import db_session
+from storage.vector.indexes import delete_doc_vectors
+
+router = APIRouter(prefix="/documents", tags=["documents"])
+logger = get_logger(__name__)
+
+
+@router.delete("/{doc_id}", response_model=DeleteDocumentResponse)
+def delete_document(
+    doc_id: str,
+    repair: bool = Query(default=True, description="関連先を失ったドキュメントをすぐ修復するか"),
+    session: Session = Depends(db_session),
+):
+    doc = repo.get_document(session, doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+
+    # エッジを外し、参照元を修復待ちにしてからベクターと本体を削除
+    affected = detach_document(session, doc_id)
+    delete_doc_vectors(doc_id)
+    repo.delete_document(session, doc_id)
+
+    repaired = repair_dirty_relations(session, doc_ids=affected) if repair and affected else 0
+    logger.info("削除完了: doc_id=%s affected=%d repaired=%d", doc_id, len(affected), repaired)
+    return DeleteDocumentResponse(doc_id=doc_id, affected=len(affected), repaired=repaired)
+
+
+@router.post("/relations/repair", response_model=RepairRelationsResponse)
+def repair_relations(
+    limit: int | None = Query(default=None, ge=1, description="修復するドキュメント数の上限"),
+    session: Session = Depends(db_session),
+):
+    repaired = repair_dirty_relations(session, limit=limit)
+    return RepairRelationsResponse(
+        repaired=repaired, remaining=len(repo.list_dirty_documents(session))
+    )
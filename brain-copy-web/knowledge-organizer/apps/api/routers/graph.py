@@ -0,0 +1,156 @@
+"""GET /graph/* – 保存済みエッジからの近傍・部分グラフ取得（再埋め込みなし）"""
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from apps.api.schemas.result import (
+    GraphMetricSchema,
+    GraphMetricsResponse,
+    GraphNode,
+    GraphResponse,
+)
+from apps.api.services.graph_analytics import metrics_stale, refresh_metrics
+from storage.graph_cache import get_graph_cache
+from storage.sql import repo
+from storage.sql.repo import db_session
+
+router = APIRouter(prefix="/graph", tags=["graph"])
+
+
+MetricName = Literal["pagerank", "degree", "weighted_degree", "bridge_score"]
+
+
+def _graph_response(
+    session: Session,
+    hops: dict[str, int],
+    edges: list[tuple[str, str, float, str]],
+    truncated: bool,
+) -> GraphResponse:
+    cache = get_graph_cache()
+    # 色分け・サイズ用の事前計算済み指標（未計算なら None）
+    metrics = repo.get_graph_metrics(session, list(hops))
+    position = {doc_id: i for i, doc_id in enumerate(hops)}
+    relation_types: dict[str, int] = {}
+    nodes = []
+    for doc_id, depth in hops.items():
+        metric = metrics.get(doc_id)
+        nodes.append(
+            GraphNode(
+                id=doc_id,
+                title=cache.title(doc_id) or "",
+                depth=depth,
+                community=metric.community if metric else None,
+                pagerank=metric.pagerank if metric else None,
+                bridge_score=metric.bridge_score if metric else None,
+            )
+        )
+    return GraphResponse(
+        nodes=nodes,
+        edges=[
+            (
+                position[src],
+                position[dst],
+                round(score, 4),
+                relation_types.setdefault(rt, len(relation_types)),
+            )
+            for src, dst, score, rt in edges
+        ],
+        relation_types=list(relation_types),
+        truncated=truncated,
+    )
+
+
+@router.get("/neighborhood/{doc_id}", response_model=GraphResponse)
+def neighborhood(
+    doc_id: str,
+    depth: int = Query(default=2, ge=0, le=6, description="たどるホップ数"),
+    max_degree: int = Query(default=10, ge=1, le=200, description="各ノードからたどる隣接数の上限"),
+    min_score: float = Query(default=0.0, description="たどるエッジの最小スコア"),
+    max_nodes: int = Query(default=500, ge=1, le=20000),
+    session: Session = Depends(db_session),
+):
+    if repo.get_document(session, doc_id) is None:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    hops, edges, truncated = get_graph_cache().bfs(
+        session,
+        [doc_id],
+        depth=depth,
+        max_degree=max_degree,
+        min_score=min_score,
+        max_nodes=max_nodes,
+    )
+    return _graph_response(session, hops, edges, truncated)
+
+
+@router.get("/subgraph", response_model=GraphResponse)
+def subgraph(
+    collection: str = Query(..., description="コレクション名または ID"),
+    depth: int = Query(default=0, ge=0, le=6, description="コレクション外へ広げるホップ数"),
+    max_degree: int = Query(default=10, ge=1, le=200),
+    min_score: float = Query(default=0.0),
+    max_nodes: int = Query(default=2000, ge=1, le=100000),
+    session: Session = Depends(db_session),
+):
+    """コレクションのドキュメントを起点にした部分グラフ（depth=0 なら誘導部分グラフ）"""
+    col = repo.resolve_collection(session, collection)
+    if col is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    hops, edges, truncated = get_graph_cache().bfs(
+        session,
+        repo.list_collection_doc_ids(session, col.id),
+        depth=depth,
+        max_degree=max_degree,
+        min_score=min_score,
+        max_nodes=max_nodes,
+    )
+    return _graph_response(session, hops, edges, truncated)
+
+
+@router.get("/metrics", response_model=GraphMetricsResponse)
+def list_metrics(
+    order_by: MetricName = Query(default="pagerank", description="降順に並べる指標"),
+    community: int | None = Query(default=None, description="コミュニティ番号で絞り込み"),
+    collection: str | None = Query(default=None, description="コレクション名または ID"),
+    limit: int = Query(default=100, ge=1, le=10000),
+    offset: int = Query(default=0, ge=0),
+    session: Session = Depends(db_session),
+):
+    """事前計算済みのグラフ指標（ハブは order_by=pagerank / bridge_score の上位）"""
+    collection_id = None
+    if collection:
+        col = repo.resolve_collection(session, collection)
+        if col is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        collection_id = col.id
+    rows = repo.list_graph_metrics(
+        session,
+        order_by=order_by,
+        limit=limit,
+        offset=offset,
+        community=community,
+        collection_id=collection_id,
+    )
+    return GraphMetricsResponse(
+        computed_at=repo.graph_metrics_computed_at(session),
+        stale=metrics_stale(),
+        items=[
+            GraphMetricSchema(
+                doc_id=m.document_id,
+                title=title,
+                community=m.community,
+                pagerank=m.pagerank,
+                degree=m.degree,
+                weighted_degree=m.weighted_degree,
+                degree_centrality=m.degree_centrality,
+                bridge_score=m.bridge_score,
+            )
+            for m, title in rows
+        ],
+    )
+
+
+@router.post("/metrics/refresh")
+def refresh(force: bool = Query(default=False, description="エッジに変更がなくても再計算する")):
+    total = refresh_metrics(force=force)
+    return {"refreshed": total is not None, "documents": total or 0}
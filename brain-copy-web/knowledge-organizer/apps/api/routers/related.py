@@ -14,12 +14,26 @@ router = APIRouter(prefix="/related", tags=["related"])
 def related(
     doc_id: str,
     top_k: int = Query(default=5, ge=1, le=20),
+    collection: str | None = Query(default=None, description="コレクション名または ID で絞り込み"),
+    tags: list[str] = Query(default=[], description="いずれかのタグを持つドキュメントに絞り込み"),
     session: Session = Depends(db_session),
 ):
     doc = repo.get_document(session, doc_id)
     if doc is None:
         raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    collection_id = None
+    if collection:
+        col = repo.resolve_collection(session, collection)
+        if col is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        collection_id = col.id
 
-    related_raw = get_related_documents(doc_id=doc_id, session=session, top_k=top_k)
+    related_raw = get_related_documents(
+        doc_id=doc_id,
+        session=session,
+        top_k=top_k,
+        collection_id=collection_id,
+        tags=tags,
+    )
     related = [RelatedDoc(**r) for r in related_raw]
     return RelatedResponse(doc_id=doc_id, related=related)
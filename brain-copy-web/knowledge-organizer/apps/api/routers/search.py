@@ -1,9 +1,18 @@
-"""GET /search – セマンティック検索エンドポイント"""
-from fastapi import APIRouter, Depends, Query
+"""GET /search – セマンティック検索エンドポイント（POST /search/batch で一括検索）"""
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from apps.api.schemas.result import SearchHit, SearchResponse
-from apps.api.services.retrieval import semantic_search
+from apps.api.schemas.result import (
+    BatchSearchResponse,
+    SearchCacheStats,
+    SearchHit,
+    SearchResponse,
+)
+from apps.api.schemas.search import BatchSearchRequest
+from apps.api.services.retrieval import SearchMode, batch_semantic_search, semantic_search
+from apps.api.services.search_cache import get_search_cache
+from storage.sql import repo
+from storage.sql.fulltext import fulltext_available
 from storage.sql.repo import db_session
 
 router = APIRouter(prefix="/search", tags=["search"])
@@ -14,13 +23,72 @@ def search(
     q: str = Query(..., min_length=1, description="検索クエリ"),
     top_k: int = Query(default=5, ge=1, le=50),
     score_threshold: float = Query(default=0.0, ge=0.0, le=1.0),
+    use_cache: bool = Query(default=True, description="結果キャッシュを使うか"),
+    mode: SearchMode = Query(
+        default="vector",
+        description="vector / lexical（埋め込みなし BM25） / hybrid（RRF 統合） / auto",
+    ),
+    collection: str | None = Query(default=None, description="コレクション名または ID で絞り込み"),
+    tags: list[str] = Query(default=[], description="いずれかのタグを持つドキュメントに絞り込み"),
+    group_by_doc: bool = Query(
+        default=False, description="1 ドキュメントにつき最上位 1 チャンクだけ返す（top_k = 文書数）"
+    ),
     session: Session = Depends(db_session),
 ):
+    if mode == "lexical" and not fulltext_available():
+        raise HTTPException(status_code=400, detail="lexical モードには SQLite FTS5 が必要です。")
+    collection_id = None
+    if collection:
+        col = repo.resolve_collection(session, collection)
+        if col is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        collection_id = col.id
     hits_raw = semantic_search(
         query=q,
         session=session,
         top_k=top_k,
         score_threshold=score_threshold if score_threshold > 0 else None,
+        use_cache=use_cache,
+        mode=mode,
+        collection_id=collection_id,
+        tags=tags,
+        group_by_doc=group_by_doc,
     )
     hits = [SearchHit(**h) for h in hits_raw]
     return SearchResponse(query=q, hits=hits, total=len(hits))
+
+
+@router.post("/batch", response_model=BatchSearchResponse)
+def search_batch(req: BatchSearchRequest, session: Session = Depends(db_session)):
+    collection_ids: dict[str, str] = {}
+    for name in {q.collection for q in req.queries if q.collection}:
+        col = repo.resolve_collection(session, name)
+        if col is None:
+            raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
+        collection_ids[name] = col.id
+
+    results = batch_semantic_search(
+        [
+            {
+                "query": q.q,
+                "top_k": q.top_k,
+                "score_threshold": q.score_threshold if q.score_threshold > 0 else None,
+                "collection_id": collection_ids.get(q.collection) if q.collection else None,
+                "tags": q.tags,
+            }
+            for q in req.queries
+        ],
+        session=session,
+        use_cache=req.use_cache,
+    )
+    return BatchSearchResponse(
+        results=[
+            SearchResponse(query=q.q, hits=[SearchHit(**h) for h in hits], total=len(hits))
+            for q, hits in zip(req.queries, results)
+        ]
+    )
+
+
+@router.get("/cache/stats", response_model=SearchCacheStats)
+def search_cache_stats():
+    return SearchCacheStats(**get_search_cache().stats())
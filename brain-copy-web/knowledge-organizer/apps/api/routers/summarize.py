@@ -1,11 +1,13 @@
 """POST /summarize – RAGスタイルの回答生成エンドポイント"""
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from apps.api.schemas.result import SearchHit, SummarizeResponse
 from apps.api.schemas.search import SummarizeRequest
 from apps.api.services.retrieval import semantic_search
 from apps.api.services.summarizer import answer_with_context
+from storage.sql import repo
+from storage.sql.fulltext import fulltext_available
 from storage.sql.repo import db_session
 
 router = APIRouter(prefix="/summarize", tags=["summarize"])
@@ -13,11 +15,23 @@ router = APIRouter(prefix="/summarize", tags=["summarize"])
 
 @router.post("", response_model=SummarizeResponse)
 def summarize(req: SummarizeRequest, session: Session = Depends(db_session)):
+    if req.mode == "lexical" and not fulltext_available():
+        raise HTTPException(status_code=400, detail="lexical モードには SQLite FTS5 が必要です。")
+    collection_id = None
+    if req.collection:
+        col = repo.resolve_collection(session, req.collection)
+        if col is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        collection_id = col.id
+
     # 1. 関連チャンクを検索
     hits_raw = semantic_search(
         query=req.query,
         session=session,
         top_k=req.top_k,
+        mode=req.mode,
+        collection_id=collection_id,
+        tags=req.tags,
     )
 
     # 2. LLM で回答生成
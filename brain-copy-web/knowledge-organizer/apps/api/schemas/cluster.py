@@ -1,7 +1,111 @@
+from datetime import datetime
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
+NeighborSearch = Literal["auto", "exact", "approximate"]
+PointsFormat = Literal["csv", "binary"]
+
 
 class ClusterPointsRequest(BaseModel):
     texts: list[str] = Field(..., min_length=2, description="クラスタ化対象テキスト（2件以上）")
     clusters: int = Field(default=5, ge=2, le=100, description="クラスタ数")
     top_edges: int = Field(default=5, ge=0, le=30, description="各ノードの近傍接続数。0で接続なし")
+    neighbor_search: NeighborSearch = Field(
+        default="auto", description="近傍探索: exact / approximate / auto（点数が多いと近似）"
+    )
+    refit: bool = Field(
+        default=False, description="キャッシュを使わず KMeans・PCA・近傍をフル計算し直す"
+    )
+    format: PointsFormat = Field(
+        default="csv", description="csv: x,y,text,cluster,connected_to / binary: KOPT バイナリ形式"
+    )
+
+
+class ClusterStoredRequest(BaseModel):
+    """投入済みドキュメントを保存済みベクターでクラスタ化する（collection / tags 未指定なら全件）"""
+
+    collection: str | None = Field(default=None, description="コレクション名または ID")
+    tags: list[str] = Field(default=[], description="いずれかのタグを持つドキュメントに絞り込み")
+    level: Literal["document", "chunk"] = Field(
+        default="document", description="document: ドキュメント平均ベクター / chunk: チャンク単位"
+    )
+    clusters: int = Field(default=5, ge=2, le=100, description="クラスタ数")
+    top_edges: int = Field(default=5, ge=0, le=30, description="各ノードの近傍接続数。0で接続なし")
+    neighbor_search: NeighborSearch = Field(
+        default="auto", description="近傍探索: exact / approximate / auto（点数が多いと近似）"
+    )
+    refit: bool = Field(
+        default=False, description="キャッシュを使わず KMeans・PCA・近傍をフル計算し直す"
+    )
+    format: PointsFormat = Field(
+        default="csv", description="csv: x,y,text,cluster,connected_to / binary: KOPT バイナリ形式"
+    )
+
+
+class ClusterRefineRequest(BaseModel):
+    collection: str | None = Field(
+        default=None, description="コレクション名または ID（未指定は全体）"
+    )
+    n_clusters: int | None = Field(
+        default=None, ge=2, le=100, description="クラスタ数。未指定なら既存モデルまたは設定値"
+    )
+    epochs: int = Field(default=1, ge=1, le=20, description="保存済みベクターを何周学習するか")
+
+
+class ClusterModelSchema(BaseModel):
+    scope: str
+    n_clusters: int
+    n_seen: int
+    updated_at: datetime | None
+    sizes: dict[int, int]
+
+
+class ClusterAssignmentSchema(BaseModel):
+    doc_id: str
+    title: str
+    cluster: int
+    score: float
+
+
+class ClusterMapSchema(BaseModel):
+    """タイル配信用に登録したマップ"""
+
+    map_id: str
+    points: int
+    clusters: int
+    bounds: list[float] = Field(description="ズーム 0 のタイルの範囲 [min_x, min_y, max_x, max_y]")
+    max_zoom: int = Field(description="これより深いズームではタイルを集約しない")
+    tile_url: str = Field(description="タイル URL のテンプレート")
+
+
+class TilePoint(BaseModel):
+    id: int = Field(description="マップ内の点の番号（CSV の行番号と同じ）")
+    x: float
+    y: float
+    cluster: int
+    text: str
+
+
+class TileAggregate(BaseModel):
+    x: float = Field(description="集約した点の重心")
+    y: float
+    cluster: int
+    count: int
+    representative: TilePoint = Field(description="重心に最も近い点")
+
+
+class ClusterTileResponse(BaseModel):
+    map_id: str
+    z: int
+    x: int
+    y: int
+    bounds: list[float]
+    total: int = Field(description="タイル内の点数")
+    aggregated: bool = Field(description="True なら aggregates、False なら points を返す")
+    points: list[TilePoint]
+    aggregates: list[TileAggregate]
+    # 個別の点: (点 id, 点 id, score) / 集約: (aggregates の添字, aggregates の添字, score)
+    edges: list[tuple[int, int, float]]
+    # エッジ先のうちタイル外の点 (id, x, y)
+    external: list[tuple[int, float, float]]
@@ -19,3 +19,15 @@ class IngestResponse(BaseModel):
     tags: list[str]
     duplicate: bool = False
     message: str = "OK"
+
+
+class IngestBatchRequest(BaseModel):
+    documents: list[IngestRequest] = Field(
+        ..., min_length=1, max_length=256, description="投入するドキュメント（結果は同じ順で返す）"
+    )
+
+
+class IngestBatchResponse(BaseModel):
+    results: list[IngestResponse]
+    ingested: int
+    duplicates: int
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -16,6 +18,22 @@ class SearchResponse(BaseModel):
     total: int
 
 
+class BatchSearchResponse(BaseModel):
+    results: list[SearchResponse]
+
+
+class SearchCacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl_seconds: float
+    generation: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    hit_rate: float
+
+
 class RelatedDoc(BaseModel):
     doc_id: str
     title: str
@@ -28,6 +46,52 @@ class RelatedResponse(BaseModel):
     related: list[RelatedDoc]
 
 
+class GraphNode(BaseModel):
+    id: str
+    title: str
+    depth: int
+    community: int | None = None
+    pagerank: float | None = None
+    bridge_score: float | None = None
+
+
+class GraphResponse(BaseModel):
+    """nodes と edges のみの軽量グラフ。edges は [source 添字, target 添字, score, 種別添字]"""
+
+    nodes: list[GraphNode]
+    edges: list[tuple[int, int, float, int]]
+    relation_types: list[str]
+    truncated: bool
+
+
+class GraphMetricSchema(BaseModel):
+    doc_id: str
+    title: str
+    community: int
+    pagerank: float
+    degree: int
+    weighted_degree: float
+    degree_centrality: float
+    bridge_score: float
+
+
+class GraphMetricsResponse(BaseModel):
+    computed_at: datetime | None
+    stale: bool
+    items: list[GraphMetricSchema]
+
+
+class DeleteDocumentResponse(BaseModel):
+    doc_id: str
+    affected: int
+    repaired: int
+
+
+class RepairRelationsResponse(BaseModel):
+    repaired: int
+    remaining: int
+
+
 class SummarizeResponse(BaseModel):
     query: str
     answer: str
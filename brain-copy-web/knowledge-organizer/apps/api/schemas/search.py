@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -5,8 +7,26 @@ class SearchRequest(BaseModel):
     q: str = Field(..., min_length=1, description="検索クエリ")
     top_k: int = Field(default=5, ge=1, le=50)
     score_threshold: float = Field(default=0.0, ge=0.0, le=1.0)
+    collection: str | None = Field(default=None, description="コレクション名または ID で絞り込み")
+    tags: list[str] = Field(
+        default_factory=list, description="いずれかのタグを持つドキュメントに絞り込み"
+    )
+
+
+class BatchSearchRequest(BaseModel):
+    queries: list[SearchRequest] = Field(
+        ..., min_length=1, max_length=256, description="検索クエリ（結果は同じ順で返す）"
+    )
+    use_cache: bool = Field(default=True, description="結果キャッシュを使うか")
 
 
 class SummarizeRequest(BaseModel):
     query: str = Field(..., min_length=1, description="質問・要約指示")
     top_k: int = Field(default=5, ge=1, le=20)
+    mode: Literal["vector", "lexical", "hybrid", "auto"] = Field(
+        default="vector", description="コンテキスト検索のモード（/search と同じ）"
+    )
+    collection: str | None = Field(default=None, description="コレクション名または ID で絞り込み")
+    tags: list[str] = Field(
+        default_factory=list, description="いずれかのタグを持つドキュメントに絞り込み"
+    )
@@ -0,0 +1,167 @@
+"""/cluster/*-csv のレイアウトキャッシュと、/cluster/points-csv のテキスト埋め込みキャッシュ
+
+レイアウトは (ベクター集合のハッシュ, クラスタ数, 近傍数, 近傍探索) をキーに LRU で保持する。
+同じ集合なら並び順が違っても再計算しない。同じパラメータのエントリとの差（増減した点）が
+少なければ、前回の重心と PCA で新しい点だけを配置する（update_layout）。
+差分配置の累計が点数 × cluster_cache_max_changed を超えたらフル計算し直す。
+"""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from core.config import get_settings
+from core.logging import get_logger
+from core.utils.hashing import sha256_hex
+from pipelines.enrich.embedder import embed_texts
+from pipelines.relate.layout import (
+    ClusterLayout,
+    compute_layout,
+    row_keys,
+    set_digest,
+    update_layout,
+)
+
+logger = get_logger(__name__)
+settings = get_settings()
+
+
+class ClusterCache:
+    """クラスタレイアウトの LRU キャッシュ（差分配置の起点にもなる）"""
+
+    def __init__(self, maxsize: int, max_changed: float) -> None:
+        self.maxsize = maxsize
+        self.max_changed = max_changed
+        self._data: OrderedDict[tuple, ClusterLayout] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.updates = 0
+        self.refits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def _closest(self, key: tuple, keys: list[bytes]) -> ClusterLayout | None:
+        """同じ集合のエントリ、なければ差分配置の予算内で増減が最も少ないエントリ"""
+        with self._lock:
+            exact = self._data.get(key)
+            if exact is not None:
+                self._data.move_to_end(key)
+                return exact
+            wanted = set(keys)
+            best, best_changed = None, None
+            for (_, params), layout in self._data.items():
+                if params != key[1]:
+                    continue
+                overlap = len(wanted.intersection(layout.keys))
+                changed = layout.changed + (len(keys) - overlap) + (len(layout) - overlap)
+                if overlap == 0 or changed > self.max_changed * len(keys):
+                    continue
+                if best_changed is None or changed < best_changed:
+                    best, best_changed = layout, changed
+            return best
+
+    def layout(
+        self,
+        vectors: list[list[float]] | np.ndarray,
+        n_clusters: int,
+        top_edges: int,
+        neighbor_search: str = "auto",
+        refit: bool = False,
+    ) -> ClusterLayout:
+        """
+        ベクター集合のレイアウトを返す。refit=True ならキャッシュを使わずフル計算し、
+        結果で置き換える。
+        """
+        arr = np.asarray(vectors, dtype=np.float32)
+        keys = row_keys(arr)
+        key = (set_digest(keys), (n_clusters, top_edges, neighbor_search))
+        base = None if refit or not self.enabled else self._closest(key, keys)
+
+        if base is not None and base.keys == keys:
+            self.hits += 1
+            return base
+        if base is not None:
+            result = update_layout(base, arr, keys)
+            if result.changed == base.changed:
+                self.hits += 1
+            else:
+                self.updates += 1
+                logger.info(
+                    "クラスタレイアウト差分配置: %d 点（累計の増減 %d）", len(keys), result.changed
+                )
+        else:
+            result = compute_layout(arr, n_clusters, top_edges, neighbor_search, keys=keys)
+            self.refits += 1
+            logger.info("クラスタレイアウトをフル計算: %d 点", len(keys))
+
+        if self.enabled:
+            with self._lock:
+                self._data[key] = result
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "updates": self.updates,
+                "refits": self.refits,
+            }
+
+
+class EmbeddingCache:
+    """
+    テキスト（SHA-256）→ 埋め込みの LRU。同じテキストを再び埋め込まないので、
+    API 呼び出しが減るうえ、ベクター（= レイアウトキャッシュのキー）も毎回同一になる。
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """texts の埋め込みを (n, dim) で返す。未キャッシュのテキストだけを 1 回で埋め込む"""
+        keys = [sha256_hex(t) for t in texts]
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for k in keys:
+                vector = self._data.get(k)
+                if vector is not None:
+                    self._data.move_to_end(k)
+                    found[k] = vector
+
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            vectors = embed_texts(list(missing.values()))
+            fresh = dict(zip(missing, np.asarray(vectors, dtype=np.float32)))
+            found.update(fresh)
+            if self.maxsize > 0:
+                with self._lock:
+                    self._data.update(fresh)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+        return np.stack([found[k] for k in keys])
+
+
+@lru_cache
+def get_cluster_cache() -> ClusterCache:
+    return ClusterCache(
+        maxsize=settings.cluster_cache_size, max_changed=settings.cluster_cache_max_changed
+    )
+
+
+@lru_cache
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache(maxsize=settings.cluster_embed_cache_size)
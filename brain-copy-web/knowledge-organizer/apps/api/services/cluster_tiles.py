@@ -0,0 +1,106 @@
+"""/cluster/tiles のマップ登録とタイルキャッシュ
+
+/cluster/*-csv や /cluster/maps で作ったレイアウトを、内容のハッシュ（map_id）で登録する。
+map_id は座標・クラスタ・近傍・テキストから決まるので、同じ map_id のタイルは変わらず、
+HTTP でも長期キャッシュできる。タイル用の索引（TileIndex）はそのマップが最初に
+要求されたときに作るので、CSV / バイナリを書き出すだけなら索引は作らない。
+生成したタイルは JSON のバイト列のまま LRU で保持する。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from core.config import get_settings
+from pipelines.relate.layout import ClusterLayout
+from pipelines.relate.tiles import TileIndex
+
+settings = get_settings()
+
+
+def map_id_for(layout: ClusterLayout, texts: list[str]) -> str:
+    """レイアウトとテキストの内容から map_id を作る"""
+    h = hashlib.sha1()
+    for arr in (layout.coords, layout.labels, layout.neighbors):
+        h.update(np.ascontiguousarray(arr).tobytes())
+    h.update("\0".join(texts).encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+class _MapEntry:
+    """登録済みのレイアウト。TileIndex は最初に要求されたときに作る"""
+
+    def __init__(self, layout: ClusterLayout, texts: list[str]) -> None:
+        self._layout: ClusterLayout | None = layout
+        self._texts: list[str] | None = texts
+        self._index: TileIndex | None = None
+        self._lock = threading.Lock()
+
+    def index(self) -> TileIndex:
+        with self._lock:
+            if self._index is None:
+                layout, texts = self._layout, self._texts
+                self._index = TileIndex(
+                    layout.coords, layout.labels, layout.neighbors, layout.similarities, texts
+                )
+                self._layout = self._texts = None
+            return self._index
+
+
+class TileStore:
+    """map_id → 登録済みレイアウト（索引は遅延生成）と (map_id, z, x, y, 条件) → タイルの LRU"""
+
+    def __init__(self, max_maps: int, max_tiles: int) -> None:
+        self.max_maps = max_maps
+        self.max_tiles = max_tiles
+        self._maps: OrderedDict[str, _MapEntry] = OrderedDict()
+        self._tiles: OrderedDict[tuple, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, layout: ClusterLayout, texts: list[str]) -> str:
+        """レイアウトを登録して map_id を返す（索引は get_map まで作らない）"""
+        map_id = map_id_for(layout, texts)
+        with self._lock:
+            if map_id in self._maps:
+                self._maps.move_to_end(map_id)
+                return map_id
+            self._maps[map_id] = _MapEntry(layout, texts)
+            while len(self._maps) > self.max_maps:
+                evicted, _ = self._maps.popitem(last=False)
+                for key in [k for k in self._tiles if k[0] == evicted]:
+                    del self._tiles[key]
+        return map_id
+
+    def get_map(self, map_id: str) -> TileIndex | None:
+        """map_id の TileIndex を返す（初回はここで作る）。未登録・追い出し済みは None"""
+        with self._lock:
+            entry = self._maps.get(map_id)
+            if entry is None:
+                return None
+            self._maps.move_to_end(map_id)
+        return entry.index()
+
+    def get_tile(self, key: tuple) -> bytes | None:
+        with self._lock:
+            body = self._tiles.get(key)
+            if body is not None:
+                self._tiles.move_to_end(key)
+            return body
+
+    def put_tile(self, key: tuple, body: bytes) -> None:
+        if self.max_tiles <= 0:
+            return
+        with self._lock:
+            self._tiles[key] = body
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+
+@lru_cache
+def get_tile_store() -> TileStore:
+    return TileStore(
+        max_maps=settings.cluster_tile_maps, max_tiles=settings.cluster_tile_cache_size
+    )
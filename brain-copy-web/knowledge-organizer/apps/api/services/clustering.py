@@ -0,0 +1,36 @@
+"""逐次クラスタリングの定期更新 – コーパスが変わったときだけ重心を更新する"""
+import asyncio
+import threading
+
+from core.logging import get_logger
+from pipelines.relate.cluster_models import refine_all_models
+from storage.corpus import corpus_generation
+from storage.sql.repo import get_session
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_refined_generation: int | None = None
+
+
+def refine_models_if_changed() -> list[dict] | None:
+    """前回の更新以降にコーパスが変わっていれば全モデルを更新する。変更なしは None"""
+    global _refined_generation
+    with _lock:
+        generation = corpus_generation()
+        if generation == _refined_generation:
+            return None
+        with get_session() as session:
+            results = refine_all_models(session)
+        _refined_generation = generation
+        return results
+
+
+async def run_periodically(interval: float) -> None:
+    """interval 秒ごとに refine_models_if_changed を別スレッドで実行する（lifespan から起動）"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(refine_models_if_changed)
+        except Exception:
+            logger.exception("クラスタモデルの更新に失敗しました")
@@ -0,0 +1,45 @@
+"""グラフ指標の再計算サービス – エッジが変わったときだけ計算し、定期実行もできる
+
+保存済みの指標がどのエッジの世代から計算されたかは store_versions に残るので、
+再起動後や scripts/compute_graph_metrics.py で計算した後も正しく判定できる。
+"""
+import asyncio
+import threading
+
+from core.logging import get_logger
+from pipelines.relate.graph_analytics import refresh_graph_metrics
+from storage.sql.repo import get_session
+from storage.versions import EDGES, GRAPH_METRICS, store_version
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+
+
+def metrics_stale() -> bool:
+    """保存済みの指標を計算した後にエッジが変わっていれば（未計算も）True"""
+    return store_version(GRAPH_METRICS, default=-1) != store_version(EDGES)
+
+
+def refresh_metrics(force: bool = False) -> int | None:
+    """
+    エッジに変更があればグラフ指標を再計算して保存する。
+
+    Returns:
+        保存した件数。変更がなく計算しなかった場合は None
+    """
+    with _lock:
+        if not force and not metrics_stale():
+            return None
+        with get_session() as session:
+            return refresh_graph_metrics(session)
+
+
+async def run_periodically(interval: float) -> None:
+    """interval 秒ごとに refresh_metrics を別スレッドで実行する（lifespan から起動）"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(refresh_metrics)
+        except Exception:
+            logger.exception("グラフ指標の再計算に失敗しました")
@@ -0,0 +1,191 @@
+"""テキスト投入サービス – POST /ingest と POST /ingest/batch の共通処理
+
+1 件でも複数件でも同じ手順で処理する。
+content_hash による重複（既存ドキュメント・バッチ内）は LLM や埋め込みを呼ぶ前に除き、
+新規ドキュメントのチャンクはまとめて埋め込む（ingest_embed_batch_size 件ずつ）。
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from apps.api.schemas.ingest import IngestRequest, IngestResponse
+from core.config import get_settings
+from core.logging import get_logger
+from core.utils.hashing import sha256_hex
+from pipelines.enrich.embedder import embed_texts
+from pipelines.enrich.summarizer import summarize_document
+from pipelines.enrich.tagger import tag_text
+from pipelines.ingest.chunker import chunk_text
+from pipelines.ingest.metadata import build_chunk_meta
+from pipelines.ingest.text_loader import load_from_string
+from pipelines.relate.cluster_models import assign_document
+from pipelines.relate.graph_builder import build_relations_for_doc
+from storage.sql import repo
+from storage.sql.models import Document
+from storage.vector.indexes import upsert_vectors
+
+logger = get_logger(__name__)
+settings = get_settings()
+
+
+@dataclass
+class _NewDocument:
+    """保存途中の新規ドキュメント"""
+
+    req: IngestRequest
+    loaded: dict
+    content_hash: str
+    doc: Document | None = None
+    tags: list[str] = field(default_factory=list)
+    collection_ids: list[str] = field(default_factory=list)
+    chunks: list[dict] = field(default_factory=list)
+
+
+def _duplicate_response(doc: Document) -> IngestResponse:
+    return IngestResponse(
+        doc_id=doc.id,
+        title=doc.title,
+        chunk_count=len(doc.chunks),
+        tags=doc.tags or [],
+        duplicate=True,
+        message="Duplicate document, skipped ingestion.",
+    )
+
+
+def embed_in_batches(texts: list[str]) -> list[list[float]]:
+    """texts を ingest_embed_batch_size 件ずつ埋め込む（順序は保つ）"""
+    size = max(1, settings.ingest_embed_batch_size)
+    vectors: list[list[float]] = []
+    for start in range(0, len(texts), size):
+        vectors.extend(embed_texts(texts[start:start + size]))
+    return vectors
+
+
+def _store_document(session: Session, new: _NewDocument, collections: dict[str, str]) -> None:
+    """タグ・要約を付けてドキュメントを保存し、コレクション追加とチャンク分割まで行う"""
+    req, loaded = new.req, new.loaded
+    # タグ取得（手動 or 自動）
+    new.tags = req.tags
+    if req.auto_tag and not new.tags:
+        new.tags = tag_text(loaded["raw_text"])
+
+    # 要約
+    summary = None
+    if req.auto_summarize:
+        summary = summarize_document(loaded["raw_text"], title=req.title)
+
+    new.doc = repo.upsert_document(
+        session,
+        title=loaded["title"],
+        source=loaded["source"],
+        content_hash=new.content_hash,
+        raw_text=loaded["raw_text"],
+        summary=summary,
+        tags=new.tags,
+        meta={},
+    )
+
+    # コレクション追加（payload にも載せるためベクター保存より前に行う）
+    if req.collection:
+        if req.collection not in collections:
+            col = repo.get_collection_by_name(session, req.collection)
+            if col is None:
+                col = repo.create_collection(session, req.collection)
+            collections[req.collection] = col.id
+        repo.add_to_collection(session, collections[req.collection], new.doc.id)
+        new.collection_ids.append(collections[req.collection])
+
+    new.chunks = chunk_text(loaded["raw_text"])
+
+
+def _store_vectors(session: Session, new: _NewDocument, vectors: list[list[float]]) -> None:
+    """チャンクのベクターを Qdrant と SQL に保存し、関連グラフ構築・クラスタ割り当てを行う"""
+    doc = new.doc
+    payloads = [
+        {
+            **build_chunk_meta(c["chunk_index"], doc.id),
+            "text": c["text"],
+            "chunk_db_id": "",  # flush後に更新
+            "tags": new.tags,
+            "collection_ids": new.collection_ids,
+        }
+        for c in new.chunks
+    ]
+    vector_ids = upsert_vectors(vectors, payloads)
+
+    chunk_dicts = [
+        {
+            "document_id": doc.id,
+            "chunk_index": c["chunk_index"],
+            "text": c["text"],
+            "token_count": c["token_count"],
+            "vector_id": vid,
+        }
+        for c, vid in zip(new.chunks, vector_ids)
+    ]
+    repo.bulk_insert_chunks(session, chunk_dicts)
+
+    # 関連グラフ構築・クラスタ割り当て（いずれも代表ベクター = チャンク平均を使う）
+    doc_vector = np.mean(vectors, axis=0)
+    if new.req.auto_relate:
+        build_relations_for_doc(session, doc, doc_vector=doc_vector)
+    assign_document(session, doc.id, doc_vector, new.collection_ids)
+
+
+def ingest_documents(session: Session, reqs: list[IngestRequest]) -> list[IngestResponse]:
+    """
+    ドキュメントを投入し、reqs と同じ順で結果を返す。
+
+    既存ドキュメントと同じ内容、またはバッチ内で先に現れた内容は duplicate=True として
+    保存済み（または先に保存した）ドキュメントを返し、LLM・埋め込みは呼ばない。
+    """
+    loaded = [load_from_string(r.text, title=r.title, source=r.source) for r in reqs]
+    hashes = [sha256_hex(item["raw_text"]) for item in loaded]
+
+    # 重複チェック（既存はまとめて 1 回で引く）
+    existing = {
+        doc.content_hash: doc
+        for doc in session.scalars(
+            select(Document).where(Document.content_hash.in_(set(hashes)))
+        )
+    }
+    results: list[IngestResponse | None] = [None] * len(reqs)
+    first: dict[str, int] = {}
+    new_docs: dict[int, _NewDocument] = {}
+    for i, (req, item, content_hash) in enumerate(zip(reqs, loaded, hashes)):
+        if content_hash in existing:
+            logger.info("重複ドキュメント: %s", existing[content_hash].id)
+            results[i] = _duplicate_response(existing[content_hash])
+        elif content_hash not in first:
+            first[content_hash] = i
+            new_docs[i] = _NewDocument(req=req, loaded=item, content_hash=content_hash)
+
+    collections: dict[str, str] = {}
+    for new in new_docs.values():
+        _store_document(session, new, collections)
+
+    # 新規ドキュメントのチャンクをまとめて埋め込む
+    vectors = embed_in_batches([c["text"] for new in new_docs.values() for c in new.chunks])
+    offset = 0
+    for i, new in new_docs.items():
+        count = len(new.chunks)
+        _store_vectors(session, new, vectors[offset:offset + count])
+        offset += count
+        logger.info("投入完了: doc_id=%s chunks=%d", new.doc.id, count)
+        results[i] = IngestResponse(
+            doc_id=new.doc.id,
+            title=new.doc.title,
+            chunk_count=count,
+            tags=new.tags,
+        )
+
+    # バッチ内の重複は先に現れたドキュメントを指す
+    for i, content_hash in enumerate(hashes):
+        if results[i] is None:
+            logger.info("バッチ内の重複ドキュメント: %s", results[first[content_hash]].doc_id)
+            results[i] = results[first[content_hash]].model_copy(
+                update={"duplicate": True, "message": "Duplicate document, skipped ingestion."}
+            )
+    return results
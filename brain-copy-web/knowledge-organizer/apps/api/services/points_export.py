@@ -0,0 +1,165 @@
+"""クラスタ点群のエクスポート – ストリーミング CSV・バイナリ形式と gzip / brotli 圧縮
+
+バイナリ形式（リトルエンディアン、各セクションは 4 バイト境界）:
+
+    magic "KOPT" | uint32 version | uint32 n | uint32 nnz | uint32 text_bytes
+    float32[n * 2] 座標 (x0, y0, x1, y1, ...)
+    int32[n]       クラスタ番号
+    uint32[n + 1]  connected_to の indptr（点 i の接続先は indices[indptr[i]:indptr[i + 1]]）
+    uint32[nnz]    connected_to の indices
+    uint32[n + 1]  テキストの UTF-8 バイトオフセット
+    uint8[text_bytes] テキスト（UTF-8 を連結）
+
+クライアントは各セクションを型付き配列としてそのまま参照でき、テキストの解析も不要。
+"""
+import csv
+import struct
+import zlib
+from collections.abc import Iterable, Iterator
+from io import StringIO
+
+import numpy as np
+from fastapi.responses import StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # brotli は任意依存。なければ gzip のみ
+    brotli = None
+
+POINTS_MAGIC = b"KOPT"
+POINTS_VERSION = 1
+
+# CSV をこの行数ずつ書き出して送る
+_CSV_CHUNK_ROWS = 2048
+# テキスト表はこのバイト数ずつ送る
+_BINARY_CHUNK_BYTES = 1 << 20
+
+
+def connections_csr(neighbors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(n, k) の近傍表（空きは -1）を CSR の (indptr, indices) にする"""
+    valid = neighbors >= 0
+    indptr = np.zeros(len(neighbors) + 1, dtype=np.uint32)
+    np.cumsum(valid.sum(axis=1), out=indptr[1:])
+    return indptr, neighbors[valid].astype(np.uint32)
+
+
+def iter_points_csv(
+    coords: np.ndarray,
+    labels: np.ndarray,
+    neighbors: np.ndarray,
+    texts: list[str],
+) -> Iterator[bytes]:
+    """x,y,text,cluster,connected_to の CSV を行ブロックごとに UTF-8 で返す"""
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["x", "y", "text", "cluster", "connected_to"])
+    n = len(texts)
+    for start in range(0, n, _CSV_CHUNK_ROWS):
+        stop = min(start + _CSV_CHUNK_ROWS, n)
+        for (x, y), label, text, row in zip(
+            coords[start:stop].tolist(),
+            labels[start:stop].tolist(),
+            texts[start:stop],
+            neighbors[start:stop].tolist(),
+        ):
+            conn = ";".join(str(j) for j in row if j >= 0)
+            writer.writerow([f"{x:.6f}", f"{y:.6f}", text, label, conn])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_points_binary(
+    coords: np.ndarray,
+    labels: np.ndarray,
+    neighbors: np.ndarray,
+    texts: list[str],
+) -> Iterator[bytes]:
+    """モジュール docstring のバイナリ形式をセクションごとに返す"""
+    encoded = [t.encode("utf-8") for t in texts]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+    indptr, indices = connections_csr(neighbors)
+
+    yield POINTS_MAGIC + struct.pack(
+        "<4I", POINTS_VERSION, len(texts), len(indices), int(text_offsets[-1])
+    )
+    yield np.ascontiguousarray(coords, dtype="<f4").tobytes()
+    yield np.ascontiguousarray(labels, dtype="<i4").tobytes()
+    yield indptr.astype("<u4").tobytes()
+    yield indices.astype("<u4").tobytes()
+    yield text_offsets.astype("<u4").tobytes()
+    chunk: list[bytes] = []
+    size = 0
+    for b in encoded:
+        chunk.append(b)
+        size += len(b)
+        if size >= _BINARY_CHUNK_BYTES:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """Accept-Encoding から br（brotli 導入時）→ gzip の順で使える圧縮方式を選ぶ"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str | None) -> Iterator[bytes]:
+    """チャンク列を逐次圧縮する（encoding が None ならそのまま）"""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def export_response(
+    chunks: Iterable[bytes],
+    media_type: str,
+    filename: str,
+    accept_encoding: str | None = None,
+) -> StreamingResponse:
+    """チャンク列を（必要なら圧縮して）ストリーミングで返す"""
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Vary": "Accept-Encoding",
+    }
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        compress_chunks(chunks, encoding), media_type=media_type, headers=headers
+    )
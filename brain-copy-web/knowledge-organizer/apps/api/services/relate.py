@@ -8,8 +8,10 @@ from core.config import get_settings
 from core.logging import get_logger
 from pipelines.enrich.embedder import embed_single
 from pipelines.relate.similarity import find_similar_docs
+from storage.graph_cache import get_graph_cache
 from storage.sql import repo
 from storage.sql.models import Document
+from storage.vector.indexes import build_scope_filter
 
 logger = get_logger(__name__)
 settings = get_settings()
@@ -17,26 +19,70 @@ settings = get_settings()
 _PROMPT_PATH = Path(__file__).parents[3] / "prompts" / "suggest_related.md"
 
 
+def _in_scope(doc: Document, collection_id: str | None, tags: list[str] | None) -> bool:
+    if collection_id and collection_id not in {m.collection_id for m in doc.memberships}:
+        return False
+    return not tags or bool(set(tags) & set(doc.tags or []))
+
+
+def _related_from_cache(
+    doc_id: str,
+    session: Session,
+    top_k: int,
+    collection_id: str | None,
+    tags: list[str] | None,
+) -> list[dict] | None:
+    """インメモリ隣接から関連ドキュメントを返す（スコープ指定時のみ SQL 1 回）。エッジなしは None"""
+    cache = get_graph_cache()
+    neighbors = cache.neighbors(session, doc_id)
+    if not neighbors:
+        return None
+    if collection_id or tags:
+        allowed = repo.filter_in_scope(session, [n for n, _, _ in neighbors], collection_id, tags)
+        neighbors = [n for n in neighbors if n[0] in allowed]
+    return [
+        {
+            "doc_id": other_id,
+            "title": cache.title(other_id) or "",
+            "score": round(score, 4),
+            "relation_type": relation_type,
+        }
+        for other_id, score, relation_type in neighbors[:top_k]
+    ]
+
+
 def get_related_documents(
     doc_id: str,
     session: Session,
     top_k: int | None = None,
+    collection_id: str | None = None,
+    tags: list[str] | None = None,
 ) -> list[dict]:
     """
     ドキュメントIDを起点に関連ドキュメントを返す。
-    まず DB の Edge を参照し、なければベクター検索にフォールバック。
+    まず Edge（graph_cache_enabled ならインメモリ隣接、そうでなければ DB）を参照し、
+    なければベクター検索にフォールバック。
+    collection_id / tags（いずれかを含む）を指定すると関連先をその範囲に絞る。
 
     Returns:
         [{"doc_id": str, "title": str, "score": float, "relation_type": str}, ...]
     """
     # まず保存済みエッジを確認
-    edges = repo.get_edges_for_doc(session, doc_id)
+    if settings.graph_cache_enabled:
+        results = _related_from_cache(
+            doc_id, session, top_k or settings.top_k, collection_id, tags
+        )
+        if results is not None:
+            return results
+        edges = []
+    else:
+        edges = repo.get_edges_for_doc(session, doc_id)
     if edges:
         results = []
         for edge in sorted(edges, key=lambda e: e.score, reverse=True):
             other_id = edge.target_doc_id if edge.source_doc_id == doc_id else edge.source_doc_id
             other_doc = repo.get_document(session, other_id)
-            if other_doc:
+            if other_doc and _in_scope(other_doc, collection_id, tags):
                 results.append(
                     {
                         "doc_id": other_id,
@@ -57,6 +103,7 @@ def get_related_documents(
         query_vector=query_vector,
         top_k=top_k or settings.top_k,
         exclude_doc_ids=[doc_id],
+        filter_=build_scope_filter(collection_id, tags),
     )
 
     results = []
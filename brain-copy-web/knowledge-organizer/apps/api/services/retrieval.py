@@ -1,49 +1,308 @@
-"""セマンティック検索: クエリ埋め込み → Qdrant 検索 → SQL でドキュメント解決"""
+"""検索: クエリ埋め込み → Qdrant 検索 → SQL でドキュメント解決（+ FTS5 語彙検索とのハイブリッド）"""
+import re
+from typing import Literal
+
 from sqlalchemy.orm import Session
 
+from apps.api.services.search_cache import get_search_cache, make_key
 from core.config import get_settings
 from core.logging import get_logger
-from pipelines.enrich.embedder import embed_single
+from pipelines.enrich.embedder import embed_single, embed_texts
+from storage.corpus import corpus_generation
 from storage.sql import repo
-from storage.vector.indexes import search_vectors
+from storage.sql.fulltext import search_chunks_fulltext
+from storage.vector.indexes import (
+    build_scope_filter,
+    search_vector_groups,
+    search_vectors,
+    search_vectors_batch,
+)
 
 logger = get_logger(__name__)
 settings = get_settings()
 
+SearchMode = Literal["vector", "lexical", "hybrid", "auto"]
+
+# Reciprocal Rank Fusion の定数（Cormack et al. 2009 の推奨値）
+_RRF_K = 60
+
+# 識別子らしい単一語（英数字と _-./:# のみ）
+_IDENTIFIER_RE = re.compile(r"^[\w\-./:#]+$", re.ASCII)
+
+
+def _looks_like_keyword(query: str) -> bool:
+    """
+    引用符付き・識別子なら True（auto モードで埋め込みを省く）。
+    短くても自然文（日本語の質問など）は False にしてハイブリッド検索に回す。
+    """
+    q = query.strip()
+    if len(q) >= 2 and q[0] == q[-1] == '"':
+        return True
+    return " " not in q and bool(_IDENTIFIER_RE.match(q))
+
+
+def _hydrate_points(points: list, session: Session) -> list[tuple[str, dict]]:
+    """Qdrant の結果をドキュメント情報付きの (vector_id, hit) にする（SQL は 1 回）"""
+    doc_ids = [(p.payload or {}).get("doc_id", "") for p in points]
+    docs = repo.get_documents(session, [d for d in doc_ids if d])
+    hits = []
+    for point, doc_id in zip(points, doc_ids):
+        payload = point.payload or {}
+        doc = docs.get(doc_id)
+        hits.append(
+            (
+                str(point.id),
+                {
+                    "score": round(point.score, 4),
+                    "chunk_id": payload.get("chunk_db_id", str(point.id)),
+                    "chunk_text": payload.get("text", ""),
+                    "doc_id": doc_id,
+                    "doc_title": doc.title if doc else "",
+                    "doc_source": doc.source if doc else "",
+                },
+            )
+        )
+    return hits
+
+
+def _vector_hits(
+    query: str,
+    session: Session,
+    top_k: int,
+    score_threshold: float | None,
+    collection_id: str | None = None,
+    tags: list[str] | None = None,
+    group_by_doc: bool = False,
+) -> list[tuple[str, dict]]:
+    """
+    (vector_id, hit) のリストを返す。スコープは Qdrant の payload インデックスで絞る。
+    group_by_doc=True なら Qdrant の group-by で 1 ドキュメント 1 チャンク（最上位）にする。
+    """
+    query_vector = embed_single(query)
+    filter_ = build_scope_filter(collection_id, tags)
+    if group_by_doc:
+        groups = search_vector_groups(
+            query_vector=query_vector,
+            limit=top_k,
+            group_size=1,
+            score_threshold=score_threshold,
+            filter_=filter_,
+        )
+        results = [hit for group in groups for hit in group.hits]
+    else:
+        results = search_vectors(
+            query_vector=query_vector,
+            top_k=top_k,
+            score_threshold=score_threshold or settings.similarity_threshold,
+            filter_=filter_,
+        )
+    return _hydrate_points(results, session)
+
+
+def _lexical_hits(
+    query: str,
+    session: Session,
+    top_k: int,
+    collection_id: str | None = None,
+    tags: list[str] | None = None,
+    group_by_doc: bool = False,
+) -> list[tuple[str, dict]]:
+    """(vector_id, hit) のリストを BM25 順で返す。埋め込み API は呼ばない"""
+    rows = search_chunks_fulltext(
+        session,
+        query.strip().strip('"'),
+        limit=top_k,
+        collection_id=collection_id,
+        tags=tags,
+        per_doc=1 if group_by_doc else None,
+    )
+    return [
+        (
+            row["vector_id"] or row["chunk_id"],
+            {
+                "score": round(row["score"], 4),
+                "chunk_id": row["chunk_id"],
+                "chunk_text": row["chunk_text"],
+                "doc_id": row["doc_id"],
+                "doc_title": row["doc_title"],
+                "doc_source": row["doc_source"],
+            },
+        )
+        for row in rows
+    ]
+
+
+def _first_per_doc(hits: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+    """順位を保ったまま、各ドキュメントの最上位チャンクだけを残す"""
+    seen: set[str] = set()
+    kept = []
+    for key, hit in hits:
+        if hit["doc_id"] not in seen:
+            seen.add(hit["doc_id"])
+            kept.append((key, hit))
+    return kept
+
+
+def _fuse_rrf(
+    ranked_lists: list[list[tuple[str, dict]]],
+    top_k: int,
+    group_by_doc: bool = False,
+) -> list[dict]:
+    """複数のランキングを RRF で統合する。score は RRF スコアに置き換える"""
+    fused: dict[str, dict] = {}
+    scores: dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, (key, hit) in enumerate(ranked, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (_RRF_K + rank)
+            # 語彙側の chunk_id（SQL の id）を優先して保持する
+            if key not in fused or not fused[key]["chunk_id"]:
+                fused[key] = hit
+    order = sorted(scores, key=scores.get, reverse=True)
+    ranked = [(key, {**fused[key], "score": round(scores[key], 6)}) for key in order]
+    if group_by_doc:
+        ranked = _first_per_doc(ranked)
+    return [hit for _, hit in ranked[:top_k]]
+
+
+def _cache_key(
+    query: str,
+    top_k: int,
+    score_threshold: float | None,
+    mode: SearchMode,
+    collection_id: str | None,
+    tags: list[str] | None,
+    group_by_doc: bool = False,
+) -> tuple:
+    return make_key(
+        query,
+        top_k=top_k,
+        score_threshold=score_threshold or settings.similarity_threshold,
+        mode=mode,
+        collection_id=collection_id,
+        tags=sorted(tags or []),
+        group_by_doc=group_by_doc,
+    )
+
 
 def semantic_search(
     query: str,
     session: Session,
     top_k: int | None = None,
     score_threshold: float | None = None,
+    use_cache: bool = True,
+    mode: SearchMode = "vector",
+    collection_id: str | None = None,
+    tags: list[str] | None = None,
+    group_by_doc: bool = False,
 ) -> list[dict]:
     """
-    クエリをベクター化して近傍チャンクを検索し、ドキュメント情報付きで返す。
+    クエリに近いチャンクを検索し、ドキュメント情報付きで返す。
+    同一条件の検索結果は search_cache に保持し、投入・削除までは再利用する。
+
+    mode:
+        vector  – 埋め込みによる近傍検索（従来動作）
+        lexical – FTS5 の BM25 のみ。埋め込み API を呼ばない
+        hybrid  – vector と lexical を RRF で統合
+        auto    – キーワード的なクエリは lexical（0件なら vector）、それ以外は hybrid
+
+    score_threshold は vector の結果にのみ適用する。
+    collection_id / tags（いずれかを含む）を指定すると、その範囲のチャンクだけを検索する。
+    group_by_doc=True なら 1 ドキュメントにつき最上位 1 チャンクを返す（top_k はドキュメント数）。
 
     Returns:
         [{"score": float, "chunk_id": str, "chunk_text": str,
           "doc_id": str, "doc_title": str, "doc_source": str}, ...]
     """
-    query_vector = embed_single(query)
-    results = search_vectors(
-        query_vector=query_vector,
-        top_k=top_k or settings.top_k,
-        score_threshold=score_threshold or settings.similarity_threshold,
-    )
+    k = top_k or settings.top_k
+    cache = get_search_cache()
+    key = _cache_key(query, k, score_threshold, mode, collection_id, tags, group_by_doc)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return list(cached)
+    generation = corpus_generation()
 
-    hits = []
-    for point in results:
-        payload = point.payload or {}
-        doc_id = payload.get("doc_id", "")
-        doc = repo.get_document(session, doc_id) if doc_id else None
-        hits.append(
-            {
-                "score": round(point.score, 4),
-                "chunk_id": payload.get("chunk_db_id", str(point.id)),
-                "chunk_text": payload.get("text", ""),
-                "doc_id": doc_id,
-                "doc_title": doc.title if doc else "",
-                "doc_source": doc.source if doc else "",
-            }
+    # group_by_doc はベクター側は Qdrant の group-by、語彙側は SQL のウィンドウ関数で行う
+    scope = {"collection_id": collection_id, "tags": tags, "group_by_doc": group_by_doc}
+
+    def vector(top: int) -> list[tuple[str, dict]]:
+        return _vector_hits(query, session, top, score_threshold, **scope)
+
+    def lexical(top: int) -> list[tuple[str, dict]]:
+        return _lexical_hits(query, session, top, **scope)
+
+    if mode == "auto" and _looks_like_keyword(query):
+        hits = [h for _, h in lexical(k)]
+        if not hits:
+            hits = [h for _, h in vector(k)]
+    elif mode == "lexical":
+        hits = [h for _, h in lexical(k)]
+    elif mode in ("hybrid", "auto"):
+        depth = k * 3  # 統合前に多めに取得
+        hits = _fuse_rrf([vector(depth), lexical(depth)], top_k=k, group_by_doc=group_by_doc)
+    else:
+        hits = [h for _, h in vector(k)]
+
+    if use_cache:
+        cache.put(key, hits, generation)
+    return list(hits)
+
+
+def batch_semantic_search(
+    requests: list[dict],
+    session: Session,
+    use_cache: bool = True,
+) -> list[list[dict]]:
+    """
+    複数クエリをまとめてベクター検索する（mode="vector" 相当）。
+    キャッシュに無いクエリだけを 1 回の埋め込み呼び出し・1 回の Qdrant バッチ検索・
+    1 回の SQL で処理し、入力と同じ順で結果を返す。
+
+    Args:
+        requests: [{"query": str, "top_k": int | None, "score_threshold": float | None,
+                    "collection_id": str | None, "tags": list[str] | None}, ...]
+    """
+    cache = get_search_cache()
+    results: list[list[dict] | None] = [None] * len(requests)
+    # 同一条件のクエリは 1 回だけ検索する（key → 入力位置のリスト）
+    pending_by_key: dict[tuple, list[int]] = {}
+    for i, req in enumerate(requests):
+        key = _cache_key(
+            req["query"],
+            req.get("top_k") or settings.top_k,
+            req.get("score_threshold"),
+            "vector",
+            req.get("collection_id"),
+            req.get("tags"),
         )
-    return hits
+        cached = cache.get(key) if use_cache else None
+        if cached is not None:
+            results[i] = list(cached)
+        else:
+            pending_by_key.setdefault(key, []).append(i)
+
+    if pending_by_key:
+        keys = list(pending_by_key)
+        pending = [pending_by_key[key][0] for key in keys]
+        generation = corpus_generation()
+        vectors = embed_texts([requests[i]["query"] for i in pending])
+        point_lists = search_vectors_batch(
+            query_vectors=vectors,
+            top_ks=[requests[i].get("top_k") or settings.top_k for i in pending],
+            score_thresholds=[requests[i].get("score_threshold") for i in pending],
+            filters=[
+                build_scope_filter(requests[i].get("collection_id"), requests[i].get("tags"))
+                for i in pending
+            ],
+        )
+        # 全クエリのヒットをまとめて 1 回の SQL でハイドレートする
+        flat = [p for points in point_lists for p in points]
+        hydrated = iter(_hydrate_points(flat, session))
+        for key, points in zip(keys, point_lists):
+            hits = [next(hydrated)[1] for _ in points]
+            if use_cache:
+                cache.put(key, hits, generation)
+            for i in pending_by_key[key]:
+                results[i] = list(hits)
+
+    return results
@@ -0,0 +1,111 @@
+"""検索結果キャッシュ – LRU + TTL、コーパス世代で一括無効化"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+from core.config import get_settings
+from core.utils.text_clean import normalize
+from storage.corpus import corpus_generation
+
+settings = get_settings()
+
+
+def normalize_query(query: str) -> str:
+    """キャッシュキー用のクエリ正規化（NFKC + 空白圧縮 + casefold）"""
+    return re.sub(r"\s+", " ", normalize(query)).casefold()
+
+
+def _freeze(value: Any) -> Any:
+    """list / dict / set をハッシュ可能な形に変換する"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+def make_key(query: str, **params: Any) -> tuple:
+    """(正規化クエリ, top_k, score_threshold, フィルタ…) からキャッシュキーを作る"""
+    return (normalize_query(query), _freeze(params))
+
+
+class SearchCache:
+    """
+    検索結果の LRU キャッシュ。
+
+    各エントリは格納時のコーパス世代を持ち、取得時に現在の世代と異なれば
+    ミス扱いで破棄する。投入・削除で世代を進めるだけで全エントリが無効になり、
+    キャッシュ全体を走査する必要はない。
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[tuple, tuple[int, float, list[dict]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: tuple) -> list[dict] | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            generation, expires_at, value = entry
+            if generation != corpus_generation() or expires_at < time.monotonic():
+                del self._data[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: list[dict], generation: int) -> None:
+        """generation には検索開始時点の世代を渡す（検索中の投入を取りこぼさない）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (generation, time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "generation": corpus_generation(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+@lru_cache
+def get_search_cache() -> SearchCache:
+    return SearchCache(maxsize=settings.search_cache_size, ttl=settings.search_cache_ttl)
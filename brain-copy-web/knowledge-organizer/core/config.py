@@ -13,6 +13,7 @@ class Settings(BaseSettings):
 
     # ── Database ─────────────────────────────────
     database_url: str = "sqlite:///./knowledge.db"
+    store_version_poll_interval: float = 1.0  # seconds。他プロセスの変更（世代）を読み直す間隔
 
     # ── Vector DB ────────────────────────────────
     qdrant_host: str = "localhost"
@@ -25,13 +26,35 @@ class Settings(BaseSettings):
     chunk_size: int = 512    # tokens
     chunk_overlap: int = 64  # tokens
 
+    # ── Ingest ───────────────────────────────────
+    ingest_embed_batch_size: int = 64  # /ingest/batch で 1 回の埋め込み呼び出しに渡すチャンク数
+
     # ── Retrieval ────────────────────────────────
     top_k: int = 5
     similarity_threshold: float = 0.75
 
+    # ── Search cache ─────────────────────────────
+    search_cache_size: int = 1024     # エントリ数上限。0 で無効
+    search_cache_ttl: float = 300.0   # seconds
+
     # ── Relation ─────────────────────────────────
     relation_top_k: int = 10
     relation_threshold: float = 0.80
+    relation_block_size: int = 1024  # 全ペア kNN の行ブロック
+    relation_workers: int = 0        # 全ペア kNN のプロセス数。0 で CPU 数
+    graph_cache_enabled: bool = True  # /related をインメモリ隣接（CSR）から返す
+    graph_analytics_interval: float = 0.0  # seconds。エッジ変更があれば指標を再計算。0 で無効
+
+    # ── Clustering ───────────────────────────────
+    cluster_n_clusters: int = 8          # 逐次クラスタリングの既定クラスタ数
+    cluster_batch_size: int = 1024       # 逐次クラスタリングのミニバッチの件数
+    cluster_refine_interval: float = 0.0  # seconds。コーパス変更があれば重心を更新。0 で無効
+    cluster_cache_size: int = 8             # /cluster/*-csv のレイアウトキャッシュ数。0 で無効
+    cluster_cache_max_changed: float = 0.2  # 前回フル計算からの増減がこの割合以下なら差分配置
+    cluster_embed_cache_size: int = 20000   # /cluster/points-csv のテキスト埋め込みキャッシュ件数
+    cluster_tile_maps: int = 4              # /cluster/tiles 用に保持するマップ数
+    cluster_tile_cache_size: int = 4096     # 生成済みタイル（JSON）のキャッシュ数。0 で無効
+    cluster_tile_max_points: int = 256      # タイルに個別の点で返す上限。超えたら集約
 
 
 @lru_cache
@@ -1,15 +1,24 @@
-"""簡易クラスタリング（KMeans）– 任意オプション"""
+"""簡易クラスタリング（KMeans）– 任意オプション
+
+大量の点には MiniBatchKMeans を使い、保存済みの重心から学習を続ける逐次更新のヘルパーも持つ。
+"""
 from __future__ import annotations
 
+from collections.abc import Iterable
+
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans, kmeans_plusplus
 from sklearn.preprocessing import normalize
 
+# method="auto" で MiniBatchKMeans に切り替える点数
+_MINIBATCH_MIN_POINTS = 10_000
+
 
 def cluster_vectors(
     vectors: list[list[float]],
     n_clusters: int = 5,
     random_state: int = 42,
+    method: str = "auto",
 ) -> list[int]:
     """
     ベクターリストを KMeans でクラスタリングし、各ベクターのクラスタ番号を返す。
@@ -18,18 +27,99 @@ def cluster_vectors(
         vectors: 埋め込みベクターのリスト
         n_clusters: クラスタ数（ドキュメント数より小さくなければならない）
         random_state: 再現性のための乱数シード
+        method: kmeans / minibatch / auto（点数が多いと minibatch）
 
     Returns:
         labels: 各ベクターに対応するクラスタ番号のリスト
     """
-    if len(vectors) <= 1:
-        return [0] * len(vectors)
+    labels, _ = fit_clusters(vectors, n_clusters, random_state=random_state, method=method)
+    return labels.tolist()
 
-    n = min(n_clusters, len(vectors))
-    arr = normalize(np.array(vectors, dtype=np.float32))
-    km = KMeans(n_clusters=n, random_state=random_state, n_init="auto")
+
+def fit_clusters(
+    vectors: list[list[float]] | np.ndarray,
+    n_clusters: int = 5,
+    random_state: int = 42,
+    method: str = "auto",
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    cluster_vectors と同じクラスタリングで、ラベルと重心（正規化空間）を返す。
+    重心は後から追加された点の割り当て（nearest_centroids）に使える。
+
+    Returns:
+        (labels, centroids): (n,) と (k, dim)
+    """
+    arr = normalize(np.asarray(vectors, dtype=np.float32))
+    if len(arr) <= 1:
+        return np.zeros(len(arr), dtype=np.int64), arr.copy()
+
+    n = min(n_clusters, len(arr))
+    if method == "minibatch" or (method == "auto" and len(arr) >= _MINIBATCH_MIN_POINTS):
+        km = new_streaming_model(n, random_state=random_state)
+    else:
+        km = KMeans(n_clusters=n, random_state=random_state, n_init="auto")
     labels = km.fit_predict(arr)
-    return labels.tolist()
+    return labels, km.cluster_centers_.astype(np.float32)
+
+
+def new_streaming_model(
+    n_clusters: int,
+    random_state: int = 42,
+    batch_size: int = 1024,
+) -> MiniBatchKMeans:
+    """逐次学習用の MiniBatchKMeans を作る"""
+    return MiniBatchKMeans(
+        n_clusters=n_clusters, random_state=random_state, batch_size=batch_size, n_init=3
+    )
+
+
+def init_centroids(vectors: np.ndarray, n_clusters: int, random_state: int = 42) -> np.ndarray:
+    """L2 正規化したベクターから k-means++ で初期重心を選ぶ（len(vectors) >= n_clusters）"""
+    arr = normalize(np.asarray(vectors, dtype=np.float32))
+    centroids, _ = kmeans_plusplus(arr, n_clusters, random_state=random_state)
+    return centroids
+
+
+def update_centroids(
+    centroids: np.ndarray,
+    counts: np.ndarray,
+    batches: Iterable[np.ndarray],
+) -> int:
+    """
+    重心とクラスタごとの累積件数（counts）から、L2 正規化したバッチで学習を続ける（in-place）。
+    MiniBatchKMeans.partial_fit と同じく、各点を最も近い重心に割り当て、重心を
+    これまでの件数で重み付けした平均に更新する。件数が 0 の重心はバッチの平均に置き換わる。
+
+    Returns:
+        学習に使った件数
+    """
+    seen = 0
+    for batch in batches:
+        batch = normalize(np.asarray(batch, dtype=np.float32))
+        # ユークリッド距離の最小 = x·c - |c|^2 / 2 の最大
+        scores = batch @ centroids.T - 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+        labels = np.argmax(scores, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, batch)
+        hits = np.bincount(labels, minlength=len(centroids)).astype(counts.dtype)
+        touched = hits > 0
+        total = counts[touched] + hits[touched]
+        centroids[touched] = (
+            centroids[touched] * counts[touched, None] + sums[touched]
+        ) / total[:, None]
+        counts[touched] = total
+        seen += len(batch)
+    return seen
+
+
+def nearest_centroids(
+    centroids: np.ndarray,
+    vectors: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """各ベクターを最も近い（コサイン類似度が最大の）重心に割り当てる: (labels, scores)"""
+    sims = normalize(np.asarray(vectors, dtype=np.float32)) @ normalize(centroids).T
+    labels = np.argmax(sims, axis=1)
+    return labels, sims[np.arange(len(labels)), labels]
 
 
 def group_by_cluster(
@@ -0,0 +1,140 @@
+"""コレクションごとの逐次クラスタリング（ミニバッチ k-means）の学習・保存・割り当て
+
+重心とクラスタごとの累積件数は cluster_models テーブルに scope（コレクション ID、全体は空文字）
+ごとに保存し、更新時はその重心と件数からミニバッチ k-means（MiniBatchKMeans と同じ
+重み付き平均の更新）を続ける。
+投入時は保存済み重心への最近傍割り当てだけを行い（埋め込み・学習なし）、
+重心の更新は refine_cluster_model（定期ジョブ / API）で保存済みベクターから行う。
+全体モデルがまだなければ、ドキュメントが cluster_n_clusters 件そろった投入時に最初の学習を行う。
+"""
+import numpy as np
+from sqlalchemy.orm import Session
+
+from core.config import get_settings
+from core.logging import get_logger
+from pipelines.relate.cluster import init_centroids, nearest_centroids, update_centroids
+from storage.sql import repo
+from storage.vector.indexes import build_scope_filter, fetch_doc_vectors
+
+logger = get_logger(__name__)
+settings = get_settings()
+
+GLOBAL_SCOPE = ""
+
+
+def _centroids(record) -> np.ndarray:
+    return np.frombuffer(record.centroids, dtype=np.float32).reshape(record.n_clusters, -1)
+
+
+def _counts(record) -> np.ndarray:
+    return np.frombuffer(record.counts, dtype=np.float32)
+
+
+def refine_cluster_model(
+    session: Session,
+    collection_id: str | None = None,
+    n_clusters: int | None = None,
+    epochs: int = 1,
+    random_state: int = 42,
+) -> dict:
+    """
+    保存済みの重心と件数から、保存済みベクターで scope のモデルを更新し、全ドキュメントを
+    割り当て直す。モデルがない、または n_clusters が変わった場合は k-means++ から学習する。
+    バッチの順序は random_state で決まるので、同じ状態・同じコーパスなら結果も同じ。
+
+    Returns:
+        {"scope": str, "n_clusters": int, "documents": int, "sizes": {cluster: count}}
+    """
+    scope = collection_id or GLOBAL_SCOPE
+    record = repo.get_cluster_model(session, scope)
+    k = n_clusters or (record.n_clusters if record else settings.cluster_n_clusters)
+
+    doc_ids, vectors = fetch_doc_vectors(filter_=build_scope_filter(collection_id, None))
+    known = repo.list_document_ids(session)
+    # 取得順によらず同じ順序から並べ替える（random_state と合わせて結果を再現できる）
+    keep = sorted((i for i, d in enumerate(doc_ids) if d in known), key=doc_ids.__getitem__)
+    doc_ids = [doc_ids[i] for i in keep]
+    vectors = vectors[keep]
+    if len(doc_ids) < k:
+        logger.info("クラスタ学習をスキップ: scope=%r docs=%d < k=%d", scope, len(doc_ids), k)
+        return {"scope": scope, "n_clusters": k, "documents": len(doc_ids), "sizes": {}}
+
+    if record is not None and record.n_clusters == k:
+        centroids, counts = _centroids(record).copy(), _counts(record).copy()
+        n_seen = record.n_seen
+    else:
+        centroids = init_centroids(vectors, k, random_state=random_state)
+        counts = np.zeros(k, dtype=np.float32)
+        n_seen = 0
+
+    rng = np.random.default_rng(random_state)
+    size = settings.cluster_batch_size
+    for _ in range(max(1, epochs)):
+        order = rng.permutation(len(doc_ids))
+        n_seen += update_centroids(
+            centroids, counts, (vectors[order[s : s + size]] for s in range(0, len(order), size))
+        )
+
+    repo.save_cluster_model(
+        session,
+        scope,
+        n_clusters=k,
+        centroids=centroids.tobytes(),
+        counts=counts.tobytes(),
+        n_seen=n_seen,
+    )
+    labels, scores = nearest_centroids(centroids, vectors)
+    repo.replace_cluster_assignments(
+        session,
+        scope,
+        [
+            {"document_id": d, "cluster": int(label), "score": float(score)}
+            for d, label, score in zip(doc_ids, labels, scores)
+        ],
+    )
+    sizes = dict(zip(*np.unique(labels, return_counts=True)))
+    logger.info("クラスタ更新: scope=%r k=%d docs=%d", scope, k, len(doc_ids))
+    return {
+        "scope": scope,
+        "n_clusters": k,
+        "documents": len(doc_ids),
+        "sizes": {int(c): int(n) for c, n in sizes.items()},
+    }
+
+
+def assign_document(
+    session: Session,
+    doc_id: str,
+    doc_vector: np.ndarray,
+    collection_ids: list[str] | None = None,
+) -> dict[str, int]:
+    """
+    ドキュメントを全体と所属コレクションの保存済み重心に割り当てる（学習はしない）。
+    ただし全体モデルがなく、ドキュメントが cluster_n_clusters 件以上あれば最初のモデルを学習する。
+
+    Returns:
+        {scope: cluster}。モデルがない scope は含まない
+    """
+    assigned: dict[str, int] = {}
+    vector = np.asarray(doc_vector, dtype=np.float32).reshape(1, -1)
+    for scope in [GLOBAL_SCOPE, *(collection_ids or [])]:
+        record = repo.get_cluster_model(session, scope)
+        if (
+            record is None
+            and scope == GLOBAL_SCOPE
+            and repo.count_documents(session) >= settings.cluster_n_clusters
+        ):
+            refine_cluster_model(session)
+            record = repo.get_cluster_model(session, scope)
+        if record is None:
+            continue
+        labels, scores = nearest_centroids(_centroids(record), vector)
+        repo.set_cluster_assignment(session, doc_id, scope, int(labels[0]), float(scores[0]))
+        assigned[scope] = int(labels[0])
+    return assigned
+
+
+def refine_all_models(session: Session) -> list[dict]:
+    """全体モデルと保存済みの全コレクションモデルを更新する"""
+    scopes = {GLOBAL_SCOPE} | {m.scope for m in repo.list_cluster_models(session)}
+    return [refine_cluster_model(session, scope or None) for scope in sorted(scopes)]
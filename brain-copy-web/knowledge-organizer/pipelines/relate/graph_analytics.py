@@ -0,0 +1,193 @@
+"""関連グラフの指標計算（コミュニティ・PageRank・次数・ブリッジ度）
+
+edges を無向の重み付き疎行列にして、すべて scipy.sparse の行列演算で計算する。
+結果はドキュメントごとに graph_metrics テーブルへ保存し、API はそれを読むだけにする。
+"""
+from __future__ import annotations
+
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from core.logging import get_logger
+from storage.sql import repo
+from storage.sql.models import Document, Edge
+from storage.versions import EDGES, GRAPH_METRICS
+
+logger = get_logger(__name__)
+
+
+def load_adjacency(session: Session) -> tuple[list[str], sp.csr_matrix]:
+    """
+    edges を無向の重み付き隣接行列にする。両方向・複数種別のエッジは最大スコアを採用。
+
+    Returns:
+        (doc_ids, adjacency): adjacency[i, j] はドキュメント i と j のスコア
+    """
+    doc_ids = list(session.scalars(select(Document.id)))
+    index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    src, dst, weight = [], [], []
+    stmt = select(Edge.source_doc_id, Edge.target_doc_id, Edge.score)
+    for s, t, score in session.execute(stmt):
+        i, j = index.get(s), index.get(t)
+        if i is not None and j is not None and i != j:
+            src.append(i)
+            dst.append(j)
+            weight.append(score)
+
+    n = len(doc_ids)
+    rows = np.asarray(src + dst, dtype=np.int64)
+    cols = np.asarray(dst + src, dtype=np.int64)
+    vals = np.asarray(weight + weight, dtype=np.float64)
+    # 同じ (i, j) が複数あれば最大値を残す（csr 変換の合計にはしない）
+    if len(rows):
+        keys = rows * n + cols
+        order = np.argsort(keys, kind="stable")
+        keys, vals = keys[order], vals[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        vals = np.maximum.reduceat(vals, starts)
+        rows, cols = np.divmod(keys[starts], n)
+    adj = sp.csr_matrix((vals, (rows, cols)), shape=(n, n))
+    return doc_ids, adj
+
+
+def pagerank(
+    adj: sp.csr_matrix,
+    damping: float = 0.85,
+    tol: float = 1e-10,
+    max_iter: int = 100,
+) -> np.ndarray:
+    """重み付き PageRank（べき乗法）。出次数 0 のノードの質量は一様に配る"""
+    n = adj.shape[0]
+    if n == 0:
+        return np.empty(0)
+    out = np.asarray(adj.sum(axis=1)).ravel()
+    dangling = out == 0
+    inv = np.divide(1.0, out, out=np.zeros_like(out), where=~dangling)
+    transition = (sp.diags(inv) @ adj).T.tocsr()
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        new = damping * (transition @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(new - rank).sum() < tol:
+            rank = new
+            break
+        rank = new
+    return rank / rank.sum()
+
+
+def _row_argmax(matrix: sp.csr_matrix) -> np.ndarray:
+    """各行の最大要素の列番号（全行に非ゼロ要素がある前提。scipy の argmax より速い）"""
+    matrix.sum_duplicates()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    row_max = np.maximum.reduceat(matrix.data, matrix.indptr[:-1])
+    # 最大値に一致する要素のうち、行内で最初のもの
+    hit = np.flatnonzero(matrix.data == row_max[rows])
+    first = hit[np.r_[True, rows[hit][1:] != rows[hit][:-1]]]
+    return matrix.indices[first]
+
+
+def label_propagation(
+    adj: sp.csr_matrix,
+    max_iter: int = 50,
+    random_state: int = 42,
+) -> np.ndarray:
+    """
+    重み付きラベル伝播によるコミュニティ検出。各反復で、隣接ラベルの重み合計
+    （行列積 adj @ onehot(labels)）が最大のラベルへ更新する。全ノード同時更新は
+    振動しやすいため、毎回ランダムな半数のノードだけを更新する（半同期）。
+
+    Returns:
+        コミュニティ番号（大きい順に 0, 1, ...）
+    """
+    n = adj.shape[0]
+    labels = np.arange(n)
+    if n == 0:
+        return labels
+    rng = np.random.default_rng(random_state)
+    # 同点なら現在のラベルを保つよう、自分自身にごく小さな重みを与える
+    weights = (adj + sp.diags(np.full(n, 1e-6))).tocsr()
+    stable = 0
+    for _ in range(max_iter):
+        onehot = sp.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, n))
+        best = _row_argmax((weights @ onehot).tocsr())
+        update = rng.random(n) < 0.5
+        changed = update & (best != labels)
+        labels = np.where(update, best, labels)
+        # 変化がほぼない反復が 2 回続いたら収束とみなす
+        stable = stable + 1 if changed.sum() <= n // 1000 else 0
+        if stable >= 2:
+            break
+    # 番号を大きいコミュニティ順に振り直す
+    uniq, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(uniq), dtype=np.int64)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(len(uniq))
+    return rank[inverse]
+
+
+def bridge_scores(adj: sp.csr_matrix, communities: np.ndarray) -> np.ndarray:
+    """
+    参加係数 1 - Σ_c (k_ic / k_i)^2。隣接が複数コミュニティにまたがるほど 1 に近い
+    （異なる話題をつなぐハブ・ブリッジ文書の指標）。
+    """
+    n = adj.shape[0]
+    if n == 0:
+        return np.empty(0)
+    binary = adj.copy()
+    binary.data[:] = 1.0
+    onehot = sp.csr_matrix(
+        (np.ones(n), (np.arange(n), communities)), shape=(n, int(communities.max()) + 1)
+    )
+    per_comm = (binary @ onehot).tocsr()
+    degree = np.asarray(binary.sum(axis=1)).ravel()
+    squared = np.asarray(per_comm.multiply(per_comm).sum(axis=1)).ravel()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = 1.0 - squared / degree**2
+    return np.where(degree > 0, score, 0.0)
+
+
+def compute_graph_metrics(session: Session) -> list[dict]:
+    """全ドキュメントのグラフ指標を計算する（保存はしない）"""
+    t0 = time.perf_counter()
+    doc_ids, adj = load_adjacency(session)
+    n = len(doc_ids)
+    if n == 0:
+        return []
+    degree = adj.getnnz(axis=1)
+    weighted = np.asarray(adj.sum(axis=1)).ravel()
+    communities = label_propagation(adj)
+    ranks = pagerank(adj)
+    bridges = bridge_scores(adj, communities)
+    logger.info(
+        "グラフ指標: %d nodes, %d edges, %d communities (%.1fs)",
+        n,
+        adj.nnz // 2,
+        int(communities.max()) + 1,
+        time.perf_counter() - t0,
+    )
+    return [
+        {
+            "document_id": doc_id,
+            "community": int(communities[i]),
+            "pagerank": float(ranks[i]),
+            "degree": int(degree[i]),
+            "weighted_degree": float(weighted[i]),
+            "degree_centrality": float(degree[i] / (n - 1)) if n > 1 else 0.0,
+            "bridge_score": float(bridges[i]),
+        }
+        for i, doc_id in enumerate(doc_ids)
+    ]
+
+
+def refresh_graph_metrics(session: Session) -> int:
+    """
+    グラフ指標を計算して graph_metrics を置き換え、保存件数を返す。
+    計算に使ったエッジの世代も同じトランザクションで記録する（計算中に変わっても
+    次回は古いと判定される）。
+    """
+    version = repo.get_version(session, EDGES)
+    total = repo.replace_graph_metrics(session, compute_graph_metrics(session))
+    repo.set_version(session, GRAPH_METRICS, version)
+    return total
@@ -1,56 +1,189 @@
 """類似候補から Edge を SQL に保存するグラフ構築処理"""
+import os
+import time
+
+import numpy as np
 from sqlalchemy.orm import Session
 
 from core.config import get_settings
 from core.logging import get_logger
-from pipelines.enrich.embedder import embed_single
+from pipelines.relate.knn import topk_cosine_neighbors
 from pipelines.relate.similarity import find_similar_docs
 from storage.sql import repo
 from storage.sql.models import Document
+from storage.vector.indexes import doc_filter, fetch_doc_vectors
 
 logger = get_logger(__name__)
 settings = get_settings()
 
 
-def build_relations_for_doc(session: Session, doc: Document) -> int:
+def _stored_doc_vector(doc_id: str) -> np.ndarray | None:
+    """保存済みチャンクベクターの平均をドキュメントの代表ベクターとする（埋め込み API なし）"""
+    doc_ids, vectors = fetch_doc_vectors(filter_=doc_filter([doc_id]))
+    return vectors[0] if doc_ids else None
+
+
+def _find_neighbors(
+    session: Session,
+    doc_id: str,
+    doc_vector: np.ndarray,
+) -> list[tuple[str, float]]:
+    """代表ベクターの近傍ドキュメント (doc_id, score) を、SQL に存在するものだけ返す"""
+    similar = find_similar_docs(
+        query_vector=doc_vector.tolist(),
+        top_k=settings.relation_top_k,
+        exclude_doc_ids=[doc_id],
+    )
+    candidates = [
+        (c["doc_id"], c["max_score"])
+        for c in similar
+        if c["max_score"] >= settings.relation_threshold
+    ]
+    known = repo.get_documents(session, [d for d, _ in candidates])
+    return [(d, score) for d, score in candidates if d in known]
+
+
+def _offer_incoming(session: Session, doc_id: str, neighbors: list[tuple[str, float]]) -> int:
+    """
+    既存ドキュメントの上限付き近傍リスト（出エッジ top-k）に doc_id を差し込む。
+    リストが満杯で最小スコア以下なら何もしない。差し込んだら上限まで切り詰める。
+    """
+    k = settings.relation_top_k
+    stats = repo.get_edge_list_stats(session, [d for d, _ in neighbors])
+    accepted = []
+    for other_id, score in neighbors:
+        size, min_score = stats.get(other_id, (0, float("-inf")))
+        if size < k or score > min_score:
+            accepted.append((other_id, doc_id, score))
+    repo.upsert_edges(session, accepted)
+    for other_id, _, _ in accepted:
+        if stats.get(other_id, (0, 0.0))[0] >= k:
+            repo.trim_edges(session, other_id, keep=k)
+    return len(accepted)
+
+
+def build_relations_for_doc(
+    session: Session,
+    doc: Document,
+    doc_vector: np.ndarray | list[float] | None = None,
+) -> int:
     """
     1ドキュメントに対して関連ドキュメントを探し、Edge を保存する。
+    自分の出エッジ（top-k）に加え、近傍ドキュメント側の近傍リストも増分更新する。
+
+    Args:
+        doc_vector: 代表ベクター。省略時は Qdrant の保存済みチャンクベクターの平均
 
     Returns:
         作成・更新したエッジ数
     """
-    # ドキュメントの代表ベクター: 先頭チャンクを埋め込む
-    chunks = repo.get_chunks_by_doc(session, doc.id)
-    if not chunks:
-        logger.warning("doc %s にチャンクがありません", doc.id)
+    if doc_vector is None:
+        doc_vector = _stored_doc_vector(doc.id)
+        if doc_vector is None:
+            logger.warning("doc %s にベクターがありません", doc.id)
+            return 0
+    doc_vector = np.asarray(doc_vector, dtype=np.float32)
+
+    neighbors = _find_neighbors(session, doc.id, doc_vector)
+    repo.upsert_edges(session, [(doc.id, target_id, score) for target_id, score in neighbors])
+    incoming = _offer_incoming(session, doc.id, neighbors)
+
+    logger.info("doc %s → %d エッジを構築（逆方向 %d）", doc.id, len(neighbors), incoming)
+    return len(neighbors) + incoming
+
+
+def detach_document(session: Session, doc_id: str) -> list[str]:
+    """
+    削除前にドキュメントをグラフから外す。接続エッジを削除し、
+    このドキュメントを近傍に持っていたドキュメントを修復待ち（dirty）にする。
+
+    Returns:
+        修復待ちにしたドキュメント id
+    """
+    referrers = repo.delete_edges_for_doc(session, doc_id)
+    if referrers:
+        repo.mark_relations_dirty(session, referrers)
+    repo.clear_dirty_documents(session, [doc_id])
+    return referrers
+
+
+def repair_dirty_relations(
+    session: Session,
+    limit: int | None = None,
+    doc_ids: list[str] | None = None,
+) -> int:
+    """
+    修復待ちドキュメントの近傍リストを保存済みベクターから作り直す。
+    doc_ids を指定すると、そのうち修復待ちのものだけを対象にする。
+
+    Returns:
+        修復したドキュメント数
+    """
+    dirty = repo.list_dirty_documents(session, limit=limit, doc_ids=doc_ids)
+    if not dirty:
         return 0
+    docs = repo.get_documents(session, dirty)
+    doc_ids, vectors = fetch_doc_vectors(filter_=doc_filter(list(docs)))
+    edges = []
+    for doc_id, vector in zip(doc_ids, vectors):
+        repo.delete_outgoing_edges(session, doc_id)
+        neighbors = _find_neighbors(session, doc_id, vector)
+        edges.extend((doc_id, target_id, score) for target_id, score in neighbors)
+    repo.upsert_edges(session, edges)
+    repo.clear_dirty_documents(session, dirty)
+    logger.info("近傍リストを修復: %d docs", len(doc_ids))
+    return len(doc_ids)
 
-    # 先頭チャンクの埋め込みを代表ベクターとして使用
-    query_vector = embed_single(chunks[0].text)
 
-    similar = find_similar_docs(
-        query_vector=query_vector,
-        top_k=settings.relation_top_k,
-        exclude_doc_ids=[doc.id],
+def rebuild_all_relations(
+    session: Session,
+    top_k: int | None = None,
+    threshold: float | None = None,
+    workers: int | None = None,
+) -> int:
+    """
+    全ドキュメントのリレーションを一括で再構築する。
+
+    Qdrant に保存済みのチャンクベクターをドキュメント平均にまとめ、
+    ブロック分割の全ペア kNN（pipelines.relate.knn）で上位 top_k 近傍を求めて
+    "similar" エッジを置き換える。埋め込み API もドキュメントごとの検索も呼ばない。
+
+    Returns:
+        保存したエッジ数
+    """
+    k = top_k or settings.relation_top_k
+    min_score = settings.relation_threshold if threshold is None else threshold
+    n_workers = workers if workers is not None else settings.relation_workers
+    n_workers = n_workers or os.cpu_count() or 1
+
+    t0 = time.perf_counter()
+    doc_ids, vectors = fetch_doc_vectors()
+    # SQL に存在しない（孤立した）point のドキュメントは除外
+    known = repo.list_document_ids(session)
+    keep = [i for i, d in enumerate(doc_ids) if d in known]
+    doc_ids = [doc_ids[i] for i in keep]
+    vectors = vectors[keep]
+    logger.info("ベクター読み込み: %d docs (%.1fs)", len(doc_ids), time.perf_counter() - t0)
+    if len(doc_ids) < 2:
+        return repo.replace_edges(session, [])
+
+    t1 = time.perf_counter()
+    indices, scores = topk_cosine_neighbors(
+        vectors, k, row_block=settings.relation_block_size, workers=n_workers
     )
+    logger.info("kNN 計算: k=%d workers=%d (%.1fs)", k, n_workers, time.perf_counter() - t1)
+
+    mask = scores >= min_score
+    src = np.repeat(np.arange(len(doc_ids)), indices.shape[1])[mask.ravel()]
+    dst = indices[mask]
+    sim = scores[mask]
+    edges = [
+        (doc_ids[i], doc_ids[j], round(float(s), 6))
+        for i, j, s in zip(src.tolist(), dst.tolist(), sim.tolist())
+    ]
 
-    count = 0
-    for candidate in similar:
-        target_id = candidate["doc_id"]
-        score = candidate["max_score"]
-        if score < settings.relation_threshold:
-            continue
-        repo.upsert_edge(session, doc.id, target_id, score)
-        count += 1
-
-    logger.info("doc %s → %d エッジを構築", doc.id, count)
-    return count
-
-
-def rebuild_all_relations(session: Session) -> int:
-    """全ドキュメントに対してリレーション再構築"""
-    docs = repo.list_documents(session, limit=10000)
-    total = 0
-    for doc in docs:
-        total += build_relations_for_doc(session, doc)
+    t2 = time.perf_counter()
+    total = repo.replace_edges(session, edges)
+    repo.clear_dirty_documents(session)
+    logger.info("エッジ保存: %d 件 (%.1fs)", total, time.perf_counter() - t2)
     return total
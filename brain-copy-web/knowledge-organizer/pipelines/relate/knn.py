@@ -0,0 +1,281 @@
+"""ブロック分割した行列積によるコサイン類似度 top-k 近傍（全ペア kNN）
+
+全文書の n×n 類似度行列は持たず、行ブロック × 列ブロックのタイルごとに
+argpartition で上位 k 件を取り、行ブロック内で逐次マージする。
+メモリは row_block × col_block の float32 タイル分に抑えられる。
+行ブロックはプロセスプールに分配し、行列はメモリマップで共有する。
+
+非常に大きな n 向けに、粗いクラスタ（IVF）で候補を絞る近似版も持つ。
+点が少し増減しただけなら、影響を受ける行だけ計算し直す差分更新も使える。
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+_shared: np.ndarray | None = None
+
+
+def normalize_rows(arr: np.ndarray) -> np.ndarray:
+    """行ベクトルを L2 正規化した float32 配列を返す（ゼロ行はそのまま）"""
+    arr = np.asarray(arr, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+def _merge_topk(
+    best_idx: np.ndarray,
+    best_sim: np.ndarray,
+    cand_idx: np.ndarray,
+    cand_sim: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """行ごとに 2 つの候補集合を合わせて上位 k 件を残す（順不同）"""
+    idx = np.concatenate([best_idx, cand_idx], axis=1)
+    sim = np.concatenate([best_sim, cand_sim], axis=1)
+    if sim.shape[1] <= k:
+        return idx, sim
+    part = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+    rows = np.arange(sim.shape[0])[:, None]
+    return idx[rows, part], sim[rows, part]
+
+
+def _topk_rows(
+    matrix: np.ndarray,
+    start: int,
+    stop: int,
+    k: int,
+    col_block: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """matrix[start:stop] の各行について、自分以外で類似度上位 k 件を返す（降順）"""
+    n = matrix.shape[0]
+    rows = np.asarray(matrix[start:stop], dtype=np.float32)
+    m = rows.shape[0]
+    best_idx = np.empty((m, 0), dtype=np.int64)
+    best_sim = np.empty((m, 0), dtype=np.float32)
+
+    for c0 in range(0, n, col_block):
+        c1 = min(c0 + col_block, n)
+        sims = rows @ np.asarray(matrix[c0:c1], dtype=np.float32).T
+        # 自己ループを除外
+        lo, hi = max(start, c0), min(stop, c1)
+        if lo < hi:
+            r = np.arange(lo, hi)
+            sims[r - start, r - c0] = -np.inf
+        kk = min(k, c1 - c0)
+        part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        part_sim = np.take_along_axis(sims, part, axis=1)
+        best_idx, best_sim = _merge_topk(best_idx, best_sim, part + c0, part_sim, k)
+
+    order = np.argsort(-best_sim, axis=1)
+    return (
+        np.take_along_axis(best_idx, order, axis=1),
+        np.take_along_axis(best_sim, order, axis=1),
+    )
+
+
+def _init_worker(path: str) -> None:
+    global _shared
+    _shared = np.load(path, mmap_mode="r")
+
+
+def _worker(args: tuple[int, int, int, int]) -> tuple[int, np.ndarray, np.ndarray]:
+    start, stop, k, col_block = args
+    idx, sim = _topk_rows(_shared, start, stop, k, col_block)
+    return start, idx, sim
+
+
+def topk_cosine_neighbors(
+    vectors: np.ndarray,
+    k: int,
+    row_block: int = 1024,
+    col_block: int = 16384,
+    workers: int = 1,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    全ベクター間のコサイン類似度で、各行の上位 k 近傍（自分を除く）を求める。
+
+    Args:
+        vectors: (n, dim) の埋め込み。内部で L2 正規化する
+        k: 近傍数（n - 1 を超える場合は n - 1 に丸める）
+        row_block / col_block: タイルサイズ。作業メモリは約 row_block * col_block * 4 バイト
+        workers: 行ブロックを処理するプロセス数。1 ならプロセスを起動しない
+
+    Returns:
+        (indices, scores): いずれも (n, k)。各行は類似度降順
+    """
+    matrix = normalize_rows(vectors)
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64), np.empty((n, 0), dtype=np.float32)
+
+    indices = np.empty((n, k), dtype=np.int64)
+    scores = np.empty((n, k), dtype=np.float32)
+    blocks = [(s, min(s + row_block, n), k, col_block) for s in range(0, n, row_block)]
+
+    if workers <= 1 or len(blocks) == 1:
+        for start, stop, _, _ in blocks:
+            indices[start:stop], scores[start:stop] = _topk_rows(matrix, start, stop, k, col_block)
+        return indices, scores
+
+    # 行列は一時ファイル経由のメモリマップで共有し、ワーカーごとのコピーを避ける
+    with tempfile.TemporaryDirectory(prefix="knn_") as tmp:
+        path = os.path.join(tmp, "vectors.npy")
+        np.save(path, matrix)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(path,)
+        ) as pool:
+            for start, idx, sim in pool.map(_worker, blocks):
+                indices[start : start + idx.shape[0]] = idx
+                scores[start : start + sim.shape[0]] = sim
+    return indices, scores
+
+
+def approx_topk_cosine_neighbors(
+    vectors: np.ndarray,
+    k: int,
+    n_lists: int | None = None,
+    n_probe: int = 8,
+    random_state: int = 42,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    転置ファイル（IVF）方式の近似 top-k 近傍。MiniBatchKMeans で n_lists 個のセルに分け、
+    各セルの点は重心が近い n_probe 個のセル（自セルを含む）の点だけを候補にする。
+    計算量はおよそ n * (n / n_lists) * n_probe で、全ペアより大幅に小さい。
+
+    Returns:
+        (indices, scores): いずれも (n, k)。各行は類似度降順。候補が k 件に満たない
+        行の残りは index = -1, score = -inf
+    """
+    matrix = normalize_rows(vectors)
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64), np.empty((n, 0), dtype=np.float32)
+
+    n_lists = max(1, min(n_lists or int(np.sqrt(n)), n))
+    # セル分割は標本で学習し、全点は重心との内積最大のセルに割り当てる
+    rng = np.random.default_rng(random_state)
+    sample = matrix[rng.choice(n, size=min(n, 64 * n_lists), replace=False)]
+    km = MiniBatchKMeans(
+        n_clusters=n_lists, random_state=random_state, batch_size=4096, n_init=1, max_iter=20
+    ).fit(sample)
+    centroids = normalize_rows(km.cluster_centers_)
+    labels = np.concatenate(
+        [np.argmax(matrix[s : s + 8192] @ centroids.T, axis=1) for s in range(0, n, 8192)]
+    )
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(n_lists + 1))
+    members = [order[bounds[c] : bounds[c + 1]] for c in range(n_lists)]
+
+    n_probe = min(n_probe, n_lists)
+    probe = np.argsort(-(centroids @ centroids.T), axis=1)[:, :n_probe]
+
+    indices = np.full((n, k), -1, dtype=np.int64)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    for c in range(n_lists):
+        query = members[c]
+        if len(query) == 0:
+            continue
+        # 自セルを先頭に置き、先頭 len(query) 列の対角を自己ループとして除外する
+        cells = [c] + [p for p in probe[c] if p != c][: n_probe - 1]
+        cand = np.concatenate([members[p] for p in cells])
+        sims = matrix[query] @ matrix[cand].T
+        m = len(query)
+        sims[np.arange(m), np.arange(m)] = -np.inf
+        kk = min(k, len(cand) - 1)
+        if kk <= 0:
+            continue
+        part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        part_sim = np.take_along_axis(sims, part, axis=1)
+        rank = np.argsort(-part_sim, axis=1)
+        indices[query, :kk] = cand[np.take_along_axis(part, rank, axis=1)]
+        scores[query, :kk] = np.take_along_axis(part_sim, rank, axis=1)
+    return indices, scores
+
+
+def topk_cosine_neighbors_of(
+    vectors: np.ndarray,
+    rows: np.ndarray,
+    k: int,
+    col_block: int = 16384,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    rows で指定した行だけについて、全ベクター中の上位 k 近傍（自分を除く）を求める。
+    vectors は L2 正規化済みであること。
+
+    Returns:
+        (indices, scores): いずれも (len(rows), k)。各行は類似度降順
+    """
+    n = vectors.shape[0]
+    rows = np.asarray(rows, dtype=np.int64)
+    query = vectors[rows]
+    best_idx = np.empty((len(rows), 0), dtype=np.int64)
+    best_sim = np.empty((len(rows), 0), dtype=np.float32)
+    for c0 in range(0, n, col_block):
+        c1 = min(c0 + col_block, n)
+        sims = query @ vectors[c0:c1].T
+        own = (rows >= c0) & (rows < c1)
+        sims[np.flatnonzero(own), rows[own] - c0] = -np.inf
+        kk = min(k, c1 - c0)
+        part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        part_sim = np.take_along_axis(sims, part, axis=1)
+        best_idx, best_sim = _merge_topk(best_idx, best_sim, part + c0, part_sim, k)
+    order = np.argsort(-best_sim, axis=1)
+    return (
+        np.take_along_axis(best_idx, order, axis=1),
+        np.take_along_axis(best_sim, order, axis=1),
+    )
+
+
+def update_topk_neighbors(
+    vectors: np.ndarray,
+    indices: np.ndarray,
+    scores: np.ndarray,
+    added: np.ndarray,
+    recompute: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    既存の top-k 表を、行が追加・削除された後のベクター集合に合わせて更新する。
+
+    recompute 以外の行は、手持ちの上位 k 件と追加行 added との類似度をマージするだけで済む。
+    recompute の行（新しい行や、近傍が削除された行）は全件から計算し直す。
+
+    Args:
+        vectors: 更新後の (n, dim) ベクター。L2 正規化済みであること
+        indices / scores: 更新後の行番号で表した (n, k) の表。空きは -1 / -inf
+        added: 追加された行番号
+        recompute: 全件から計算し直す行番号（added を含めてよい）
+
+    Returns:
+        (indices, scores): 各行は類似度降順
+    """
+    n, k = indices.shape
+    indices = indices.copy()
+    scores = scores.copy()
+    recompute = np.unique(np.asarray(recompute, dtype=np.int64))
+    added = np.asarray(added, dtype=np.int64)
+
+    keep = np.setdiff1d(np.arange(n), recompute)
+    if len(keep) and len(added):
+        sims = vectors[keep] @ vectors[added].T
+        merged_idx, merged_sim = _merge_topk(
+            indices[keep], scores[keep], np.broadcast_to(added, sims.shape), sims, k
+        )
+        order = np.argsort(-merged_sim, axis=1)
+        indices[keep] = np.take_along_axis(merged_idx, order, axis=1)
+        scores[keep] = np.take_along_axis(merged_sim, order, axis=1)
+
+    if len(recompute) and k > 0:
+        for s in range(0, len(recompute), 1024):
+            rows = recompute[s : s + 1024]
+            idx, sim = topk_cosine_neighbors_of(vectors, rows, k)
+            indices[rows, : idx.shape[1]] = idx
+            scores[rows, : sim.shape[1]] = sim
+    return indices, scores
@@ -0,0 +1,182 @@
+"""クラスタ可視化用レイアウト（クラスタ番号・2 次元座標・近傍接続）の計算と差分更新
+
+compute_layout は KMeans の重心と PCA を学習して全点を配置する。
+update_layout は前回のレイアウトを使い、増えた点だけを PCA.transform（座標）と
+最近傍の重心（クラスタ）で配置する。既存の点の座標・クラスタは変えず、
+近傍接続も影響を受ける行だけを計算し直す。
+"""
+from __future__ import annotations
+
+import hashlib
+from collections import Counter
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+from pipelines.relate.cluster import fit_clusters, nearest_centroids
+from pipelines.relate.knn import (
+    approx_topk_cosine_neighbors,
+    normalize_rows,
+    topk_cosine_neighbors,
+    update_topk_neighbors,
+)
+
+# neighbor_search="auto" で近似近傍に切り替える点数
+APPROX_MIN_POINTS = 50_000
+
+
+def row_keys(vectors: np.ndarray) -> list[bytes]:
+    """各行の識別子（float32 バイト列の SHA-1）。同じベクターは出現順の番号で区別する"""
+    arr = np.ascontiguousarray(vectors, dtype=np.float32)
+    seen: Counter[bytes] = Counter()
+    keys = []
+    for row in arr:
+        digest = hashlib.sha1(row.tobytes()).digest()
+        seen[digest] += 1
+        keys.append(digest + seen[digest].to_bytes(4, "little"))
+    return keys
+
+
+def set_digest(keys: list[bytes]) -> bytes:
+    """行の並び順によらないベクター集合のハッシュ"""
+    return hashlib.sha1(b"".join(sorted(keys))).digest()
+
+
+class ClusterLayout:
+    """
+    1 回分のレイアウト結果と、差分配置に使う学習済みモデル（重心・PCA）。
+
+    keys[i] が行 i の識別子で、labels / coords / neighbors / similarities は同じ行順。
+    neighbors の空きは -1。changed は最後のフル計算から差分配置で増減した点数の累計。
+    """
+
+    def __init__(
+        self,
+        keys: list[bytes],
+        labels: np.ndarray,
+        coords: np.ndarray,
+        centroids: np.ndarray,
+        reducer: PCA,
+        neighbors: np.ndarray,
+        similarities: np.ndarray,
+        top_edges: int,
+        changed: int = 0,
+    ) -> None:
+        self.keys = keys
+        self.labels = labels
+        self.coords = coords
+        self.centroids = centroids
+        self.reducer = reducer
+        self.neighbors = neighbors
+        self.similarities = similarities
+        self.top_edges = top_edges
+        self.changed = changed
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def connections(self) -> list[list[int]]:
+        """各点の近傍（近い順）の行番号リスト"""
+        return [[j for j in row if j >= 0] for row in self.neighbors.tolist()]
+
+
+def _empty_neighbors(n: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+    return np.full((n, k), -1, dtype=np.int64), np.full((n, k), -np.inf, dtype=np.float32)
+
+
+def compute_layout(
+    vectors: list[list[float]] | np.ndarray,
+    n_clusters: int,
+    top_edges: int,
+    neighbor_search: str = "auto",
+    keys: list[bytes] | None = None,
+) -> ClusterLayout:
+    """
+    全点をフル計算で配置する（KMeans・PCA の学習と top_edges 近傍）。
+    neighbor_search が approximate（auto では点数が多いとき）なら IVF の近似近傍を使う。
+    """
+    arr = np.asarray(vectors, dtype=np.float32)
+    n = len(arr)
+    labels, centroids = fit_clusters(arr, n_clusters)
+    reducer = PCA(n_components=2, random_state=42).fit(arr)
+    coords = reducer.transform(arr).astype(np.float32)
+
+    k = max(0, min(top_edges, n - 1))
+    if k == 0:
+        neighbors, similarities = _empty_neighbors(n, 0)
+    elif neighbor_search == "approximate" or (
+        neighbor_search == "auto" and n >= APPROX_MIN_POINTS
+    ):
+        neighbors, similarities = approx_topk_cosine_neighbors(arr, k)
+    else:
+        neighbors, similarities = topk_cosine_neighbors(arr, k)
+    return ClusterLayout(
+        keys if keys is not None else row_keys(arr),
+        labels,
+        coords,
+        centroids,
+        reducer,
+        neighbors,
+        similarities,
+        top_edges=top_edges,
+    )
+
+
+def update_layout(
+    previous: ClusterLayout,
+    vectors: list[list[float]] | np.ndarray,
+    keys: list[bytes] | None = None,
+) -> ClusterLayout:
+    """
+    previous を元に、点の増減・並べ替え後のレイアウトを作る（KMeans・PCA は再学習しない）。
+
+    既存の点は前回の座標・クラスタをそのまま使い、新しい点は PCA.transform と
+    最近傍の重心で配置する。近傍接続は、既存の上位 k 件に新しい点を候補として
+    マージし、新しい点と近傍が削除された点だけを全件から計算し直す。
+    """
+    arr = np.asarray(vectors, dtype=np.float32)
+    keys = keys if keys is not None else row_keys(arr)
+    n = len(keys)
+    position = {key: i for i, key in enumerate(previous.keys)}
+    old_of = np.fromiter((position.get(key, -1) for key in keys), dtype=np.int64, count=n)
+    known = np.flatnonzero(old_of >= 0)
+    added = np.flatnonzero(old_of < 0)
+    removed = len(previous) - len(known)
+
+    labels = np.empty(n, dtype=np.int64)
+    coords = np.empty((n, 2), dtype=np.float32)
+    labels[known] = previous.labels[old_of[known]]
+    coords[known] = previous.coords[old_of[known]]
+    if len(added):
+        labels[added], _ = nearest_centroids(previous.centroids, arr[added])
+        coords[added] = previous.reducer.transform(arr[added])
+
+    k = max(0, min(previous.top_edges, n - 1))
+    neighbors, similarities = _empty_neighbors(n, k)
+    if k > 0:
+        # 前回の表を新しい行番号に付け替える（末尾の -1 は「削除済み・空き」）
+        new_of = np.full(len(previous) + 1, -1, dtype=np.int64)
+        new_of[old_of[known]] = known
+        width = min(previous.neighbors.shape[1], k)
+        old_table = previous.neighbors[old_of[known], :width]
+        remapped = new_of[old_table]
+        neighbors[known, :width] = remapped
+        similarities[known, :width] = np.where(
+            remapped >= 0, previous.similarities[old_of[known], :width], -np.inf
+        )
+        lost = known[((old_table >= 0) & (remapped < 0)).any(axis=1)]
+        if len(added) or len(lost):
+            neighbors, similarities = update_topk_neighbors(
+                normalize_rows(arr), neighbors, similarities, added, np.union1d(added, lost)
+            )
+    return ClusterLayout(
+        keys,
+        labels,
+        coords,
+        previous.centroids,
+        previous.reducer,
+        neighbors,
+        similarities,
+        top_edges=previous.top_edges,
+        changed=previous.changed + len(added) + removed,
+    )
@@ -0,0 +1,231 @@
+"""2 次元クラスタマップの詳細度（LOD）タイル – 四分木（Z 順序）索引と集約
+
+座標を正方形の範囲に正規化し、各点を DEPTH ビット精度の Morton（Z 順序）コードで並べる。
+ズーム z のタイル (x, y) は Morton コードの上位 2z ビットが等しい点の集合なので、
+並べ替え済みのコード列上の連続区間として二分探索だけで取り出せる（暗黙の四分木）。
+
+タイル内の点が max_points 以下なら点をそのまま返す。多ければタイルを 8×8 の小区画に分け、
+(小区画, クラスタ) ごとに重心・件数・代表点（重心に最も近い点）へ集約する。
+エッジは近傍表（類似度つき）から作り、スコアの高いものだけを残す。
+"""
+from __future__ import annotations
+
+import numpy as np
+
+# Morton コードの 1 軸あたりのビット数（= 索引の最大分解能）
+DEPTH = 20
+# 集約タイルの小区画の分割数（2^SUBDIVISION × 2^SUBDIVISION）
+SUBDIVISION = 3
+# これより深いズームでは集約しない
+MAX_ZOOM = DEPTH - SUBDIVISION
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    """下位 32 ビットの各ビットの間に 0 を挟む（Morton コードの 1 軸分）"""
+    v = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return _spread_bits(x) | (_spread_bits(y) << np.uint64(1))
+
+
+class TileIndex:
+    """
+    1 枚のマップ（座標・クラスタ・近傍表・テキスト）に対するタイル索引。
+
+    order は Morton コード順の行番号、rank[row] はその並びでの位置。
+    """
+
+    def __init__(
+        self,
+        coords: np.ndarray,
+        labels: np.ndarray,
+        neighbors: np.ndarray,
+        similarities: np.ndarray,
+        texts: list[str],
+    ) -> None:
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.neighbors = neighbors
+        self.similarities = similarities
+        self.texts = texts
+        n = len(self.coords)
+
+        lo = self.coords.min(axis=0) if n else np.zeros(2)
+        hi = self.coords.max(axis=0) if n else np.ones(2)
+        # 縦横同じ縮尺の正方形。最大値の点も範囲内に入るよう少しだけ広げる
+        self.origin = lo
+        self.side = float(max(hi - lo)) * (1 + 1e-9) or 1.0
+        cells = 1 << DEPTH
+        grid = np.clip(((self.coords - lo) / self.side * cells).astype(np.int64), 0, cells - 1)
+        codes = morton(grid[:, 0], grid[:, 1])
+        self.order = np.argsort(codes, kind="stable")
+        self.codes = codes[self.order]
+        self.rank = np.empty(n, dtype=np.int64)
+        self.rank[self.order] = np.arange(n)
+        self.n_clusters = int(self.labels.max()) + 1 if n else 0
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def bounds(self) -> list[float]:
+        """マップ全体（ズーム 0 のタイル）の範囲 [min_x, min_y, max_x, max_y]"""
+        return self.tile_bounds(0, 0, 0)
+
+    def tile_bounds(self, z: int, x: int, y: int) -> list[float]:
+        size = self.side / (1 << z)
+        x0 = float(self.origin[0] + x * size)
+        y0 = float(self.origin[1] + y * size)
+        return [x0, y0, x0 + size, y0 + size]
+
+    def _range(self, z: int, x: int, y: int) -> tuple[int, int]:
+        """タイル (z, x, y) に入る点の、Morton 順での区間 [lo, hi)"""
+        shift = np.uint64(2 * (DEPTH - z))
+        prefix = int(morton(np.array([x]), np.array([y]))[0])
+        lo = np.uint64(prefix) << shift
+        hi = np.uint64(prefix + 1) << shift
+        return (
+            int(np.searchsorted(self.codes, lo, side="left")),
+            int(np.searchsorted(self.codes, hi, side="left")),
+        )
+
+    def _point(self, row: int) -> dict:
+        return {
+            "id": row,
+            "x": float(self.coords[row, 0]),
+            "y": float(self.coords[row, 1]),
+            "cluster": int(self.labels[row]),
+            "text": self.texts[row],
+        }
+
+    def _edges(
+        self,
+        rows: np.ndarray,
+        min_score: float,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """rows を始点とするエッジ (source, target, score)（min_score 以上）"""
+        if self.neighbors.shape[1] == 0 or len(rows) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float32)
+        targets = self.neighbors[rows]
+        scores = self.similarities[rows]
+        keep = (targets >= 0) & (scores >= min_score)
+        sources = np.broadcast_to(rows[:, None], targets.shape)
+        return sources[keep], targets[keep], scores[keep]
+
+    @staticmethod
+    def _strongest(a: np.ndarray, b: np.ndarray, score: np.ndarray, limit: int):
+        """無向ペアごとに最大スコアを残し、スコア上位 limit 本を返す"""
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        if len(lo) == 0 or limit <= 0:
+            return lo[:0], hi[:0], score[:0]
+        key = lo.astype(np.int64) * (int(hi.max()) + 1) + hi
+        # スコア上位の候補だけで重複を除き、異なるペアが limit 本そろうまで候補を広げる
+        take = limit * 2
+        while True:
+            if len(score) > take:
+                cand = np.argpartition(-score, take - 1)[:take]
+            else:
+                cand = np.arange(len(score))
+            order = np.lexsort((-score[cand], key[cand]))
+            cand = cand[order]
+            cand = cand[np.r_[True, key[cand][1:] != key[cand][:-1]]]
+            if len(cand) >= limit or take >= len(score):
+                break
+            take *= 4
+        top = cand[np.argsort(-score[cand], kind="stable")[:limit]]
+        return lo[top], hi[top], score[top]
+
+    def tile(
+        self,
+        z: int,
+        x: int,
+        y: int,
+        max_points: int = 256,
+        max_edges: int = 512,
+        min_score: float = -1.0,
+    ) -> dict:
+        """
+        タイル (z, x, y) の内容。点が max_points 以下（または z >= MAX_ZOOM）なら個別の点、
+        それ以外は (小区画, クラスタ) ごとの集約を返す。
+
+        Returns:
+            {"total", "aggregated", "points", "aggregates", "edges", "external"}
+            edges は個別の点なら (点 id, 点 id, score)、集約なら (集約の添字, 集約の添字, score)。
+            external は個別の点のエッジ先のうちタイル外の点 (id, x, y)
+        """
+        lo, hi = self._range(z, x, y)
+        rows = self.order[lo:hi]
+        total = hi - lo
+        if total <= max_points or z >= MAX_ZOOM:
+            src, dst, score = self._edges(rows, min_score)
+            a, b, score = self._strongest(src, dst, score, max_edges)
+            inside = set(rows.tolist())
+            outside = sorted({int(v) for v in np.r_[a, b].tolist()} - inside)
+            return {
+                "total": total,
+                "aggregated": False,
+                "points": [self._point(int(r)) for r in rows],
+                "aggregates": [],
+                "edges": [
+                    (int(i), int(j), round(float(s), 4))
+                    for i, j, s in zip(a.tolist(), b.tolist(), score.tolist())
+                ],
+                "external": [
+                    (v, float(self.coords[v, 0]), float(self.coords[v, 1])) for v in outside
+                ],
+            }
+
+        # (小区画, クラスタ) で集約
+        cell = self.codes[lo:hi] >> np.uint64(2 * (DEPTH - z - SUBDIVISION))
+        cell = (cell & np.uint64((1 << (2 * SUBDIVISION)) - 1)).astype(np.int64)
+        labels = self.labels[rows]
+        groups, group_of = np.unique(cell * self.n_clusters + labels, return_inverse=True)
+        counts = np.bincount(group_of)
+        xs, ys = self.coords[rows, 0], self.coords[rows, 1]
+        cx = np.bincount(group_of, weights=xs) / counts
+        cy = np.bincount(group_of, weights=ys) / counts
+        # 代表点: 集約の重心に最も近い点
+        dist = (xs - cx[group_of]) ** 2 + (ys - cy[group_of]) ** 2
+        by_group = np.lexsort((dist, group_of))
+        first = by_group[np.r_[True, group_of[by_group][1:] != group_of[by_group][:-1]]]
+        representative = rows[first]
+
+        # エッジ: 両端がタイル内の点のものを集約間のエッジにまとめる
+        src, dst, score = self._edges(rows, min_score)
+        pos = self.rank[dst]
+        inside = (pos >= lo) & (pos < hi)
+        ga = group_of[self.rank[src[inside]] - lo]
+        gb = group_of[pos[inside] - lo]
+        score = score[inside]
+        between = ga != gb
+        a, b, score = self._strongest(ga[between], gb[between], score[between], max_edges)
+        return {
+            "total": total,
+            "aggregated": True,
+            "points": [],
+            "aggregates": [
+                {
+                    "x": float(cx[g]),
+                    "y": float(cy[g]),
+                    "cluster": int(groups[g] % self.n_clusters),
+                    "count": int(counts[g]),
+                    "representative": self._point(int(representative[g])),
+                }
+                for g in range(len(groups))
+            ],
+            "edges": [
+                (int(i), int(j), round(float(s), 4))
+                for i, j, s in zip(a.tolist(), b.tolist(), score.tolist())
+            ],
+            "external": [],
+        }
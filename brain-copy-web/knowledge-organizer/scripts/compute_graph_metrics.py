@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+関連グラフ（edges）からコミュニティ・PageRank・次数・ブリッジ度を計算し、
+graph_metrics テーブルに保存するスクリプト。cron などで定期実行できる。
+
+使い方:
+  python scripts/compute_graph_metrics.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipelines.relate.graph_analytics import refresh_graph_metrics
+from storage.sql.repo import get_session, init_db
+
+
+def main() -> None:
+    init_db()
+    with get_session() as session:
+        total = refresh_graph_metrics(session)
+    print(f"{total} ドキュメントのグラフ指標を保存しました。")
+
+
+if __name__ == "__main__":
+    main()
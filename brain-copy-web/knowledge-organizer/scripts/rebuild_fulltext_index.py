@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+chunks から全文検索インデックス（SQLite FTS5）を作り直すスクリプト。
+VACUUM などで chunks の rowid が変わった後に実行する。
+
+使い方:
+  python scripts/rebuild_fulltext_index.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.sql import repo
+from storage.sql.fulltext import fulltext_available, rebuild_fulltext_index
+from storage.sql.repo import get_session, init_db
+
+
+def main() -> None:
+    init_db()
+    if not fulltext_available():
+        print("全文検索インデックスはこの DB では使えません（SQLite の FTS5 が必要です）。")
+        return
+    with get_session() as session:
+        rebuild_fulltext_index(session)
+        # 語彙検索の結果が変わるので検索キャッシュも無効にする
+        repo.mark_corpus_changed(session)
+    print("全文検索インデックスを作り直しました。")
+
+
+if __name__ == "__main__":
+    main()
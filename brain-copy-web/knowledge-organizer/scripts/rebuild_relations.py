@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+保存済みベクターから全ドキュメントの関連グラフ（edges）を再構築するスクリプト。
+埋め込み API は呼ばない。
+
+使い方:
+  python scripts/rebuild_relations.py
+  python scripts/rebuild_relations.py --top-k 20 --threshold 0.7 --workers 8
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipelines.relate.graph_builder import rebuild_all_relations
+from storage.sql.repo import get_session, init_db
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="関連グラフを全ペア kNN で再構築します。")
+    parser.add_argument("--top-k", type=int, default=None, help="各ドキュメントの近傍数")
+    parser.add_argument("--threshold", type=float, default=None, help="エッジにする最小類似度")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（0 = CPU 数）")
+    args = parser.parse_args()
+
+    init_db()
+    with get_session() as session:
+        total = rebuild_all_relations(
+            session, top_k=args.top_k, threshold=args.threshold, workers=args.workers
+        )
+    print(f"{total} エッジを保存しました。")
+
+
+if __name__ == "__main__":
+    main()
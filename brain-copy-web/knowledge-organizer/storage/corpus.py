@@ -0,0 +1,13 @@
+"""コーパス世代 – 投入・削除のたびに進め、派生キャッシュを一括無効化する
+
+世代は SQL の世代カウンタ（storage.versions の CORPUS）なので、別の uvicorn ワーカーや
+取り込みスクリプト（fetch_*_to_texts.py --ingest inprocess など）の変更でも進む。
+投入・削除したセッションが repo.mark_corpus_changed で印を付け、get_session が
+同じトランザクションで進める。
+"""
+from storage.versions import CORPUS, store_version
+
+
+def corpus_generation() -> int:
+    """現在のコーパス世代を返す"""
+    return store_version(CORPUS)
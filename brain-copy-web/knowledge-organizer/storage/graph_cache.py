@@ -0,0 +1,285 @@
+"""エッジグラフのインメモリ隣接キャッシュ（CSR 形式）
+
+edges テーブルを無向グラフとして読み込み、ノードごとの隣接（相手・スコア・関連種別）を
+スコア降順の CSR 配列で保持する。ノード id → タイトルの表も持つので、
+/related は SQL を発行せずに配列のスライスだけで答えられる。
+
+エッジを書き込んだセッションはコミット後に invalidate() で接続ノードを通知する。
+通知されたノードは次の参照時に 1 クエリでまとめて読み直し、差分（overlay）として
+CSR より優先する。差分が増えたら CSR 全体を組み直す。
+
+別のプロセス（API の他ワーカーや scripts/rebuild_relations.py など）の書き込みは通知が
+届かないので、参照のたびにエッジの世代カウンタ（storage.versions.EDGES）と構築時の値を
+比べ、通知されていない変更があれば CSR 全体を組み直す。
+"""
+import threading
+from functools import lru_cache
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from core.logging import get_logger
+from storage.sql.models import Document, Edge, StoreVersion
+from storage.versions import EDGES, store_version
+
+logger = get_logger(__name__)
+
+Neighbor = tuple[str, float, str]  # (doc_id, score, relation_type)
+
+# overlay がこの件数（またはノード数の 1/8）を超えたら CSR を作り直す
+_MIN_COMPACT_SIZE = 1024
+
+
+class GraphCache:
+    """
+    edges の無向隣接を保持する CSR キャッシュ。
+
+    ids[i] / titles[i] がノード i、indptr[i]:indptr[i + 1] がその隣接で、
+    indices（相手ノード）・scores・types（type_names の添字）はスコア降順に並ぶ。
+    同じ相手・同じ種別のエッジが両方向にある場合はスコアの大きい方だけを残す。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.ids: list[str] = []
+        self.titles: list[str] = []
+        self.index: dict[str, int] = {}
+        self.type_names: list[str] = []
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int32)
+        self.scores = np.empty(0, dtype=np.float32)
+        self.types = np.empty(0, dtype=np.int16)
+        self._overlay: dict[str, list[Neighbor]] = {}
+        self._overlay_titles: dict[str, str] = {}
+        self._dirty: set[str] = set()
+        self._built = False
+        self._stale = False
+        # 反映済みのエッジの世代カウンタ（store_versions）
+        self.version = 0
+
+    # ── 構築 ─────────────────────────────────────────────────────────────────
+
+    def build(self, session: Session) -> None:
+        """edges と documents を全件読み込んで CSR を作り直す"""
+        with self._lock:
+            self._build(session)
+
+    def _build(self, session: Session) -> None:
+        # 読み込み中に他から書き込まれても、次の参照で世代の差として気づけるよう先に読む
+        version = session.scalar(
+            select(StoreVersion.version).where(StoreVersion.name == EDGES)
+        ) or 0
+        ids, titles = [], []
+        for doc_id, title in session.execute(select(Document.id, Document.title)):
+            ids.append(doc_id)
+            titles.append(title)
+        index = {doc_id: i for i, doc_id in enumerate(ids)}
+
+        src, dst, score, rtype = [], [], [], []
+        type_index: dict[str, int] = {}
+        stmt = select(Edge.source_doc_id, Edge.target_doc_id, Edge.score, Edge.relation_type)
+        for s, t, sc, rt in session.execute(stmt):
+            if s not in index or t not in index:
+                continue
+            src.append(index[s])
+            dst.append(index[t])
+            score.append(sc)
+            rtype.append(type_index.setdefault(rt, len(type_index)))
+
+        # 無向化: 両方向を並べ、(行, 相手, 種別) ごとに最大スコアだけを残す
+        rows = np.asarray(src + dst, dtype=np.int64)
+        cols = np.asarray(dst + src, dtype=np.int32)
+        sims = np.asarray(score + score, dtype=np.float32)
+        kinds = np.asarray(rtype + rtype, dtype=np.int16)
+        order = np.lexsort((-sims, kinds, cols, rows))
+        rows, cols, sims, kinds = rows[order], cols[order], sims[order], kinds[order]
+        if len(rows):
+            first = np.ones(len(rows), dtype=bool)
+            first[1:] = (
+                (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1]) | (kinds[1:] != kinds[:-1])
+            )
+            rows, cols, sims, kinds = rows[first], cols[first], sims[first], kinds[first]
+        order = np.lexsort((-sims, rows))
+
+        self.ids = ids
+        self.titles = titles
+        self.index = index
+        self.type_names = list(type_index)
+        self.indices = cols[order]
+        self.scores = sims[order]
+        self.types = kinds[order]
+        self.indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(ids)), out=self.indptr[1:])
+        self._overlay.clear()
+        self._overlay_titles.clear()
+        self._dirty.clear()
+        self._built = True
+        self._stale = False
+        self.version = version
+        logger.info("グラフキャッシュ構築: %d nodes, %d adjacencies", len(ids), len(self.indices))
+
+    # ── 差分更新 ─────────────────────────────────────────────────────────────
+
+    def invalidate(self, doc_ids: set[str] | None = None, version: int | None = None) -> None:
+        """
+        エッジが変わったノードを通知する。None なら全体を作り直す。
+        version はそのコミットで進めたエッジの世代で、間に反映していない世代があれば
+        （他プロセスの書き込み）全体を作り直す。
+        """
+        with self._lock:
+            if version is not None:
+                if version > self.version + 1:
+                    self._stale = True
+                self.version = max(self.version, version)
+            if doc_ids is None:
+                self._stale = True
+            else:
+                self._dirty |= doc_ids
+
+    def _refresh(self, session: Session) -> None:
+        if self._stale or len(self._overlay) + len(self._dirty) > max(
+            _MIN_COMPACT_SIZE, len(self.ids) // 8
+        ):
+            self._build(session)
+            return
+        if not self._dirty:
+            return
+
+        dirty = self._dirty
+        adjacency: dict[str, dict[tuple[str, str], float]] = {d: {} for d in dirty}
+        stmt = select(
+            Edge.source_doc_id, Edge.target_doc_id, Edge.score, Edge.relation_type
+        ).where(or_(Edge.source_doc_id.in_(dirty), Edge.target_doc_id.in_(dirty)))
+        for s, t, score, rt in session.execute(stmt):
+            for a, b in ((s, t), (t, s)):
+                if a in adjacency and score > adjacency[a].get((b, rt), float("-inf")):
+                    adjacency[a][(b, rt)] = score
+
+        wanted = set(dirty) | {b for adj in adjacency.values() for b, _ in adj}
+        stmt = select(Document.id, Document.title).where(Document.id.in_(wanted))
+        titles = {doc_id: title for doc_id, title in session.execute(stmt)}
+        for doc_id, adj in adjacency.items():
+            self._overlay[doc_id] = sorted(
+                ((b, score, rt) for (b, rt), score in adj.items() if b in titles),
+                key=lambda n: n[1],
+                reverse=True,
+            )
+        self._overlay_titles.update(titles)
+        self._dirty = set()
+
+    # ── 参照 ─────────────────────────────────────────────────────────────────
+
+    def _ensure(self, session: Session) -> None:
+        if not self._built:
+            self._build(session)
+            return
+        if store_version(EDGES) != self.version:
+            # 他プロセスがエッジを書き換えた
+            self._stale = True
+        self._refresh(session)
+
+    def _row(
+        self,
+        doc_id: str,
+        limit: int | None = None,
+        min_score: float | None = None,
+    ) -> list[Neighbor]:
+        """doc_id の隣接をスコア降順で上位 limit 件・min_score 以上に絞って返す"""
+        if doc_id in self._overlay:
+            row = self._overlay[doc_id][:limit]
+        else:
+            i = self.index.get(doc_id)
+            if i is None:
+                return []
+            lo, hi = int(self.indptr[i]), int(self.indptr[i + 1])
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            ids, names = self.ids, self.type_names
+            row = [
+                (ids[j], s, names[t])
+                for j, s, t in zip(
+                    self.indices[lo:hi].tolist(),
+                    self.scores[lo:hi].tolist(),
+                    self.types[lo:hi].tolist(),
+                )
+            ]
+        if min_score is not None:
+            row = [n for n in row if n[1] >= min_score]
+        return row
+
+    def neighbors(self, session: Session, doc_id: str) -> list[Neighbor]:
+        """doc_id の隣接をスコア降順で返す（未構築なら構築する）"""
+        with self._lock:
+            self._ensure(session)
+            return list(self._row(doc_id))
+
+    def bfs(
+        self,
+        session: Session,
+        seeds: list[str],
+        depth: int,
+        max_degree: int | None = None,
+        min_score: float | None = None,
+        max_nodes: int = 500,
+    ) -> tuple[dict[str, int], list[tuple[str, str, float, str]], bool]:
+        """
+        seeds から depth ホップまでの幅優先探索。各ノードはスコア上位 max_degree 件・
+        min_score 以上の隣接だけをたどり、ノード数が max_nodes に達したら打ち切る。
+
+        Returns:
+            (ノード → ホップ数, 到達ノード間のエッジ (source, target, score, type), 打ち切ったか)
+        """
+        with self._lock:
+            self._ensure(session)
+            hops: dict[str, int] = {}
+            for seed in seeds[:max_nodes]:
+                hops.setdefault(seed, 0)
+            truncated = len(seeds) > max_nodes
+            frontier = list(hops)
+            for hop in range(1, depth + 1):
+                nxt = []
+                for u in frontier:
+                    for v, _, _ in self._row(u, max_degree, min_score):
+                        if v in hops:
+                            continue
+                        if len(hops) >= max_nodes:
+                            truncated = True
+                            break
+                        hops[v] = hop
+                        nxt.append(v)
+                frontier = nxt
+                if not frontier:
+                    break
+
+            # 無向エッジは (小さい id, 大きい id, 種別) で 1 本にまとめる
+            edges: dict[tuple[str, str, str], float] = {}
+            for u in hops:
+                for v, score, rt in self._row(u, max_degree, min_score):
+                    if v in hops:
+                        key = (u, v, rt) if u < v else (v, u, rt)
+                        edges[key] = max(score, edges.get(key, score))
+            return hops, [(a, b, score, rt) for (a, b, rt), score in edges.items()], truncated
+
+    def title(self, doc_id: str) -> str | None:
+        title = self._overlay_titles.get(doc_id)
+        if title is not None:
+            return title
+        i = self.index.get(doc_id)
+        return self.titles[i] if i is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "built": self._built,
+                "nodes": len(self.ids),
+                "adjacencies": len(self.indices),
+                "overlay": len(self._overlay),
+                "dirty": len(self._dirty),
+                "version": self.version,
+            }
+
+
+@lru_cache
+def get_graph_cache() -> GraphCache:
+    return GraphCache()
@@ -0,0 +1,198 @@
+"""chunks.text の全文検索インデックス（SQLite FTS5 + trigram トークナイザ）
+
+trigram は分かち書き不要で日本語の部分一致にも効くため、識別子・固有名詞・
+日本語キーワードの検索に使う。インデックスは chunks テーブルのトリガーで
+投入・削除と同時に更新される（external content 方式でテキストは二重保持しない）。
+PostgreSQL など FTS5 を持たない DB では無効になり、語彙検索は空を返す。
+"""
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# trigram はクエリ語が 3 文字未満だと MATCH できないため、その場合は LIKE で代替する
+_MIN_TRIGRAM_LEN = 3
+
+_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        text, content='chunks', content_rowid='rowid', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_au AFTER UPDATE OF text ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+        INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+    END
+    """,
+]
+
+_available = False
+
+
+def fulltext_available() -> bool:
+    """全文検索インデックスが利用可能か"""
+    return _available
+
+
+def ensure_fulltext_index(engine: Engine) -> None:
+    """FTS5 テーブルとトリガーを作成する。新規作成時は既存チャンクから構築する"""
+    global _available
+    if engine.dialect.name != "sqlite":
+        logger.info("全文検索インデックスは SQLite のみ対応です（%s）", engine.dialect.name)
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'")
+        ).first()
+        try:
+            for ddl in _DDL:
+                conn.execute(text(ddl))
+        except OperationalError as exc:  # FTS5 / trigram 非対応の SQLite
+            logger.warning("FTS5 インデックスを作成できません: %s", exc)
+            return
+        if not exists:
+            conn.execute(text("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')"))
+    _available = True
+
+
+def rebuild_fulltext_index(session: Session) -> None:
+    """
+    chunks から全文検索インデックスを作り直す（VACUUM 後などの rowid 変化に対応）。
+    scripts/rebuild_fulltext_index.py から使う。
+    """
+    if _available:
+        session.execute(text("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')"))
+
+
+def _match_expression(terms: list[str]) -> str:
+    """語のリストを FTS5 のフレーズ OR 式にする（記号は引用符でエスケープ）"""
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _like_pattern(term: str) -> str:
+    """語を含む LIKE パターン（%・_・\\ はエスケープし、ESCAPE '\\' と組み合わせる）"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _like_clauses(terms: list[str], params: dict) -> str:
+    """各語を含む条件の AND（パラメータは params に追加する）"""
+    clauses = []
+    for i, t in enumerate(terms):
+        clauses.append(f"c.text LIKE :t{i} ESCAPE '\\'")
+        params[f"t{i}"] = _like_pattern(t)
+    return " AND ".join(clauses)
+
+
+def _scope_clause(collection_id: str | None, tags: list[str] | None) -> tuple[str, dict]:
+    """コレクション・タグ（いずれかを含む）による絞り込み条件"""
+    clauses: list[str] = []
+    params: dict = {}
+    if collection_id:
+        clauses.append(
+            "EXISTS (SELECT 1 FROM collection_members m"
+            " WHERE m.document_id = d.id AND m.collection_id = :collection_id)"
+        )
+        params["collection_id"] = collection_id
+    if tags:
+        names = ", ".join(f":tag{i}" for i in range(len(tags)))
+        clauses.append(
+            f"EXISTS (SELECT 1 FROM json_each(d.tags) WHERE json_each.value IN ({names}))"
+        )
+        params.update({f"tag{i}": t for i, t in enumerate(tags)})
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+def search_chunks_fulltext(
+    session: Session,
+    query: str,
+    limit: int,
+    collection_id: str | None = None,
+    tags: list[str] | None = None,
+    per_doc: int | None = None,
+) -> list[dict]:
+    """
+    BM25 順にチャンクを返す。collection_id / tags を指定するとその範囲に絞る。
+    per_doc を指定すると 1 ドキュメントあたり上位 per_doc チャンクまでに制限する。
+
+    Returns:
+        [{"chunk_id": str, "vector_id": str | None, "chunk_text": str,
+          "doc_id": str, "doc_title": str, "doc_source": str | None, "score": float}, ...]
+        score は -bm25（大きいほど関連が強い）。
+    """
+    if not _available:
+        return []
+    terms = [t for t in query.split() if t]
+    long_terms = [t for t in terms if len(t) >= _MIN_TRIGRAM_LEN]
+    short_terms = [t for t in terms if len(t) < _MIN_TRIGRAM_LEN]
+    scope, params = _scope_clause(collection_id, tags)
+
+    if long_terms:
+        # 2文字以下の語は MATCH できないので、LIKE で必須条件として加える
+        required = f" AND {_like_clauses(short_terms, params)}" if short_terms else ""
+        matched = f"""
+            SELECT c.id AS chunk_id, c.vector_id, c.text, d.id AS doc_id, d.title, d.source,
+                   -bm25(chunks_fts) AS score
+            FROM chunks_fts
+            JOIN chunks c ON c.rowid = chunks_fts.rowid
+            JOIN documents d ON d.id = c.document_id
+            WHERE chunks_fts MATCH :q{required}{scope}
+        """
+        params["q"] = _match_expression(long_terms)
+    elif terms:
+        # 2文字以下の語のみ（例: 「顧客」）→ LIKE の AND 検索。スコアは一致語数
+        clauses = _like_clauses(terms, params)
+        matched = f"""
+            SELECT c.id AS chunk_id, c.vector_id, c.text, d.id AS doc_id, d.title, d.source,
+                   {len(terms)}.0 AS score
+            FROM chunks c
+            JOIN documents d ON d.id = c.document_id
+            WHERE {clauses}{scope}
+        """
+    else:
+        return []
+
+    if per_doc:
+        matched = f"""
+            SELECT * FROM (
+                SELECT m.*, ROW_NUMBER() OVER (PARTITION BY m.doc_id ORDER BY m.score DESC) AS rn
+                FROM ({matched}) m
+            ) WHERE rn <= :per_doc
+        """
+        params["per_doc"] = per_doc
+    stmt = text(
+        f"""
+        SELECT chunk_id, vector_id, text, doc_id, title, source, score
+        FROM ({matched})
+        ORDER BY score DESC
+        LIMIT :limit
+        """
+    )
+    rows = session.execute(stmt, {**params, "limit": limit})
+
+    return [
+        {
+            "chunk_id": chunk_id,
+            "vector_id": vector_id,
+            "chunk_text": chunk_text,
+            "doc_id": doc_id,
+            "doc_title": title,
+            "doc_source": source,
+            "score": float(score),
+        }
+        for chunk_id, vector_id, chunk_text, doc_id, title, source, score in rows
+    ]
@@ -1,7 +1,17 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, JSON, String, Text, UniqueConstraint
+from sqlalchemy import (
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    JSON,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -100,3 +110,62 @@ class Edge(Base):
     target_doc: Mapped["Document"] = relationship(
         foreign_keys=[target_doc_id], back_populates="incoming_edges"
     )
+
+
+class GraphMetric(Base):
+    """ドキュメントごとのグラフ指標（pipelines.relate.graph_analytics が更新）"""
+
+    __tablename__ = "graph_metrics"
+
+    document_id: Mapped[str] = mapped_column(ForeignKey("documents.id"), primary_key=True)
+    community: Mapped[int] = mapped_column(Integer, index=True)
+    pagerank: Mapped[float] = mapped_column(Float)
+    degree: Mapped[int] = mapped_column(Integer)
+    weighted_degree: Mapped[float] = mapped_column(Float)
+    degree_centrality: Mapped[float] = mapped_column(Float)
+    bridge_score: Mapped[float] = mapped_column(Float)
+    computed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class StoreVersion(Base):
+    """プロセス間で共有する世代カウンタ（storage.versions）"""
+
+    __tablename__ = "store_versions"
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ClusterModel(Base):
+    """逐次クラスタリングのモデル（scope = コレクション ID、全体は空文字）"""
+
+    __tablename__ = "cluster_models"
+
+    scope: Mapped[str] = mapped_column(String(36), primary_key=True)
+    n_clusters: Mapped[int] = mapped_column(Integer)
+    centroids: Mapped[bytes] = mapped_column(LargeBinary)  # float32 (n_clusters, dim)
+    counts: Mapped[bytes] = mapped_column(LargeBinary)  # float32 (n_clusters,) 累積割り当て件数
+    n_seen: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+
+class DocumentCluster(Base):
+    """ドキュメントのクラスタ割り当て（scope ごと）"""
+
+    __tablename__ = "document_clusters"
+
+    document_id: Mapped[str] = mapped_column(ForeignKey("documents.id"), primary_key=True)
+    scope: Mapped[str] = mapped_column(String(36), primary_key=True)
+    cluster: Mapped[int] = mapped_column(Integer, index=True)
+    score: Mapped[float] = mapped_column(Float)
+
+
+class RelationDirty(Base):
+    """近傍リストの修復待ちドキュメント（関連先が削除されたもの）"""
+
+    __tablename__ = "relation_dirty"
+
+    document_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    marked_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,13 +1,29 @@
 """SQLAlchemy リポジトリ – CRUD 操作をまとめる"""
-from collections.abc import Generator
+from collections.abc import Generator, Iterable
 from contextlib import contextmanager
 from typing import Any
 
-from sqlalchemy import create_engine, select, delete
+from sqlalchemy import create_engine, func, select, delete, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session, sessionmaker
 
 from core.config import get_settings
-from storage.sql.models import Base, Chunk, Collection, CollectionMember, Document, Edge
+from storage.graph_cache import get_graph_cache
+from storage.sql.fulltext import ensure_fulltext_index
+from storage.sql.models import (
+    Base,
+    Chunk,
+    ClusterModel,
+    Collection,
+    CollectionMember,
+    Document,
+    DocumentCluster,
+    Edge,
+    GraphMetric,
+    RelationDirty,
+    StoreVersion,
+)
+from storage.versions import CORPUS, EDGES, note_versions
 
 settings = get_settings()
 
@@ -21,6 +37,12 @@ _SessionLocal = sessionmaker(bind=_engine, expire_on_commit=False)
 def init_db() -> None:
     """テーブルを作成する（初回起動 or rebuild_index 用）"""
     Base.metadata.create_all(_engine)
+    ensure_fulltext_index(_engine)
+    # 同時に初回の bump_version が走っても INSERT が衝突しないよう、カウンタ行を先に作る
+    with get_session() as session:
+        for name in (CORPUS, EDGES):
+            if session.get(StoreVersion, name) is None:
+                session.add(StoreVersion(name=name, version=0))
 
 
 @contextmanager
@@ -28,7 +50,16 @@ def get_session() -> Generator[Session, None, None]:
     session = _SessionLocal()
     try:
         yield session
+        if session.info.pop("corpus_changed", False):
+            bump_version(session, CORPUS)
+        edges_changed = "edges_changed" in session.info
+        if edges_changed:
+            bump_version(session, EDGES)
         session.commit()
+        versions = session.info.pop("versions", {})
+        note_versions(versions)
+        if edges_changed:
+            get_graph_cache().invalidate(session.info.pop("edges_changed"), versions[EDGES])
     except Exception:
         session.rollback()
         raise
@@ -42,6 +73,21 @@ def db_session() -> Generator[Session, None, None]:
         yield session
 
 
+def mark_corpus_changed(session: Session) -> None:
+    """コミット時にコーパス世代を進める（検索キャッシュ等の無効化）"""
+    session.info["corpus_changed"] = True
+
+
+def mark_edges_changed(session: Session, doc_ids: Iterable[str] | None = None) -> None:
+    """コミット後にグラフキャッシュへエッジが変わったノードを通知する（None は全体）"""
+    if doc_ids is None:
+        session.info["edges_changed"] = None
+        return
+    changed = session.info.setdefault("edges_changed", set())
+    if changed is not None:
+        changed.update(doc_ids)
+
+
 # ── Document ─────────────────────────────────────────────────────────────────
 
 def upsert_document(session: Session, **kwargs: Any) -> Document:
@@ -53,6 +99,7 @@ def upsert_document(session: Session, **kwargs: Any) -> Document:
     doc = Document(**kwargs)
     session.add(doc)
     session.flush()
+    mark_corpus_changed(session)
     return doc
 
 
@@ -60,15 +107,36 @@ def get_document(session: Session, doc_id: str) -> Document | None:
     return session.get(Document, doc_id)
 
 
+def get_documents(session: Session, doc_ids: list[str]) -> dict[str, Document]:
+    """複数ドキュメントを 1 クエリで取得し、id → Document の辞書で返す"""
+    if not doc_ids:
+        return {}
+    stmt = select(Document).where(Document.id.in_(set(doc_ids)))
+    return {doc.id: doc for doc in session.scalars(stmt)}
+
+
 def list_documents(session: Session, limit: int = 100, offset: int = 0) -> list[Document]:
     return list(session.scalars(select(Document).offset(offset).limit(limit)))
 
 
+def list_document_ids(session: Session) -> set[str]:
+    return set(session.scalars(select(Document.id)))
+
+
+def count_documents(session: Session) -> int:
+    return session.scalar(select(func.count()).select_from(Document))
+
+
 def delete_document(session: Session, doc_id: str) -> bool:
     doc = session.get(Document, doc_id)
     if doc is None:
         return False
+    session.execute(delete(CollectionMember).where(CollectionMember.document_id == doc_id))
+    session.execute(delete(GraphMetric).where(GraphMetric.document_id == doc_id))
+    session.execute(delete(DocumentCluster).where(DocumentCluster.document_id == doc_id))
+    delete_edges_for_doc(session, doc_id)
     session.delete(doc)
+    mark_corpus_changed(session)
     return True
 
 
@@ -78,6 +146,7 @@ def bulk_insert_chunks(session: Session, chunks: list[dict]) -> list[Chunk]:
     objs = [Chunk(**c) for c in chunks]
     session.add_all(objs)
     session.flush()
+    mark_corpus_changed(session)
     return objs
 
 
@@ -106,6 +175,11 @@ def get_collection_by_name(session: Session, name: str) -> Collection | None:
     return session.scalars(select(Collection).where(Collection.name == name)).first()
 
 
+def resolve_collection(session: Session, name_or_id: str) -> Collection | None:
+    """コレクションを id または名前で取得する"""
+    return get_collection(session, name_or_id) or get_collection_by_name(session, name_or_id)
+
+
 def list_collections(session: Session) -> list[Collection]:
     return list(session.scalars(select(Collection)))
 
@@ -114,9 +188,22 @@ def add_to_collection(session: Session, collection_id: str, document_id: str) ->
     member = CollectionMember(collection_id=collection_id, document_id=document_id)
     session.add(member)
     session.flush()
+    mark_corpus_changed(session)
     return member
 
 
+def list_collection_doc_ids(session: Session, collection_id: str) -> list[str]:
+    stmt = select(CollectionMember.document_id).where(
+        CollectionMember.collection_id == collection_id
+    )
+    return list(session.scalars(stmt))
+
+
+def get_collection_ids_for_doc(session: Session, document_id: str) -> list[str]:
+    stmt = select(CollectionMember.collection_id).where(CollectionMember.document_id == document_id)
+    return list(session.scalars(stmt))
+
+
 # ── Edge ──────────────────────────────────────────────────────────────────────
 
 def upsert_edge(
@@ -134,6 +221,7 @@ def upsert_edge(
     existing = session.scalars(stmt).first()
     if existing:
         existing.score = score
+        mark_edges_changed(session, (source_doc_id, target_doc_id))
         return existing
     edge = Edge(
         source_doc_id=source_doc_id,
@@ -143,11 +231,357 @@ def upsert_edge(
     )
     session.add(edge)
     session.flush()
+    mark_edges_changed(session, (source_doc_id, target_doc_id))
     return edge
 
 
+def filter_in_scope(
+    session: Session,
+    doc_ids: list[str],
+    collection_id: str | None = None,
+    tags: list[str] | None = None,
+) -> set[str]:
+    """doc_ids のうちコレクション・タグ（いずれかを含む）の条件を満たすものを 1 クエリで返す"""
+    if not doc_ids:
+        return set()
+    stmt = select(Document.id, Document.tags).where(Document.id.in_(set(doc_ids)))
+    if collection_id:
+        stmt = stmt.where(
+            select(CollectionMember.id)
+            .where(
+                CollectionMember.document_id == Document.id,
+                CollectionMember.collection_id == collection_id,
+            )
+            .exists()
+        )
+    wanted = set(tags or [])
+    return {
+        doc_id
+        for doc_id, doc_tags in session.execute(stmt)
+        if not wanted or wanted & set(doc_tags or [])
+    }
+
+
 def get_edges_for_doc(session: Session, doc_id: str) -> list[Edge]:
     stmt = select(Edge).where(
         (Edge.source_doc_id == doc_id) | (Edge.target_doc_id == doc_id)
     )
     return list(session.scalars(stmt))
+
+
+def replace_edges(
+    session: Session,
+    edges: list[tuple[str, str, float]],
+    relation_type: str = "similar",
+    batch_size: int = 5000,
+) -> int:
+    """
+    relation_type のエッジを全削除し、(source, target, score) を一括 INSERT する。
+    ORM オブジェクトは作らず、バッチごとの executemany で書き込む。
+    """
+    session.execute(delete(Edge).where(Edge.relation_type == relation_type))
+    for start in range(0, len(edges), batch_size):
+        session.execute(insert(Edge), _edge_rows(edges[start : start + batch_size], relation_type))
+    mark_edges_changed(session, None)
+    return len(edges)
+
+
+def _edge_rows(edges: list[tuple[str, str, float]], relation_type: str) -> list[dict]:
+    return [
+        {
+            "source_doc_id": src,
+            "target_doc_id": dst,
+            "score": score,
+            "relation_type": relation_type,
+        }
+        for src, dst, score in edges
+    ]
+
+
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def upsert_edges(
+    session: Session,
+    edges: list[tuple[str, str, float]],
+    relation_type: str = "similar",
+    batch_size: int = 5000,
+) -> int:
+    """
+    (source, target, score) をまとめて upsert する。
+    SQLite / PostgreSQL では INSERT ... ON CONFLICT (source, target, relation_type)
+    DO UPDATE SET score をバッチごとに実行し、SELECT も ORM オブジェクトも使わない。
+    それ以外の DB では upsert_edge の逐次処理にフォールバックする。
+    """
+    # 同じ文の中で同じキーが 2 回出ると ON CONFLICT が失敗するため、後勝ちで重複を除く
+    unique = list({(src, dst): score for src, dst, score in edges}.items())
+    edges = [(src, dst, score) for (src, dst), score in unique]
+
+    make_insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    if make_insert is None:
+        for src, dst, score in edges:
+            upsert_edge(session, src, dst, score, relation_type)
+        return len(edges)
+
+    stmt = make_insert(Edge.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Edge.source_doc_id, Edge.target_doc_id, Edge.relation_type],
+        set_={"score": stmt.excluded.score},
+    )
+    for start in range(0, len(edges), batch_size):
+        session.execute(stmt, _edge_rows(edges[start : start + batch_size], relation_type))
+    mark_edges_changed(session, {doc for src, dst, _ in edges for doc in (src, dst)})
+    return len(edges)
+
+
+def get_edge_list_stats(
+    session: Session,
+    source_doc_ids: list[str],
+    relation_type: str = "similar",
+) -> dict[str, tuple[int, float]]:
+    """各ドキュメントの出エッジ数と最小スコアを 1 クエリで返す: {doc_id: (count, min_score)}"""
+    if not source_doc_ids:
+        return {}
+    stmt = (
+        select(Edge.source_doc_id, func.count(), func.min(Edge.score))
+        .where(Edge.source_doc_id.in_(set(source_doc_ids)), Edge.relation_type == relation_type)
+        .group_by(Edge.source_doc_id)
+    )
+    return {src: (count, min_score) for src, count, min_score in session.execute(stmt)}
+
+
+def trim_edges(
+    session: Session,
+    source_doc_id: str,
+    keep: int,
+    relation_type: str = "similar",
+) -> int:
+    """出エッジをスコア上位 keep 件に切り詰め、削除件数を返す"""
+    overflow = (
+        select(Edge.id, Edge.target_doc_id)
+        .where(Edge.source_doc_id == source_doc_id, Edge.relation_type == relation_type)
+        .order_by(Edge.score.desc())
+        .offset(keep)
+    )
+    rows = session.execute(overflow).all()
+    if rows:
+        session.execute(delete(Edge).where(Edge.id.in_([edge_id for edge_id, _ in rows])))
+        mark_edges_changed(session, [source_doc_id, *(target for _, target in rows)])
+    return len(rows)
+
+
+def delete_edges_for_doc(session: Session, doc_id: str) -> list[str]:
+    """doc_id に接続する全エッジを削除し、doc_id を関連先に持っていたドキュメント id を返す"""
+    connected = (Edge.source_doc_id == doc_id) | (Edge.target_doc_id == doc_id)
+    rows = session.execute(select(Edge.source_doc_id, Edge.target_doc_id).where(connected)).all()
+    session.execute(delete(Edge).where(connected))
+    mark_edges_changed(session, {doc_id, *(doc for row in rows for doc in row)})
+    referrers = {src for src, dst in rows if dst == doc_id}
+    referrers.discard(doc_id)
+    return sorted(referrers)
+
+
+def delete_outgoing_edges(
+    session: Session,
+    source_doc_id: str,
+    relation_type: str = "similar",
+) -> None:
+    outgoing = (Edge.source_doc_id == source_doc_id) & (Edge.relation_type == relation_type)
+    targets = list(session.scalars(select(Edge.target_doc_id).where(outgoing)))
+    session.execute(delete(Edge).where(outgoing))
+    mark_edges_changed(session, [source_doc_id, *targets])
+
+
+# ── StoreVersion ──────────────────────────────────────────────────────────────
+
+def load_versions() -> dict[str, int]:
+    """全カウンタを読む（storage.versions の読み直し用。セッションの外から呼ぶ）"""
+    with _engine.connect() as conn:
+        return dict(conn.execute(select(StoreVersion.name, StoreVersion.version)).all())
+
+
+def get_version(session: Session, name: str) -> int:
+    return session.scalar(select(StoreVersion.version).where(StoreVersion.name == name)) or 0
+
+
+def bump_version(session: Session, name: str) -> int:
+    """name のカウンタを 1 進めて新しい値を返す（書き込みと同じトランザクションで呼ぶ）"""
+    result = session.execute(
+        update(StoreVersion)
+        .where(StoreVersion.name == name)
+        .values(version=StoreVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        session.add(StoreVersion(name=name, version=1))
+        session.flush()
+    version = get_version(session, name)
+    session.info.setdefault("versions", {})[name] = version
+    return version
+
+
+def set_version(session: Session, name: str, version: int) -> None:
+    """name のカウンタを version にする（コミット後にこのプロセスへも反映）"""
+    session.merge(StoreVersion(name=name, version=version))
+    session.info.setdefault("versions", {})[name] = version
+
+
+# ── GraphMetric ───────────────────────────────────────────────────────────────
+
+def replace_graph_metrics(
+    session: Session,
+    rows: list[dict],
+    batch_size: int = 5000,
+) -> int:
+    """graph_metrics を全件置き換える（ORM オブジェクトを作らずバッチ INSERT）"""
+    session.execute(delete(GraphMetric))
+    for start in range(0, len(rows), batch_size):
+        session.execute(insert(GraphMetric), rows[start : start + batch_size])
+    return len(rows)
+
+
+def get_graph_metrics(session: Session, doc_ids: list[str]) -> dict[str, GraphMetric]:
+    if not doc_ids:
+        return {}
+    stmt = select(GraphMetric).where(GraphMetric.document_id.in_(set(doc_ids)))
+    return {m.document_id: m for m in session.scalars(stmt)}
+
+
+def list_graph_metrics(
+    session: Session,
+    order_by: str = "pagerank",
+    limit: int = 100,
+    offset: int = 0,
+    community: int | None = None,
+    collection_id: str | None = None,
+) -> list[tuple[GraphMetric, str]]:
+    """指標の降順に (GraphMetric, タイトル) を返す"""
+    stmt = (
+        select(GraphMetric, Document.title)
+        .join(Document, Document.id == GraphMetric.document_id)
+        .order_by(getattr(GraphMetric, order_by).desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    if community is not None:
+        stmt = stmt.where(GraphMetric.community == community)
+    if collection_id:
+        stmt = stmt.join(
+            CollectionMember, CollectionMember.document_id == GraphMetric.document_id
+        ).where(CollectionMember.collection_id == collection_id)
+    return [(metric, title) for metric, title in session.execute(stmt)]
+
+
+def graph_metrics_computed_at(session: Session):
+    return session.scalar(select(func.max(GraphMetric.computed_at)))
+
+
+# ── ClusterModel ──────────────────────────────────────────────────────────────
+
+def get_cluster_model(session: Session, scope: str) -> ClusterModel | None:
+    return session.get(ClusterModel, scope)
+
+
+def list_cluster_models(session: Session) -> list[ClusterModel]:
+    return list(session.scalars(select(ClusterModel)))
+
+
+def save_cluster_model(session: Session, scope: str, **fields: Any) -> ClusterModel:
+    record = session.get(ClusterModel, scope)
+    if record is None:
+        record = ClusterModel(scope=scope, **fields)
+        session.add(record)
+    else:
+        for key, value in fields.items():
+            setattr(record, key, value)
+    session.flush()
+    return record
+
+
+def replace_cluster_assignments(
+    session: Session,
+    scope: str,
+    rows: list[dict],
+    batch_size: int = 5000,
+) -> int:
+    """scope の割り当てを全件置き換える。rows: [{"document_id", "cluster", "score"}]"""
+    session.execute(delete(DocumentCluster).where(DocumentCluster.scope == scope))
+    for start in range(0, len(rows), batch_size):
+        batch = [{**row, "scope": scope} for row in rows[start : start + batch_size]]
+        session.execute(insert(DocumentCluster), batch)
+    return len(rows)
+
+
+def set_cluster_assignment(
+    session: Session,
+    document_id: str,
+    scope: str,
+    cluster: int,
+    score: float,
+) -> None:
+    session.merge(
+        DocumentCluster(document_id=document_id, scope=scope, cluster=cluster, score=score)
+    )
+
+
+def list_cluster_assignments(
+    session: Session,
+    scope: str,
+    limit: int = 1000,
+    offset: int = 0,
+    cluster: int | None = None,
+) -> list[tuple[DocumentCluster, str]]:
+    """(DocumentCluster, タイトル) をクラスタ番号・スコア降順で返す"""
+    stmt = (
+        select(DocumentCluster, Document.title)
+        .join(Document, Document.id == DocumentCluster.document_id)
+        .where(DocumentCluster.scope == scope)
+        .order_by(DocumentCluster.cluster, DocumentCluster.score.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    if cluster is not None:
+        stmt = stmt.where(DocumentCluster.cluster == cluster)
+    return [(row, title) for row, title in session.execute(stmt)]
+
+
+def count_cluster_sizes(session: Session, scope: str) -> dict[int, int]:
+    stmt = (
+        select(DocumentCluster.cluster, func.count())
+        .where(DocumentCluster.scope == scope)
+        .group_by(DocumentCluster.cluster)
+    )
+    return {cluster: count for cluster, count in session.execute(stmt)}
+
+
+# ── RelationDirty ─────────────────────────────────────────────────────────────
+
+def mark_relations_dirty(session: Session, doc_ids: list[str]) -> None:
+    existing = set(
+        session.scalars(
+            select(RelationDirty.document_id).where(RelationDirty.document_id.in_(doc_ids))
+        )
+    )
+    session.add_all(RelationDirty(document_id=d) for d in doc_ids if d not in existing)
+    session.flush()
+
+
+def list_dirty_documents(
+    session: Session,
+    limit: int | None = None,
+    doc_ids: list[str] | None = None,
+) -> list[str]:
+    """修復待ちドキュメントを古い順に返す（doc_ids を指定するとその中だけ）"""
+    stmt = select(RelationDirty.document_id).order_by(RelationDirty.marked_at)
+    if doc_ids is not None:
+        stmt = stmt.where(RelationDirty.document_id.in_(doc_ids))
+    if limit:
+        stmt = stmt.limit(limit)
+    return list(session.scalars(stmt))
+
+
+def clear_dirty_documents(session: Session, doc_ids: list[str] | None = None) -> None:
+    """指定ドキュメント（None なら全件）を修復待ちから外す"""
+    stmt = delete(RelationDirty)
+    if doc_ids is not None:
+        stmt = stmt.where(RelationDirty.document_id.in_(doc_ids))
+    session.execute(stmt)
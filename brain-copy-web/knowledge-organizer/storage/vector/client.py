@@ -2,12 +2,15 @@
 from functools import lru_cache
 
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import Distance, PayloadSchemaType, VectorParams
 
 from core.config import get_settings
 
 settings = get_settings()
 
+# フィルタ検索に使う payload フィールド（キーワードインデックスを張る）
+PAYLOAD_KEYWORD_FIELDS = ("doc_id", "collection_ids", "tags")
+
 
 @lru_cache
 def get_qdrant() -> QdrantClient:
@@ -17,7 +20,7 @@ def get_qdrant() -> QdrantClient:
 
 
 def ensure_collection_exists() -> None:
-    """コレクションが存在しない場合のみ作成"""
+    """コレクションが存在しない場合のみ作成し、不足している payload インデックスを張る"""
     client = get_qdrant()
     existing = [c.name for c in client.get_collections().collections]
     if settings.qdrant_collection not in existing:
@@ -28,3 +31,12 @@ def ensure_collection_exists() -> None:
                 distance=Distance.COSINE,
             ),
         )
+
+    indexed = client.get_collection(settings.qdrant_collection).payload_schema or {}
+    for field in PAYLOAD_KEYWORD_FIELDS:
+        if field not in indexed:
+            client.create_payload_index(
+                collection_name=settings.qdrant_collection,
+                field_name=field,
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
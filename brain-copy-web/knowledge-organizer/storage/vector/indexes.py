@@ -1,8 +1,21 @@
 """Qdrant への upsert / 検索ラッパー"""
 import uuid
+from collections.abc import Iterator
 from typing import Any
 
-from qdrant_client.http.models import PointStruct, ScoredPoint, Filter
+import numpy as np
+
+from qdrant_client.http.models import (
+    FieldCondition,
+    Filter,
+    MatchAny,
+    MatchValue,
+    PointGroup,
+    PointStruct,
+    Record,
+    ScoredPoint,
+    SearchRequest,
+)
 
 from core.config import get_settings
 from storage.vector.client import get_qdrant
@@ -28,6 +41,29 @@ def upsert_vectors(
     return ids
 
 
+def build_scope_filter(
+    collection_id: str | None = None,
+    tags: list[str] | None = None,
+) -> Filter | None:
+    """コレクション・タグ（いずれかを含む）で絞り込む Filter を作る。条件なしなら None"""
+    must = []
+    if collection_id:
+        must.append(FieldCondition(key="collection_ids", match=MatchValue(value=collection_id)))
+    if tags:
+        must.append(FieldCondition(key="tags", match=MatchAny(any=list(tags))))
+    return Filter(must=must) if must else None
+
+
+def set_doc_payload(doc_id: str, payload: dict[str, Any]) -> None:
+    """ドキュメントに属する全 point の payload を部分更新する"""
+    client = get_qdrant()
+    client.set_payload(
+        collection_name=settings.qdrant_collection,
+        payload=payload,
+        points=Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))]),
+    )
+
+
 def search_vectors(
     query_vector: list[float],
     top_k: int | None = None,
@@ -48,6 +84,154 @@ def search_vectors(
     return results
 
 
+def search_vector_groups(
+    query_vector: list[float],
+    limit: int,
+    group_size: int = 1,
+    score_threshold: float | None = None,
+    filter_: Filter | None = None,
+    exclude_doc_ids: list[str] | None = None,
+    group_by: str = "doc_id",
+) -> list[PointGroup]:
+    """
+    近傍チャンクを group_by（既定: doc_id）でまとめ、上位 limit グループを返す。
+    各グループは最大 group_size 件のヒットをスコア降順で持つ。
+    グループ化と除外は Qdrant 側で行うため、上位ドキュメント数が長文書に食われない。
+    """
+    client = get_qdrant()
+    if exclude_doc_ids:
+        must_not = [FieldCondition(key="doc_id", match=MatchAny(any=list(exclude_doc_ids)))]
+        filter_ = Filter(
+            must=filter_.must if filter_ else None,
+            should=filter_.should if filter_ else None,
+            must_not=[*(filter_.must_not or []), *must_not] if filter_ else must_not,
+        )
+    result = client.search_groups(
+        collection_name=settings.qdrant_collection,
+        query_vector=query_vector,
+        group_by=group_by,
+        limit=limit,
+        group_size=group_size,
+        score_threshold=score_threshold or settings.similarity_threshold,
+        query_filter=filter_,
+        with_payload=True,
+    )
+    return result.groups
+
+
+def search_vectors_batch(
+    query_vectors: list[list[float]],
+    top_ks: list[int],
+    score_thresholds: list[float | None],
+    filters: list[Filter | None],
+) -> list[list[ScoredPoint]]:
+    """複数クエリを Qdrant のバッチ検索 API で 1 往復にまとめて実行する"""
+    client = get_qdrant()
+    requests = [
+        SearchRequest(
+            vector=vec,
+            limit=k or settings.top_k,
+            score_threshold=threshold or settings.similarity_threshold,
+            filter=filter_,
+            with_payload=True,
+        )
+        for vec, k, threshold, filter_ in zip(query_vectors, top_ks, score_thresholds, filters)
+    ]
+    return client.search_batch(collection_name=settings.qdrant_collection, requests=requests)
+
+
+def scroll_vectors(
+    batch_size: int = 1024,
+    filter_: Filter | None = None,
+    with_payload: list[str] | None = None,
+) -> Iterator[list[Record]]:
+    """保存済み point を（ベクター・doc_id 付きで）batch_size 件ずつ順に返す"""
+    client = get_qdrant()
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=settings.qdrant_collection,
+            scroll_filter=filter_,
+            limit=batch_size,
+            offset=offset,
+            with_payload=with_payload or ["doc_id"],
+            with_vectors=True,
+        )
+        if records:
+            yield records
+        if offset is None:
+            break
+
+
+def fetch_doc_vectors(filter_: Filter | None = None) -> tuple[list[str], np.ndarray]:
+    """
+    保存済みチャンクベクターを一括で読み出し、ドキュメントごとの平均ベクターにする。
+    埋め込み API は呼ばない。
+
+    Returns:
+        (doc_ids, vectors): vectors は (len(doc_ids), dim) の float32（L2 未正規化）
+    """
+    sums: dict[str, np.ndarray] = {}
+    counts: dict[str, int] = {}
+    for records in scroll_vectors(filter_=filter_):
+        block = np.asarray([r.vector for r in records], dtype=np.float32)
+        for record, vec in zip(records, block):
+            doc_id = (record.payload or {}).get("doc_id")
+            if not doc_id:
+                continue
+            if doc_id in sums:
+                sums[doc_id] += vec
+                counts[doc_id] += 1
+            else:
+                sums[doc_id] = vec.copy()
+                counts[doc_id] = 1
+
+    doc_ids = list(sums)
+    if not doc_ids:
+        return [], np.empty((0, settings.vector_dim), dtype=np.float32)
+    vectors = np.stack([sums[d] / counts[d] for d in doc_ids]).astype(np.float32, copy=False)
+    return doc_ids, vectors
+
+
+def fetch_chunk_vectors(
+    filter_: Filter | None = None,
+) -> tuple[list[str], list[str], list[str], np.ndarray]:
+    """
+    保存済みチャンクベクターを一括で読み出す。埋め込み API は呼ばない。
+
+    Returns:
+        (point_ids, doc_ids, texts, vectors): vectors は (n, dim) の float32
+    """
+    point_ids: list[str] = []
+    doc_ids: list[str] = []
+    texts: list[str] = []
+    blocks: list[np.ndarray] = []
+    for records in scroll_vectors(filter_=filter_, with_payload=["doc_id", "text"]):
+        blocks.append(np.asarray([r.vector for r in records], dtype=np.float32))
+        for record in records:
+            payload = record.payload or {}
+            point_ids.append(str(record.id))
+            doc_ids.append(payload.get("doc_id", ""))
+            texts.append(payload.get("text", ""))
+    if not blocks:
+        return [], [], [], np.empty((0, settings.vector_dim), dtype=np.float32)
+    return point_ids, doc_ids, texts, np.concatenate(blocks)
+
+
+def doc_filter(doc_ids: list[str]) -> Filter:
+    """指定ドキュメントの point だけを対象にする Filter"""
+    return Filter(must=[FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids)))])
+
+
+def delete_doc_vectors(doc_id: str) -> None:
+    """ドキュメントに属する全 point を削除する"""
+    client = get_qdrant()
+    client.delete(
+        collection_name=settings.qdrant_collection,
+        points_selector=doc_filter([doc_id]),
+    )
+
+
 def delete_vectors(ids: list[str]) -> None:
     client = get_qdrant()
     client.delete(
@@ -0,0 +1,49 @@
+"""プロセス間で共有する世代カウンタ（SQL の store_versions テーブル）
+
+カウンタは書き込みと同じトランザクションで repo.bump_version が進める。
+各プロセスは store_version_poll_interval 秒ごとに読み直し、自プロセスのコミットで
+進めた値は get_session がすぐに反映する（note_versions）。別のワーカーやスクリプトの
+変更も、遅くとも poll 間隔のうちに見える。
+
+CORPUS: 投入・削除のたびに進む（検索キャッシュ等の無効化。storage.corpus）
+EDGES: エッジが変わるたびに進む（グラフキャッシュの作り直し判定）
+GRAPH_METRICS: 保存済みの graph_metrics を計算したときの EDGES の値（指標が古いかの判定）
+"""
+import threading
+import time
+
+from core.config import get_settings
+
+settings = get_settings()
+
+CORPUS = "corpus"
+EDGES = "edges"
+GRAPH_METRICS = "graph_metrics"
+
+_lock = threading.Lock()
+_versions: dict[str, int] = {}
+_loaded_at = float("-inf")
+
+
+def store_version(name: str, default: int = 0) -> int:
+    """name のカウンタの現在値（未作成なら default）"""
+    global _loaded_at
+    with _lock:
+        now = time.monotonic()
+        if now - _loaded_at >= settings.store_version_poll_interval:
+            # repo がこのモジュールを import するため遅延 import
+            from storage.sql.repo import load_versions
+
+            _versions.clear()
+            _versions.update(load_versions())
+            _loaded_at = now
+        return _versions.get(name, default)
+
+
+def note_versions(versions: dict[str, int]) -> None:
+    """このプロセスがコミットした値を、次の読み直しを待たずに反映する"""
+    if not versions:
+        return
+    with _lock:
+        for name, version in versions.items():
+            _versions[name] = max(_versions.get(name, 0), version)
@@ -7,18 +7,28 @@
   - 1行 = 1ドキュメント（空行は無視）
 
 処理:
-  - Mistral の埋め込みAPIでテキストをベクトル化
+  - Mistral の埋め込みAPIでテキストをベクトル化（--cache-dir に行ハッシュごとに追記保存し、
+    中断後の再実行や --clusters / --projection の変更時は埋め込み済みのテキストを再送しない）
   - KMeans でクラスタリング
   - 2次元座標: PCA または UMAP（--projection で指定。UMAP は似た意味を近く・違う意味を遠くに配置）
+  - 学習済みの KMeans・投影モデルと座標は --cache-dir に保存し、テキストの増減が少なければ
+    新しい点だけを配置する（--refit でフル計算）
 
 出力:
-  - x,y,text,cluster のCSV
-    → 生成されたCSVを index.html の「ファイルを選択」からアップロードするとマップに表示できる
+  - x,y,text,cluster のCSV（--format binary で座標・クラスタ・接続・テキストを型付き配列で持つ
+    バイナリ形式。出力名が .gz で終われば gzip 圧縮）
+    → 生成されたファイルを index.html の「ファイルを選択」からアップロードするとマップに表示できる
 """
 
 import argparse
 import csv
+import gzip
+import hashlib
+import heapq
+import json
 import os
+import pickle
+import struct
 from typing import List
 
 # .env から MISTRAL_API_KEY を読む（スクリプト同階層 or knowledge-organizer/.env）
@@ -32,6 +42,7 @@ except ImportError:
     pass
 
 import numpy as np
+import scipy.sparse as sp
 from mistralai import Mistral
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
@@ -40,6 +51,11 @@ try:
     HAS_UMAP = True
 except ImportError:
     HAS_UMAP = False
+try:
+    from pynndescent import NNDescent  # umap-learn の依存
+    HAS_NNDESCENT = True
+except ImportError:
+    HAS_NNDESCENT = False
 
 
 def load_texts(path: str) -> List[str]:
@@ -78,12 +94,257 @@ def embed_texts(client: Mistral, texts: List[str], model: str = "mistral-embed")
     return np.asarray(all_vectors, dtype="float32")
 
 
-def cluster_and_project(
+def line_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    行ハッシュ（SHA-256）→ 埋め込みの追記型ストア（cache_dir/embeddings_<model>.*）。
+
+    .f32 に float32 の行を、.keys に同じ順で行ハッシュを 1 行ずつ追記する。
+    バッチごとに flush + fsync するので、途中で止まっても完了したバッチは残る。
+    読み込み時は .f32 と .keys の短い方に合わせ、書きかけの末尾を切り捨てる。
+    """
+
+    def __init__(self, cache_dir: str, model: str = "mistral-embed") -> None:
+        os.makedirs(cache_dir, exist_ok=True)
+        prefix = os.path.join(cache_dir, f"embeddings_{model}")
+        self.vec_path = prefix + ".f32"
+        self.key_path = prefix + ".keys"
+        self.meta_path = prefix + ".json"
+        self.dim: int | None = None
+        self.keys: List[str] = []
+        self._load()
+
+    def _load(self) -> None:
+        if not all(os.path.exists(p) for p in (self.meta_path, self.vec_path, self.key_path)):
+            self.reset()
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        with open(self.key_path, "r", encoding="utf-8") as f:
+            keys = [line.strip() for line in f if len(line.strip()) == 64]
+        size = os.path.getsize(self.vec_path)
+        n = min(size // (self.dim * 4), len(keys))
+        if size != n * self.dim * 4 or n != len(keys):
+            print(f"Warning: 埋め込みストアの書きかけの末尾を切り捨てます（{n} 件を使用）。")
+            with open(self.vec_path, "r+b") as f:
+                f.truncate(n * self.dim * 4)
+            with open(self.key_path, "w", encoding="utf-8") as f:
+                f.writelines(k + "\n" for k in keys[:n])
+        self.keys = keys[:n]
+        self.index = {k: i for i, k in enumerate(self.keys)}
+
+    def reset(self) -> None:
+        """ストアを空にする"""
+        for path in (self.vec_path, self.key_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dim = None
+        self.keys = []
+        self.index: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, keys: List[str], vectors: np.ndarray) -> None:
+        """1 バッチ分を追記する（ベクター → ハッシュの順に書き、どちらも fsync する）"""
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+        with open(self.vec_path, "ab") as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.key_path, "a", encoding="utf-8") as f:
+            f.writelines(k + "\n" for k in keys)
+            f.flush()
+            os.fsync(f.fileno())
+        for k in keys:
+            self.index[k] = len(self.keys)
+            self.keys.append(k)
+
+    def matrix(self) -> np.ndarray:
+        """保存済みの全ベクター (n, dim) を読み取り専用のメモリマップで返す"""
+        if not self.keys:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.vec_path, dtype="<f4", mode="r", shape=(len(self.keys), self.dim))
+
+
+def embed_texts_checkpointed(
+    texts: List[str],
+    cache_dir: str,
+    resume: bool = True,
+    model: str = "mistral-embed",
+) -> np.ndarray:
+    """
+    埋め込みストアにないテキストだけを EMBED_BATCH_SIZE 件ずつ埋め込み、バッチごとに追記する。
+    resume=False ならストアを空にしてから始める。
+
+    Returns:
+        texts と同じ順の (n, dim)。ストアの並びと一致すればメモリマップのまま返す
+    """
+    store = EmbeddingStore(cache_dir, model=model)
+    if not resume:
+        store.reset()
+    keys = [line_hash(t) for t in texts]
+    missing = {k: t for k, t in zip(keys, texts) if k not in store.index}
+    if missing:
+        print(
+            f"Embedding {len(missing)} texts "
+            f"({len(set(keys)) - len(missing)} already in {store.vec_path})..."
+        )
+        client = get_mistral_client()
+        pending = list(missing.items())
+        for start in range(0, len(pending), EMBED_BATCH_SIZE):
+            batch = pending[start : start + EMBED_BATCH_SIZE]
+            try:
+                resp = client.embeddings.create(model=model, inputs=[t for _, t in batch])
+            except Exception:
+                print(
+                    f"埋め込みに失敗しました（{start} / {len(pending)} 件まで保存済み）。"
+                    "同じコマンドを再実行すると続きから再開します。"
+                )
+                raise
+            store.add([k for k, _ in batch], np.asarray([d.embedding for d in resp.data]))
+            done = min(start + EMBED_BATCH_SIZE, len(pending))
+            if done % (EMBED_BATCH_SIZE * 20) == 0 or done == len(pending):
+                print(f"  embedded {done} / {len(pending)}")
+    else:
+        print(f"All {len(texts)} texts are already embedded in {store.vec_path}.")
+
+    matrix = store.matrix()
+    rows = np.fromiter((store.index[k] for k in keys), dtype=np.int64, count=len(keys))
+    if np.array_equal(rows, np.arange(len(keys))):
+        return matrix[: len(keys)]
+    return np.asarray(matrix[rows])
+
+
+# 距離ブロック 1 枚あたりのおおよそのバイト数（行数 × n × float32）
+CONNECTION_BLOCK_BYTES = 64 << 20
+# UMAP の近傍数（自分自身を含む）
+UMAP_NEIGHBORS = 15
+# --knn auto でこの点数以上なら（pynndescent があれば）近似近傍グラフを使う
+KNN_APPROX_MIN_POINTS = 20_000
+
+
+def _block_rows(n: int) -> int:
+    return max(1, CONNECTION_BLOCK_BYTES // (4 * max(n, 1)))
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class NeighborGraph:
+    """
+    コサイン距離の kNN グラフ。UMAP・上位 N 件の接続・接続分析レポートで共有する。
+
+    indices[i, 0] は i 自身（距離 0）で、以降が近い順の近傍。空きは -1。
+    search_index は近似計算に使った NNDescent（UMAP の transform に渡す。厳密計算なら None）。
+    """
+
+    def __init__(
+        self,
+        indices: np.ndarray,
+        distances: np.ndarray,
+        search_index: object | None = None,
+    ) -> None:
+        self.indices = indices
+        self.distances = distances
+        self.search_index = search_index
+
+    @property
+    def k(self) -> int:
+        """自分自身を除いた近傍数"""
+        return self.indices.shape[1] - 1
+
+
+def _exact_neighbor_graph(unit: np.ndarray, k: int) -> NeighborGraph:
+    """正規化済みベクトルの厳密な kNN（行ブロックごとの内積と argpartition）"""
+    n = unit.shape[0]
+    width = k + 1
+    indices = np.empty((n, width), dtype=np.int64)
+    distances = np.empty((n, width), dtype=np.float32)
+    step = _block_rows(n)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        sims = unit[start:stop] @ unit.T
+        rows = np.arange(stop - start)
+        sims[rows, start + rows] = np.inf  # 自分自身を先頭に
+        top = np.argpartition(-sims, width - 1, axis=1)[:, :width]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.lexsort((top, -top_sims), axis=1)
+        indices[start:stop] = np.take_along_axis(top, order, axis=1)
+        distances[start:stop] = 1.0 - np.take_along_axis(top_sims, order, axis=1)
+    distances[:, 0] = 0.0
+    return NeighborGraph(indices, distances)
+
+
+def _self_first(indices: np.ndarray, distances: np.ndarray) -> None:
+    """近似グラフで自分自身が先頭にない行（重複ベクトルなど）を直す"""
+    n = len(indices)
+    rows = np.flatnonzero(indices[:, 0] != np.arange(n))
+    for i in rows.tolist():
+        row = [j for j in indices[i].tolist() if j != i]
+        dist = [d for j, d in zip(indices[i].tolist(), distances[i].tolist()) if j != i]
+        indices[i] = ([i] + row)[: indices.shape[1]]
+        distances[i] = ([0.0] + dist)[: indices.shape[1]]
+
+
+def nearest_neighbor_graph(
+    embeddings: np.ndarray,
+    k: int,
+    method: str = "auto",
+    random_state: int = 42,
+    min_points: int = KNN_APPROX_MIN_POINTS,
+) -> NeighborGraph:
+    """
+    各点のコサイン距離の近傍 k 件（自分自身を除く）を 1 回だけ計算する。
+    method: exact=行ブロックごとの厳密計算、approximate=NN-descent（pynndescent）、
+    auto=点数が min_points 以上なら approximate。pynndescent がなければ常に exact。
+    """
+    arr = np.asarray(embeddings, dtype=np.float32)
+    n = arr.shape[0]
+    k = max(0, min(k, n - 1))
+    use_approx = HAS_NNDESCENT and (
+        method == "approximate" or (method == "auto" and n >= min_points)
+    )
+    if method == "approximate" and not HAS_NNDESCENT:
+        print("Warning: pynndescent が未導入のため、近傍グラフを厳密に計算します。")
+    if not use_approx or k == 0:
+        return _exact_neighbor_graph(normalize_rows(arr), k)
+
+    index = NNDescent(
+        arr,
+        n_neighbors=k + 1,
+        metric="cosine",
+        random_state=random_state,
+        low_memory=True,
+        compressed=False,
+    )
+    indices, distances = index.neighbor_graph
+    indices = np.array(indices, dtype=np.int64)
+    distances = np.array(distances, dtype=np.float32)
+    _self_first(indices, distances)
+    return NeighborGraph(indices, distances, search_index=index)
+
+
+def fit_cluster_and_projection(
     embeddings: np.ndarray,
     n_clusters: int,
     random_state: int = 42,
     projection: str = "umap",
-) -> tuple[np.ndarray, np.ndarray]:
+    graph: NeighborGraph | None = None,
+) -> tuple[np.ndarray, np.ndarray, KMeans, object]:
+    """
+    KMeans と2次元投影を学習し、(coords_2d, labels, kmeans, reducer) を返す。
+    graph（NN-descent の索引つき）があれば UMAP は近傍を計算し直さずにそれを使う。
+    """
     # クラスタリング
     kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
     labels = kmeans.fit_predict(embeddings)
@@ -92,13 +353,18 @@ def cluster_and_project(
 
     if projection == "umap" and HAS_UMAP and n_samples >= 3:
         # UMAP: 埋め込み空間で「近い＝似ている」を2次元でも保持 → 同じカテゴリは近く、違うカテゴリは遠く
-        n_neighbors = min(15, max(2, n_samples - 1))
+        n_neighbors = min(UMAP_NEIGHBORS, max(2, n_samples - 1))
+        knn = {}
+        if graph is not None and graph.search_index is not None and graph.k + 1 >= n_neighbors:
+            # transform（差分配置）にも使えるよう NNDescent の索引ごと渡す
+            knn["precomputed_knn"] = (graph.indices, graph.distances, graph.search_index)
         reducer = umap.UMAP(
             n_components=2,
             n_neighbors=n_neighbors,
             min_dist=0.1,
             metric="cosine",
             random_state=random_state,
+            **knn,
         )
         coords_2d = reducer.fit_transform(embeddings.astype(np.float64))
     else:
@@ -107,9 +373,124 @@ def cluster_and_project(
             print("Warning: UMAP は未使用（umap未導入 or データが少ないため）。PCA で投影します。")
         pca = PCA(n_components=2, random_state=random_state)
         coords_2d = pca.fit_transform(embeddings)
+        reducer = pca
+    return coords_2d, labels, kmeans, reducer
+
+
+def cluster_and_project(
+    embeddings: np.ndarray,
+    n_clusters: int,
+    random_state: int = 42,
+    projection: str = "umap",
+    graph: NeighborGraph | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    coords_2d, labels, _, _ = fit_cluster_and_projection(
+        embeddings, n_clusters, random_state=random_state, projection=projection, graph=graph
+    )
     return coords_2d, labels
 
 
+# 前回のフル計算からのテキストの増減（累計）がこの割合以下なら、新しい点だけを配置する
+LAYOUT_CACHE_MAX_CHANGED = 0.2
+
+
+def text_keys(texts: List[str]) -> List[str]:
+    """各テキストの識別子（SHA-256）。同じテキストは出現順の番号で区別する"""
+    seen: dict = {}
+    keys = []
+    for text in texts:
+        digest = line_hash(text)
+        seen[digest] = seen.get(digest, 0) + 1
+        keys.append(f"{digest}:{seen[digest]}")
+    return keys
+
+
+def _reducer_input(reducer: object, embeddings: np.ndarray) -> np.ndarray:
+    # UMAP は float64 で学習している
+    return embeddings if isinstance(reducer, PCA) else embeddings.astype(np.float64)
+
+
+def cluster_and_project_cached(
+    embeddings: np.ndarray,
+    texts: List[str],
+    n_clusters: int,
+    cache_dir: str,
+    random_state: int = 42,
+    projection: str = "umap",
+    refit: bool = False,
+    graph: NeighborGraph | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    cluster_and_project の結果を (クラスタ数, 投影方法) ごとに cache_dir へ保存して再利用する。
+
+    - 同じテキスト集合なら、座標・クラスタをそのまま使う（並び順は問わない）
+    - 増減が少なければ、既存の点は前回の位置のまま、新しい点だけを
+      reducer.transform と kmeans.predict で配置する
+    - それ以外、または refit=True ならフル計算してキャッシュを置き換える
+    """
+    path = os.path.join(cache_dir, f"layout_{projection}_k{n_clusters}.pkl")
+    keys = text_keys(texts)
+    cache = None
+    if not refit and os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                cache = pickle.load(f)
+        except Exception as exc:
+            print(f"Warning: キャッシュ {path} を読めませんでした（{exc}）。フル計算します。")
+        if cache is not None and cache.get("dim") != embeddings.shape[1]:
+            cache = None
+
+    if cache is not None:
+        position = {key: i for i, key in enumerate(cache["keys"])}
+        old = np.array([position.get(key, -1) for key in keys], dtype=np.int64)
+        known = old >= 0
+        added = ~known
+        changed = cache["changed"] + int(added.sum()) + len(cache["keys"]) - int(known.sum())
+        if known.any() and changed <= LAYOUT_CACHE_MAX_CHANGED * len(keys):
+            coords_2d = np.empty((len(keys), 2), dtype=np.float64)
+            labels = np.empty(len(keys), dtype=np.int64)
+            coords_2d[known] = cache["coords"][old[known]]
+            labels[known] = cache["labels"][old[known]]
+            if added.any():
+                new = embeddings[added]
+                labels[added] = cache["kmeans"].predict(new)
+                coords_2d[added] = cache["reducer"].transform(_reducer_input(cache["reducer"], new))
+                print(
+                    f"Reused cached layout: placed {int(added.sum())} new texts "
+                    f"(changed since last full fit: {changed})."
+                )
+            else:
+                print("Reused cached layout (no new texts).")
+            cache.update(keys=keys, coords=coords_2d, labels=labels, changed=changed)
+            _save_layout_cache(path, cache)
+            return coords_2d, labels
+
+    coords_2d, labels, kmeans, reducer = fit_cluster_and_projection(
+        embeddings, n_clusters, random_state=random_state, projection=projection, graph=graph
+    )
+    _save_layout_cache(
+        path,
+        {
+            "keys": keys,
+            "coords": np.asarray(coords_2d, dtype=np.float64),
+            "labels": np.asarray(labels, dtype=np.int64),
+            "kmeans": kmeans,
+            "reducer": reducer,
+            "dim": embeddings.shape[1],
+            "changed": 0,
+        },
+    )
+    return coords_2d, labels
+
+
+def _save_layout_cache(path: str, cache: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(cache, f)
+    os.replace(tmp, path)
+
+
 def get_distance_criterion_text(projection: str) -> str:
     """点同士の近さ・遠さの基準となる説明文を返す"""
     base = (
@@ -121,6 +502,8 @@ def get_distance_criterion_text(projection: str) -> str:
         "・Mistral の埋め込みモデル（mistral-embed）が、テキストを 1024 次元のベクトルに変換します。\n"
         "・このモデルは学習データから「意味が近い文同士はベクトルも近くなる」ように訓練されています。\n"
         "・当スクリプトでは、そのベクトル同士の「ユークリッド距離」が小さいほど「近い」としています。\n"
+        "・接続（connected_to）は長さ 1 に正規化したベクトル同士のユークリッド距離で判定します\n"
+        "  （コサイン類似度が高い順と同じ順序になります）。\n"
         "・クラスタリング（KMeans）と2次元への投影（PCA/UMAP）も、このベクトル空間での距離を前提にしています。\n\n"
         "【何を重み付けしているか】\n"
         "・キーワードや語句をこちらで重み付けはしていません。\n"
@@ -134,50 +517,177 @@ def get_distance_criterion_text(projection: str) -> str:
     return base.strip()
 
 
+# 全ペア数がこれ以下なら閾値（パーセンタイル）を全ペアから、超えればこの数の無作為ペアから求める
+QUANTILE_SAMPLE_PAIRS = 1_000_000
+
+
+def iter_distance_blocks(
+    embeddings: np.ndarray,
+    block_rows: int | None = None,
+    rows: np.ndarray | None = None,
+):
+    """
+    ユークリッド距離行列を行ブロックごとに (start, dists[start:stop, :]) として返す。
+    rows を渡すとその行だけ（start は rows 内の位置）。
+    n×n の行列は作らず、メモリはブロック 1 枚分（CONNECTION_BLOCK_BYTES 程度）で済む。
+    """
+    arr = np.asarray(embeddings, dtype=np.float32)
+    n = arr.shape[0]
+    sq = np.einsum("ij,ij->i", arr, arr)
+    ids = np.arange(n) if rows is None else np.asarray(rows)
+    step = block_rows or _block_rows(n)
+    for start in range(0, len(ids), step):
+        part = ids[start : start + step]
+        block = arr[part] @ arr.T
+        block *= -2
+        block += sq[part, None]
+        block += sq[None, :]
+        np.maximum(block, 0, out=block)
+        np.sqrt(block, out=block)
+        yield start, block
+
+
+def pair_distances(embeddings: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """ペア (rows[t], cols[t]) ごとのユークリッド距離（差分はブロックごとに計算）"""
+    arr = np.asarray(embeddings, dtype=np.float32)
+    out = np.empty(len(rows), dtype=np.float32)
+    step = max(1, CONNECTION_BLOCK_BYTES // (4 * arr.shape[1]))
+    for start in range(0, len(rows), step):
+        stop = min(start + step, len(rows))
+        diff = arr[rows[start:stop]] - arr[cols[start:stop]]
+        out[start:stop] = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+    return out
+
+
+def pair_distance_quantile(
+    embeddings: np.ndarray,
+    q: float,
+    sample_pairs: int = QUANTILE_SAMPLE_PAIRS,
+    random_state: int = 0,
+) -> float:
+    """
+    全ペア（i < j）の距離の q パーセンタイル。ペア数が sample_pairs を超えるときは
+    無作為に選んだ sample_pairs 個のペアから推定する（誤差は概ね 1/√sample_pairs 程度の順位）。
+    """
+    arr = np.asarray(embeddings, dtype=np.float32)
+    n = arr.shape[0]
+    n_pairs = n * (n - 1) // 2
+    if n_pairs == 0:
+        return 0.0
+    if n_pairs <= sample_pairs:
+        upper = [
+            block[np.triu_indices(len(block), k=start + 1, m=n)]
+            for start, block in iter_distance_blocks(arr)
+        ]
+        return float(np.percentile(np.concatenate(upper), q))
+
+    rng = np.random.default_rng(random_state)
+    rows = rng.integers(0, n, size=sample_pairs)
+    cols = rng.integers(0, n - 1, size=sample_pairs)
+    cols += cols >= rows  # 自分自身を除いた一様なペア
+    return float(np.percentile(pair_distances(arr, rows, cols), q))
+
+
 def compute_connections(
     embeddings: np.ndarray,
     percentile: float = 30.0,
     top_k: int | None = None,
-) -> tuple[List[List[int]], float, np.ndarray]:
+    graph: NeighborGraph | None = None,
+) -> tuple[sp.csr_matrix, float]:
     """
-    埋め込み空間でペア間距離を計算し、接続を決める。
-    top_k 指定時: 各ノードから類似度上位 top_k 件のみ接続（エッジ間引き）。
-    否則: 距離が下位 percentile% のペアを接続。
-    返す connected_to[i] は接続先インデックス j のリスト。
-    """
-    from sklearn.metrics.pairwise import euclidean_distances
+    埋め込み空間でペア間距離を行ブロックごとに計算し、接続を決める。
+    embeddings は正規化済み（normalize_rows）を渡す。このときユークリッド距離の順は
+    コサイン距離の順と一致するので、graph の近傍をそのまま接続に使える。
+    top_k 指定時: 各ノードから距離が近い順に top_k 件のみ接続（エッジ間引き）。
+      graph があれば距離行列は使わず、その近傍（コサイン）の先頭 top_k 件を接続する。
+    否則: 距離が下位 percentile% のペア（i < j）を接続。
 
-    n = embeddings.shape[0]
+    返す connections は n×n の CSR 行列で、行 i の列 j（近い順）が接続先、値がその距離。
+    閾値は全ペア（多ければ無作為ペア）の距離から求め、top_k 指定時はレポート用に中央値を返す。
+    percentile 指定時は接続数そのものが全ペアの percentile% なので、大きな入力では top_k を使う。
+    """
+    arr = np.asarray(embeddings, dtype=np.float32)
+    n = arr.shape[0]
     if n < 2:
-        return [[] for _ in range(n)], 0.0, np.array([])
+        return sp.csr_matrix((n, n), dtype=np.float32), 0.0
 
-    dists = euclidean_distances(embeddings.astype(np.float64))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indices: List[np.ndarray] = []
+    data: List[np.ndarray] = []
 
-    connected_to: List[List[int]] = [[] for _ in range(n)]
-    threshold = 0.0
+    if top_k is not None and top_k > 0 and graph is not None and graph.k >= min(top_k, n - 1):
+        return graph_connections(arr, graph, top_k), pair_distance_quantile(arr, 50.0)
 
     if top_k is not None and top_k > 0:
         # 各ノードから距離が近い順に top_k 件だけ接続（類似度上位N件）
         k_actual = min(top_k, n - 1)
-        for i in range(n):
-            # 自分以外の全ノードとの距離でソート（昇順）
-            idx_dist = [(j, float(dists[i, j])) for j in range(n) if j != i]
-            idx_dist.sort(key=lambda t: t[1])
-            connected_to[i] = [j for j, _ in idx_dist[:k_actual]]
-        # レポート用に閾値は「全ペアの中央」など適当に
-        pair_distances = [dists[i, j] for i in range(n) for j in range(i + 1, n)]
-        threshold = float(np.median(pair_distances)) if pair_distances else 0.0
+        for start, block in iter_distance_blocks(arr):
+            rows = np.arange(len(block))
+            block[rows, start + rows] = np.inf  # 自分自身を除く
+            nearest = np.argpartition(block, k_actual - 1, axis=1)[:, :k_actual]
+            near = np.take_along_axis(block, nearest, axis=1)
+            order = np.lexsort((nearest, near), axis=1)
+            indices.append(np.take_along_axis(nearest, order, axis=1).ravel())
+            data.append(np.take_along_axis(near, order, axis=1).ravel())
+        indptr[1:] = np.arange(1, n + 1) * k_actual
+        # レポート用に閾値は「全ペアの中央」
+        threshold = pair_distance_quantile(arr, 50.0)
     else:
-        pair_distances = [dists[i, j] for i in range(n) for j in range(i + 1, n)]
-        if not pair_distances:
-            return connected_to, 0.0, dists
-        threshold = float(np.percentile(pair_distances, percentile))
-        for i in range(n):
-            for j in range(i + 1, n):
-                if dists[i, j] <= threshold:
-                    connected_to[i].append(j)
+        threshold = pair_distance_quantile(arr, percentile)
+        for start, block in iter_distance_blocks(arr):
+            stop = start + len(block)
+            # j <= i を除く（上三角のみ）
+            block[np.arange(n)[None, :] <= start + np.arange(len(block))[:, None]] = np.inf
+            rows, cols = np.nonzero(block <= threshold)
+            indices.append(cols)
+            data.append(block[rows, cols])
+            indptr[start + 1 : stop + 1] = np.bincount(rows, minlength=len(block))
+        np.cumsum(indptr, out=indptr)
 
-    return connected_to, threshold, dists
+    connections = sp.csr_matrix(
+        (
+            np.concatenate(data).astype(np.float32),
+            np.concatenate(indices).astype(np.int64),
+            indptr,
+        ),
+        shape=(n, n),
+    )
+    return connections, threshold
+
+
+def graph_connections(embeddings: np.ndarray, graph: NeighborGraph, top_k: int) -> sp.csr_matrix:
+    """近傍グラフの先頭 top_k 件を接続にする（値は正規化済みの距離、行内は近い順）"""
+    n = graph.indices.shape[0]
+    nearest = graph.indices[:, 1 : top_k + 1]
+    valid = nearest >= 0
+    counts = valid.sum(axis=1)
+    rows = np.repeat(np.arange(n), counts)
+    cols = nearest[valid]
+    dists = pair_distances(embeddings, rows, cols)
+    order = np.lexsort((cols, dists, rows))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return sp.csr_matrix((dists[order], cols[order], indptr), shape=(n, n))
+
+
+def connection_lists(connections: sp.csr_matrix) -> List[List[int]]:
+    """CSR の接続を行ごとの接続先リスト（connected_to[i]）にする"""
+    indptr, indices = connections.indptr, connections.indices.tolist()
+    return [indices[indptr[i] : indptr[i + 1]] for i in range(connections.shape[0])]
+
+
+def output_base(path: str) -> str:
+    """出力パスから拡張子（.gz を含む）を除いた部分。付随ファイル名に使う"""
+    if path.endswith(".gz"):
+        path = path[:-3]
+    return os.path.splitext(path)[0]
+
+
+def _open_output(path: str, mode: str):
+    """path が .gz で終われば gzip で開く（mode は "wt" / "wb"）"""
+    kwargs = {"encoding": "utf-8", "newline": ""} if "t" in mode else {}
+    opener = gzip.open if path.endswith(".gz") else open
+    return opener(path, mode, **kwargs)
 
 
 def write_csv(
@@ -187,7 +697,7 @@ def write_csv(
     texts: List[str],
     connected_to: List[List[int]] | None = None,
 ) -> None:
-    with open(path, "w", newline="", encoding="utf-8") as f:
+    with _open_output(path, "wt") as f:
         writer = csv.writer(f)
         if connected_to is not None:
             writer.writerow(["x", "y", "text", "cluster", "connected_to"])
@@ -200,9 +710,46 @@ def write_csv(
                 writer.writerow([f"{x:.6f}", f"{y:.6f}", text, int(label)])
 
 
+# バイナリ形式（knowledge-organizer の /cluster/points-csv format=binary と同じ）
+#   "KOPT" | uint32 version | uint32 n | uint32 nnz | uint32 text_bytes
+#   float32[n*2] 座標 | int32[n] クラスタ | uint32[n+1] 接続 indptr | uint32[nnz] 接続 indices
+#   | uint32[n+1] テキストのバイトオフセット | UTF-8 テキスト（すべてリトルエンディアン）
+POINTS_MAGIC = b"KOPT"
+POINTS_VERSION = 1
+
+
+def write_points_binary(
+    path: str,
+    coords_2d: np.ndarray,
+    labels: np.ndarray,
+    texts: List[str],
+    connections: sp.csr_matrix | None = None,
+) -> None:
+    """座標・クラスタ・接続（CSR）・テキスト表をバイナリ形式で書き出す"""
+    n = len(texts)
+    if connections is None:
+        connections = sp.csr_matrix((n, n), dtype=np.float32)
+    indptr = connections.indptr.astype("<u4")
+    indices = connections.indices.astype("<u4")
+    encoded = [t.encode("utf-8") for t in texts]
+    text_offsets = np.zeros(n + 1, dtype="<u4")
+    np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+
+    with _open_output(path, "wb") as f:
+        f.write(POINTS_MAGIC)
+        f.write(struct.pack("<4I", POINTS_VERSION, n, len(indices), int(text_offsets[-1])))
+        f.write(np.ascontiguousarray(coords_2d, dtype="<f4").tobytes())
+        f.write(np.ascontiguousarray(labels, dtype="<i4").tobytes())
+        f.write(indptr.tobytes())
+        f.write(indices.tobytes())
+        f.write(text_offsets.tobytes())
+        for b in encoded:
+            f.write(b)
+
+
 def write_criterion_file(output_csv_path: str, projection: str) -> None:
     """CSV と同じ場所に「距離の基準」説明テキストを書き出す"""
-    base, _ = os.path.splitext(output_csv_path)
+    base = output_base(output_csv_path)
     path = base + "_距離の基準.txt"
     text = get_distance_criterion_text(projection)
     with open(path, "w", encoding="utf-8") as f:
@@ -210,65 +757,143 @@ def write_criterion_file(output_csv_path: str, projection: str) -> None:
     print(f"距離の基準の説明: {path}")
 
 
+# 接続分析レポートの「接続されていないペア」に載せる件数
+REPORT_FARTHEST_PAIRS = 10
+# 接続ペアをこの行数ずつまとめてレポートに書き出す
+REPORT_CHUNK_ROWS = 4096
+# 点数が KNN_APPROX_MIN_POINTS 以上なら、遠いペアはこの行数の無作為標本から探す
+REPORT_SAMPLE_ROWS = 4096
+
+
+def _short(text: str, width: int) -> str:
+    return (text[:width] + "…") if len(text) > width else text
+
+
+def _pair_lines(i: int, j: int, d: float, texts: List[str], width: int) -> List[str]:
+    return [
+        f"  [{i}]–[{j}] 距離={d:.4f}",
+        f"      [{i}] {_short(texts[i], width)}",
+        f"      [{j}] {_short(texts[j], width)}",
+        "",
+    ]
+
+
+def _undirected_pattern(connections: sp.csr_matrix) -> sp.csr_matrix:
+    """接続を向きを無視した 0/1 の対称パターンにする（距離 0 の接続も落とさない）"""
+    n = connections.shape[0]
+    pattern = sp.csr_matrix(
+        (np.ones(connections.nnz, dtype=np.int8), connections.indices, connections.indptr),
+        shape=(n, n),
+    )
+    pattern = (pattern + pattern.T).tocsr()
+    pattern.sum_duplicates()
+    return pattern
+
+
+def farthest_disconnected_pairs(
+    embeddings: np.ndarray,
+    pattern: sp.csr_matrix,
+    limit: int = REPORT_FARTHEST_PAIRS,
+    rows: np.ndarray | None = None,
+) -> List[tuple[int, int, float]]:
+    """
+    接続されていないペア（i < j）のうち距離が遠い順に limit 件（rows 指定時は i が rows のもの）。
+    距離は行ブロックごとに計算し、候補は大きさ limit のヒープだけに保持する。
+    """
+    n = pattern.shape[0]
+    heap: List[tuple[float, int, int]] = []  # (距離, -i, -j) の最小ヒープ = 残す中で最も弱いもの
+    if limit <= 0:
+        return []
+    ids = np.arange(n) if rows is None else np.sort(np.asarray(rows))
+    for start, block in iter_distance_blocks(embeddings, rows=ids):
+        part = ids[start : start + len(block)]
+        # j <= i と接続済みのペアを除く
+        block[np.arange(n)[None, :] <= part[:, None]] = -np.inf
+        sub = pattern[part]
+        block[np.repeat(np.arange(len(part)), np.diff(sub.indptr)), sub.indices] = -np.inf
+        flat = block.ravel()
+        # ブロック内の上位 limit 件の下限と、ヒープの最弱を超える要素だけを候補にする
+        take = min(limit, flat.size)
+        floor = float(np.partition(flat, flat.size - take)[flat.size - take])
+        if len(heap) == limit:
+            floor = max(floor, heap[0][0])
+        candidates = np.flatnonzero(flat >= floor)
+        for pos in candidates[np.isfinite(flat[candidates])].tolist():
+            r, j = divmod(pos, n)
+            item = (float(flat[pos]), -int(part[r]), -j)
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return [(-i, -j, d) for d, i, j in sorted(heap, reverse=True)]
+
+
 def write_connection_report(
     output_csv_path: str,
     texts: List[str],
-    connected_to: List[List[int]],
+    connections: sp.csr_matrix,
     threshold: float,
-    dists: np.ndarray,
+    embeddings: np.ndarray,
     top_k: int | None = None,
+    sample_rows: int | None = None,
 ) -> None:
-    """接続されているかどうかの分析レポートを書き出す"""
-    base, _ = os.path.splitext(output_csv_path)
+    """
+    接続されているかどうかの分析レポートを書き出す。
+    接続ペアは行ごとに（近い順で）逐次書き出し、非接続ペアは件数を数えて遠い順の
+    上位だけをヒープで残すので、ペアの一覧は作らない。
+    sample_rows を指定すると、遠いペアはその行数の無作為標本から探す（全ペアを走査しない）。
+    """
+    base = output_base(output_csv_path)
     path = base + "_接続分析.txt"
     n = len(texts)
     if top_k is not None and top_k > 0:
         criterion_line = f"接続の基準: 各ノードから類似度（距離の近い順）上位 {top_k} 件のみエッジを張っています。"
     else:
-        criterion_line = f"接続の基準: 埋め込み空間でのユークリッド距離が閾値以下（閾値 = {threshold:.4f}）のペアを接続。"
-    lines = [
-        "【接続分析】",
-        criterion_line,
-        "",
-        "■ 接続されているペア（距離が近い＝意味が似ている）",
-        "",
-    ]
-    connected_pairs = []
-    for i in range(n):
-        for j in connected_to[i]:
-            connected_pairs.append((i, j, float(dists[i, j])))
-    connected_pairs.sort(key=lambda t: t[2])
-    for i, j, d in connected_pairs:
-        ti = (texts[i][:40] + "…") if len(texts[i]) > 40 else texts[i]
-        tj = (texts[j][:40] + "…") if len(texts[j]) > 40 else texts[j]
-        lines.append(f"  [{i}]–[{j}] 距離={d:.4f}")
-        lines.append(f"      [{i}] {ti}")
-        lines.append(f"      [{j}] {tj}")
-        lines.append("")
-
-    lines.append("■ 接続されていないペア（距離が遠い＝意味が違う）")
-    lines.append("")
-    all_pairs = [(i, j, float(dists[i, j])) for i in range(n) for j in range(i + 1, n)]
-    connected_set = {(min(i, j), max(i, j)) for i, j, _ in connected_pairs}
-    disconnected = [(i, j, d) for i, j, d in all_pairs if (i, j) not in connected_set]
-    disconnected.sort(key=lambda t: -t[2])  # 遠い順に最大10件
-    for i, j, d in disconnected[:10]:
-        ti = (texts[i][:35] + "…") if len(texts[i]) > 35 else texts[i]
-        tj = (texts[j][:35] + "…") if len(texts[j]) > 35 else texts[j]
-        lines.append(f"  [{i}]–[{j}] 距離={d:.4f}")
-        lines.append(f"      [{i}] {ti}")
-        lines.append(f"      [{j}] {tj}")
-        lines.append("")
-    if len(disconnected) > 10:
-        lines.append(f"  … 他 {len(disconnected) - 10} ペアは非接続です。")
-        lines.append("")
-
-    lines.append("■ サマリ")
-    lines.append(f"  接続ペア数: {len(connected_pairs)}")
-    lines.append(f"  非接続ペア数: {len(disconnected)}")
-    lines.append(f"  全ペア数: {len(all_pairs)}")
+        criterion_line = f"接続の基準: 正規化した埋め込みベクトル間のユークリッド距離が閾値以下（閾値 = {threshold:.4f}）のペアを接続。"
 
     with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join([
+            "【接続分析】",
+            criterion_line,
+            "",
+            "■ 接続されているペア（距離が近い＝意味が似ている）",
+            "",
+        ]) + "\n")
+        indptr, indices, data = connections.indptr, connections.indices, connections.data
+        for start in range(0, n, REPORT_CHUNK_ROWS):
+            stop = min(start + REPORT_CHUNK_ROWS, n)
+            lo, hi = int(indptr[start]), int(indptr[stop])
+            sources = np.repeat(np.arange(start, stop), np.diff(indptr[start : stop + 1]))
+            order = np.lexsort((data[lo:hi], sources))
+            lines: List[str] = []
+            for i, j, d in zip(
+                sources[order].tolist(),
+                indices[lo:hi][order].tolist(),
+                data[lo:hi][order].tolist(),
+            ):
+                lines.extend(_pair_lines(i, j, d, texts, 40))
+            if lines:
+                f.write("\n".join(lines) + "\n")
+
+        pattern = _undirected_pattern(connections)
+        total_pairs = n * (n - 1) // 2
+        n_disconnected = total_pairs - sp.triu(pattern, k=1).nnz
+        lines = ["■ 接続されていないペア（距離が遠い＝意味が違う）", ""]
+        rows = None
+        if sample_rows is not None and sample_rows < n:
+            rows = np.random.default_rng(0).choice(n, size=sample_rows, replace=False)
+            lines.append(f"  （{sample_rows} 件の無作為標本から遠いペアを探索）")
+            lines.append("")
+        if n_disconnected:
+            for i, j, d in farthest_disconnected_pairs(embeddings, pattern, rows=rows):
+                lines.extend(_pair_lines(i, j, d, texts, 35))
+        if n_disconnected > REPORT_FARTHEST_PAIRS:
+            lines.append(f"  … 他 {n_disconnected - REPORT_FARTHEST_PAIRS} ペアは非接続です。")
+            lines.append("")
+        lines.append("■ サマリ")
+        lines.append(f"  接続ペア数: {connections.nnz}")
+        lines.append(f"  非接続ペア数: {n_disconnected}")
+        lines.append(f"  全ペア数: {total_pairs}")
         f.write("\n".join(lines))
     print(f"接続分析レポート: {path}")
 
@@ -287,7 +912,7 @@ def main() -> None:
         "--output",
         "-o",
         default="cluster_points.csv",
-        help="出力CSVファイル名（デフォルト: cluster_points.csv）",
+        help="出力ファイル名（デフォルト: cluster_points.csv）。.gz で終われば gzip 圧縮。",
     )
     parser.add_argument(
         "--clusters",
@@ -316,41 +941,101 @@ def main() -> None:
         metavar="N",
         help="各ノードから類似度上位 N 件だけエッジを張る（デフォルト: 5）。0 にすると --connection-percentile を使用。",
     )
+    parser.add_argument(
+        "--knn",
+        choices=["auto", "exact", "approximate"],
+        default="auto",
+        help="近傍グラフ（UMAP と --top-edges で共有）の計算方法。auto（デフォルト）は UMAP 使用時か 2 万行以上で NN-descent（pynndescent）、それ以外は厳密計算。",
+    )
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=["csv", "binary"],
+        default="csv",
+        help="出力形式。csv（デフォルト）または binary（float32 座標・CSR 接続・テキスト表。大きなマップ向け）。出力名が .gz なら gzip 圧縮。",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=".cluster_cache",
+        help="埋め込みストアと、学習済みの KMeans・投影モデル・座標の保存先（デフォルト: .cluster_cache）。空文字でキャッシュしない。",
+    )
+    parser.add_argument(
+        "--resume",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="--cache-dir に埋め込み済みのテキストは API を呼ばずに再利用する（デフォルト）。--no-resume で埋め込みストアを作り直す。",
+    )
+    parser.add_argument(
+        "--refit",
+        action="store_true",
+        help="キャッシュを使わず KMeans と投影をフル計算し直す。",
+    )
 
     args = parser.parse_args()
 
     texts = load_texts(args.input)
     print(f"Loaded {len(texts)} texts from {args.input}")
 
-    client = get_mistral_client()
-    print("Embedding texts with Mistral embeddings API...")
-    embeddings = embed_texts(client, texts)
+    if args.cache_dir:
+        embeddings = embed_texts_checkpointed(texts, args.cache_dir, resume=args.resume)
+    else:
+        client = get_mistral_client()
+        print("Embedding texts with Mistral embeddings API...")
+        embeddings = embed_texts(client, texts)
     print(f"Embeddings shape: {embeddings.shape}")
 
+    # 近傍グラフは 1 回だけ計算し、UMAP・上位 N 件の接続・レポートで共有する
+    use_umap = args.projection == "umap" and HAS_UMAP and len(texts) >= 3
+    graph_k = max(args.top_edges, UMAP_NEIGHBORS - 1 if use_umap else 0)
+    graph = None
+    if graph_k > 0 and len(texts) >= 2:
+        knn_method = "approximate" if use_umap and args.knn == "auto" else args.knn
+        print(f"Building {graph_k}-nearest-neighbor graph ({knn_method})...")
+        graph = nearest_neighbor_graph(embeddings, graph_k, method=knn_method)
+
     print(f"Clustering into {args.clusters} clusters and projecting to 2D ({args.projection})...")
-    coords_2d, labels = cluster_and_project(
-        embeddings, n_clusters=args.clusters, projection=args.projection
-    )
+    if args.cache_dir:
+        coords_2d, labels = cluster_and_project_cached(
+            embeddings,
+            texts,
+            n_clusters=args.clusters,
+            cache_dir=args.cache_dir,
+            projection=args.projection,
+            refit=args.refit,
+            graph=graph,
+        )
+    else:
+        coords_2d, labels = cluster_and_project(
+            embeddings, n_clusters=args.clusters, projection=args.projection, graph=graph
+        )
 
+    # 接続は正規化したベクトルのユークリッド距離で決める（コサインの近傍グラフと同じ順序）
+    unit = normalize_rows(embeddings)
     if args.top_edges > 0:
         print(f"Computing connections (top-{args.top_edges} nearest per node)...")
-        connected_to, conn_threshold, dists = compute_connections(
-            embeddings, top_k=args.top_edges
+        connections, conn_threshold = compute_connections(
+            unit, top_k=args.top_edges, graph=graph
         )
         print(f"  Each node connected to its {args.top_edges} nearest neighbors.")
     else:
         print("Computing connections (distance percentile)...")
-        connected_to, conn_threshold, dists = compute_connections(
-            embeddings, percentile=args.connection_percentile
+        connections, conn_threshold = compute_connections(
+            unit, percentile=args.connection_percentile
         )
         print(f"  Connection threshold (percentile {args.connection_percentile}%): {conn_threshold:.4f}")
 
-    write_csv(args.output, coords_2d, labels, texts, connected_to=connected_to)
+    if args.format == "binary":
+        write_points_binary(args.output, coords_2d, labels, texts, connections=connections)
+    else:
+        write_csv(
+            args.output, coords_2d, labels, texts, connected_to=connection_lists(connections)
+        )
     print(f"Saved clustered points to {args.output}")
 
     write_connection_report(
-        args.output, texts, connected_to, conn_threshold, dists,
+        args.output, texts, connections, conn_threshold, unit,
         top_k=args.top_edges if args.top_edges > 0 else None,
+        sample_rows=REPORT_SAMPLE_ROWS if len(texts) >= KNN_APPROX_MIN_POINTS else None,
     )
 
     criterion_text = get_distance_criterion_text(args.projection)